@@ -12,5 +12,25 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('GRAPHQL_ASYNC', '1')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, as they import models
+from core.recommend import start_rebuild  # noqa: E402
+from core.subscriptions import GraphQLWebSocket  # noqa: E402
+
+websocket_application = GraphQLWebSocket.as_asgi()
+
+# Build the mentor index while the server starts, not on the first query
+start_rebuild()
+
+
+async def application(scope, receive, send):
+    """Serve GraphQL WebSockets on /graphql and HTTP with Django"""
+    if scope['type'] != 'websocket':
+        return await django_application(scope, receive, send)
+    if scope['path'].rstrip('/') == '/graphql':
+        return await websocket_application(scope, receive, send)
+    await receive()
+    await send({'type': 'websocket.close', 'code': 1000})
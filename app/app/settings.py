@@ -10,9 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'core',
     'user',
+    'benchmark',
     'graphene_django',
     'graphql_jwt.refresh_token.apps.RefreshTokenConfig',
     'graphql_auth',
@@ -54,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routing.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -87,13 +92,95 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_ENGINE picks SQLite (the default, for single-node deploys) or
+# Postgres. SQLite reads its file from SQLITE_PATH, so DB_NAME only names
+# the Postgres database. Postgres keeps connections open for
+# DB_CONN_MAX_AGE seconds, or with DB_POOL_SIZE set borrows them from a
+# per-process pool instead.
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': ('core.db.backends.postgresql' if DB_POOL_SIZE
+                       else 'django.db.backends.postgresql'),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            'NAME': os.environ.get('DB_NAME', 'app'),
+            'USER': os.environ.get('DB_USER', 'app'),
+            'PASSWORD': os.environ.get('DB_PASS', ''),
+            'CONN_MAX_AGE': (0 if DB_POOL_SIZE else
+                             int(os.environ.get('DB_CONN_MAX_AGE', 60))),
+            'POOL': {
+                'MAX_SIZE': DB_POOL_SIZE,
+                # Seconds a request waits for a free connection
+                'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                # Milliseconds a writer waits for the lock
+                'busy_timeout': 5000,
+            },
+            # Tests run on a file, as in-memory databases shared between
+            # threads fail at once on a lock held instead of waiting
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# DB_REPLICAS lists read replicas, as hosts for Postgres or database file
+# paths for SQLite. GraphQL queries read from them; see
+# DATABASE_REPLICATION.
+DB_REPLICAS = [name for name in os.environ.get('DB_REPLICAS', '').split(',')
+               if name]
+for i, name in enumerate(DB_REPLICAS, 1):
+    DATABASES[f'replica{i}'] = {
+        **DATABASES['default'],
+        'HOST' if DB_ENGINE == 'postgres' else 'NAME': name,
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['core.routing.ReplicaRouter']
+
+DATABASE_REPLICATION = {
+    'REPLICAS': [f'replica{i}' for i in range(1, len(DB_REPLICAS) + 1)],
+    # Seconds a user's queries stay on the primary after a mutation
+    'STICKY_SECONDS': int(os.environ.get('DB_STICKY_SECONDS', 5)),
 }
 
+# The default cache holds the ETag version stamps and read-your-writes
+# pins, which every app server process must share. Set CACHE_REDIS_URL
+# when running more than one process; the per-process fallback only
+# suits a single one.
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+
+CACHES = {
+    'default': ({
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    } if CACHE_REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }),
+}
+
+if (DATABASE_REPLICATION['REPLICAS']
+        and DATABASE_REPLICATION['STICKY_SECONDS'] and not CACHE_REDIS_URL):
+    # A pin another process cannot see sends the user's next query to a
+    # replica that may not have their write yet
+    raise ImproperlyConfigured(
+        'DB_REPLICAS needs CACHE_REDIS_URL so every app server sees the '
+        'read-your-writes pins; or set DB_STICKY_SECONDS=0.')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -114,6 +201,25 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# New hashes use Argon2; PBKDF2 hashes still verify and are upgraded to
+# Argon2 on the next successful login.
+
+PASSWORD_HASHERS = [
+    'core.hashers.TunedArgon2PasswordHasher',
+    'core.hashers.TunedPBKDF2PasswordHasher',
+]
+
+PASSWORD_HASHER_COST = {
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 19456,  # KiB
+    'ARGON2_PARALLELISM': 1,
+    'PBKDF2_ITERATIONS': 260000,
+    # Threads password hashes are computed on
+    'POOL_SIZE': 4,
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -142,15 +248,20 @@ AUTH_USER_MODEL = 'core.User'
 
 GRAPHENE = {
     'SCHEMA': 'core.schema.schema',  # Adjust the path based on where you place the combined schema
+    # Later middleware runs first: authenticate, pick the database, then
+    # time the resolver itself
     'MIDDLEWARE': [
+        'core.metrics.MetricsMiddleware',
+        'core.routing.ReplicaMiddleware',
         'graphql_jwt.middleware.JSONWebTokenMiddleware',
     ],
 }
 
 
 AUTHENTICATION_BACKENDS = [
+    'core.auth.ClaimsJSONWebTokenBackend',
     'graphql_auth.backends.GraphQLAuthBackend',
-    'django.contrib.auth.backends.ModelBackend',
+    'core.hashers.PooledModelBackend',
     "graphql_jwt.backends.JSONWebTokenBackend",
 ]
 
@@ -172,3 +283,148 @@ GRAPHQL_JWT = {
     "JWT_SECRET_KEY" : SECRET_KEY,
     'JWT_PAYLOAD_HANDLER': 'core.utils.custom_jwt_payload_handler',
 }
+
+REFRESH_TOKENS = {
+    # Issuing a token past this many live ones revokes the oldest
+    'MAX_PER_USER': 10,
+    'PRUNE_BATCH_SIZE': 10000,
+}
+if os.environ.get('REFRESH_TOKEN_PRUNE_INTERVAL'):
+    # Seconds between in-process prunes of revoked and expired tokens;
+    # unset leaves pruning to the prune_refresh_tokens command
+    REFRESH_TOKENS['PRUNE_INTERVAL'] = int(
+        os.environ['REFRESH_TOKEN_PRUNE_INTERVAL'])
+
+GRAPHQL_PERSISTED_QUERIES = {
+    'CACHE_SIZE': 1000,
+    # JSON file mapping sha256 hashes to query documents
+    'ALLOW_LIST': None,
+    'ALLOW_LIST_ONLY': False,
+}
+
+GRAPHQL_QUERY_LIMITS = {
+    # Operations are costed before execution: a field costs 1 per object
+    # it returns, multiplied by the page sizes above it
+    'MAX_COST': int(os.environ.get('GRAPHQL_MAX_COST', 5000)),
+    'MAX_DEPTH': 10,
+    'MAX_ALIASES': 30,
+    # Fields doing more work than loading one object
+    'FIELD_COSTS': {
+        'totalCount': 1,
+        'Query.searchMentors': 10,
+        'expertiseFacets': 5,
+        'occupationFacets': 5,
+    },
+}
+
+GRAPHQL_METRICS = {
+    # Per-field, per-operation and SQL metrics served on /metrics
+    'ENABLED': True,
+    # Add extensions.tracing to responses; set GRAPHQL_TRACING=1
+    'TRACING': os.environ.get('GRAPHQL_TRACING') == '1',
+    'N_PLUS_ONE_THRESHOLD': 10,
+}
+
+GRAPHQL_CONDITIONAL_GET = {
+    # GET queries get an ETag from the tables they read. The stamps live
+    # in the default cache, so ETags are only on when it is shared, or
+    # GRAPHQL_CONDITIONAL_GET=1 vouches for a single process.
+    'ENABLED': bool(CACHE_REDIS_URL
+                    or os.environ.get('GRAPHQL_CONDITIONAL_GET') == '1'),
+    'CACHE_CONTROL': {
+        'Query.mentors': {'max_age': 30, 'scope': 'public'},
+        'Query.mentor': {'max_age': 30, 'scope': 'public'},
+        'Query.searchMentors': {'max_age': 30, 'scope': 'public'},
+        'Query.recommendMentors': {'max_age': 30, 'scope': 'public'},
+        'Query.me': {'scope': 'private'},
+        'Query.userRequests': {'scope': 'private'},
+        'Query.mentorRequests': {'scope': 'private'},
+        'Query.allRequests': {'scope': 'private'},
+        'Query.mentorStats': {'scope': 'private'},
+        'Query.cacheStats': {'scope': 'no-store'},
+    },
+}
+
+GRAPHQL_BATCH = {
+    # A JSON array of operations runs as one batch with a shared context
+    'ENABLED': True,
+    'MAX_SIZE': int(os.environ.get('GRAPHQL_BATCH_MAX_SIZE', 10)),
+}
+
+GRAPHQL_ASYNC = {
+    # Serve /graphql with the async view; app.asgi turns this on
+    'ENABLED': os.environ.get('GRAPHQL_ASYNC') == '1',
+    # Threads resolvers run on under the async view
+    'WORKERS': int(os.environ.get('GRAPHQL_ASYNC_WORKERS', 32)),
+}
+
+GRAPHQL_SUBSCRIPTIONS = {
+    # Channel layer subscription events travel through. Set
+    # SUBSCRIPTIONS_REDIS_URL when several app servers share subscribers
+    'BACKEND': ('core.pubsub.RedisChannelLayer'
+                if os.environ.get('SUBSCRIPTIONS_REDIS_URL')
+                else 'core.pubsub.InMemoryChannelLayer'),
+    'OPTIONS': ({'url': os.environ['SUBSCRIPTIONS_REDIS_URL']}
+                if os.environ.get('SUBSCRIPTIONS_REDIS_URL') else {}),
+}
+
+READ_CACHE = {
+    # Read-through cache of the mentors listing and mentor lookups,
+    # invalidated by version bumps when mentors change
+    'ENABLED': True,
+    # core.cache.LocalCache keeps entries per process; use
+    # core.cache.RedisCache with OPTIONS {'url': 'redis://...'} to share
+    # entries and invalidations between processes
+    'BACKEND': 'core.cache.LocalCache',
+    'OPTIONS': {'max_entries': 1000},
+    'TIMEOUT': 300,
+}
+
+MENTOR_RECOMMENDATIONS = {
+    # recommendMentors scores questions against an in-memory index of
+    # mentor profiles, one per process, rebuilt after MAX_AGE seconds
+    'MAX_AGE': int(os.environ.get('MENTOR_INDEX_MAX_AGE', 300)),
+    'MAX_FIRST': 50,
+}
+
+GRAPHQL_JWT_CLAIMS_AUTH = {
+    # Build request users from token claims (id, email, isMentor, isStaff)
+    # and only load the user row when a resolver needs another field.
+    # Trade-off: is_active is not read either, so a deactivated user's
+    # access token keeps working until JWT_EXPIRATION_DELTA runs out.
+    'ENABLED': False,
+    'TOKEN_CACHE_SIZE': 10000,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'core.log.JSONFormatter'},
+    },
+    'filters': {
+        'events': {
+            '()': 'core.log.EventFilter',
+            # Lowest level kept per event, on top of the logger level
+            'levels': {},
+            # Fraction of records kept per event
+            'sample_rates': {},
+        },
+    },
+    'handlers': {
+        'events': {
+            'class': 'core.log.AsyncStreamHandler',
+            'formatter': 'json',
+            'filters': ['events'],
+        },
+    },
+    'loggers': {
+        # INFO logs every mutation and slow operation; set
+        # EVENTS_LOG_LEVEL=INFO where a collector ships them
+        'events': {
+            'handlers': ['events'],
+            'level': os.environ.get('EVENTS_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
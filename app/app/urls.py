@@ -4,9 +4,18 @@ from django.urls import path
 
 # Graphql
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
+from core.executor import get_setting
+from core.views import AsyncGraphQLView, GraphQLView, health, metrics
+
+if get_setting('ENABLED'):
+    # csrf_exempt would hide the coroutine; the view is exempt itself
+    graphql_view = AsyncGraphQLView.as_view(graphiql=True)
+else:
+    graphql_view = csrf_exempt(GraphQLView.as_view(graphiql=True))
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql', csrf_exempt(GraphQLView.as_view(graphiql=True)))
+    path('graphql', graphql_view),
+    path('health', health),
+    path('metrics', metrics),
 ]
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# Imported once Django is set up, as it imports models
+from core.recommend import start_rebuild  # noqa: E402
+
+# Build the mentor index while the server starts, not on the first query
+start_rebuild()
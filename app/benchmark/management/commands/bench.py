@@ -0,0 +1,115 @@
+"""
+Run the benchmark scenarios and compare them with a stored baseline
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmark.runner import compare, environment, run_scenario
+from benchmark.scenarios import SCENARIOS
+from benchmark.seed import SEED_DOMAIN, seed
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = ('Seed users, mentors and requests, run the scripted scenarios '
+            'through the in-process app and report throughput, p50/p95/p99 '
+            'latency and SQL queries per operation. Results can be written '
+            'as JSON and compared with a baseline, failing when a metric '
+            'regresses. Seeded users are deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append',
+                            choices=sorted(SCENARIOS),
+                            help='Scenario to run; repeat for several. '
+                                 'Defaults to all of them.')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--mentors', type=int, default=100)
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--iterations', type=int, default=200,
+                            help='Sessions run per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results to this file')
+        parser.add_argument('--baseline',
+                            help='Compare results with this results file')
+        parser.add_argument('--results',
+                            help='Compare this results file with the '
+                                 'baseline instead of running scenarios')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Fraction by which throughput and latency '
+                                 'may worsen before they regress')
+
+    def handle(self, *args, **options):
+        if options['results']:
+            if not options['baseline']:
+                raise CommandError('--results needs a --baseline.')
+            results = self.load(options['results'])
+        else:
+            results = self.run(options)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2, sort_keys=True)
+        if options['baseline']:
+            self.compare(self.load(options['baseline']), results,
+                         options['tolerance'])
+
+    def load(self, path):
+        try:
+            with open(path) as results:
+                return json.load(results)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read results from {path}: {e}')
+
+    def run(self, options):
+        names = options['scenario'] or list(SCENARIOS)
+        mentor_ids, mentee_ids = seed(users=options['users'],
+                                      mentors=options['mentors'],
+                                      requests=options['requests'],
+                                      seed=options['seed'])
+        results = {
+            'environment': environment(),
+            'parameters': {name: options[name] for name in (
+                'users', 'mentors', 'requests', 'iterations',
+                'concurrency', 'seed')},
+            'scenarios': {},
+        }
+        try:
+            for name in names:
+                scenario = SCENARIOS[name]
+                user_ids = (mentor_ids if scenario.role == 'mentor'
+                            else mentee_ids)
+                summary = run_scenario(
+                    scenario, user_ids, options['iterations'],
+                    options['concurrency'], options['seed'])
+                results['scenarios'][name] = summary
+                self.report(name, summary)
+        finally:
+            User.objects.filter(email__endswith=SEED_DOMAIN).delete()
+        return results
+
+    def report(self, name, summary):
+        self.stdout.write(
+            f'{name:>16}: {summary["throughput"]:8.1f} operations/s  '
+            f'p50 {summary.get("p50", 0):8.1f} ms  '
+            f'p95 {summary.get("p95", 0):8.1f} ms  '
+            f'p99 {summary.get("p99", 0):8.1f} ms  '
+            f'errors {summary["errors"]}')
+        for operation, stats in summary['operations'].items():
+            self.stdout.write(
+                f'{operation:>32}: {stats["count"]:6d} runs  '
+                f'p95 {stats.get("p95", 0):8.1f} ms  '
+                f'{stats["queries"]:6.1f} queries '
+                f'(max {stats["max_queries"]})')
+
+    def compare(self, baseline, results, tolerance):
+        regressions = compare(baseline, results, tolerance)
+        for scenario, operation, metric, old, new in regressions:
+            where = f'{scenario}.{operation}' if operation else scenario
+            self.stderr.write(f'Regression in {where} {metric}: '
+                              f'{old} -> {new}')
+        if regressions:
+            raise CommandError(f'{len(regressions)} metrics regressed '
+                               f'beyond the baseline.')
+        self.stdout.write('No regressions against the baseline.')
@@ -0,0 +1,154 @@
+"""
+Compare the sync and async GraphQL views under many concurrent requests
+"""
+
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import RequestFactory, override_settings
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+from graphql_jwt.shortcuts import get_token
+
+from benchmark.seed import SEED_DOMAIN, seed
+from benchmark.stats import percentile
+from core.models import User
+from core.views import AsyncGraphQLView, GraphQLView
+
+QUERY = '''{
+    mentors(first: 20) { edges { node { email expertise } } }
+    mentorRequests(first: 20) {
+        edges { node { question mentee { email } } }
+    }
+}'''
+
+
+class Command(BaseCommand):
+    help = ('Send rounds of concurrent requests for two independent root '
+            'fields to the sync view through the WSGI application on a '
+            'thread pool and to the async view through the ASGI application '
+            'on an event loop, and report throughput with p50/p99 latency. '
+            'Requests pass the middleware in-process, so only server and '
+            'network costs are left out. Seeded users are deleted '
+            'afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mentors', type=int, default=200)
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--concurrency', type=int, default=500)
+        parser.add_argument('--rounds', type=int, default=4)
+        parser.add_argument('--threads', type=int, default=32,
+                            help='WSGI worker threads')
+        parser.add_argument('--workers', type=int, default=32,
+                            help='Resolver threads of the async view')
+
+    def handle(self, *args, **options):
+        mentor_ids, _ = seed(users=options['mentors'],
+                             mentors=options['mentors'],
+                             requests=options['requests'])
+        body = json.dumps({'query': QUERY})
+        headers = {'authorization': 'BEARER ' + get_token(
+            User.objects.get(id=mentor_ids[0]))}
+        # Imported here, as the ASGI module starts building the index
+        from app.asgi import application as asgi_application
+        from app.wsgi import application as wsgi_application
+        try:
+            with override_settings(
+                    ALLOWED_HOSTS=['localhost'],
+                    READ_CACHE={'ENABLED': False},
+                    GRAPHQL_ASYNC={'WORKERS': options['workers']}):
+                with override_settings(ROOT_URLCONF=urlconf(
+                        csrf_exempt(GraphQLView.as_view()))):
+                    self.report('WSGI, sync view', self.run_wsgi(
+                        wsgi_application, body, headers, options))
+                with override_settings(ROOT_URLCONF=urlconf(
+                        AsyncGraphQLView.as_view())):
+                    self.report('ASGI, async view', asyncio.run(
+                        self.run_asgi(asgi_application, body, headers,
+                                      options)))
+        finally:
+            User.objects.filter(email__endswith=SEED_DOMAIN).delete()
+
+    def run_wsgi(self, application, body, headers, options):
+        factory = RequestFactory(SERVER_NAME='localhost')
+        wsgi_headers = {f'HTTP_{name.upper()}': value
+                        for name, value in headers.items()}
+
+        def call(submitted):
+            close_old_connections()
+            environ = factory.post('/graphql', body,
+                                   content_type='application/json',
+                                   **wsgi_headers).environ
+            statuses = []
+            content = b''.join(application(
+                environ, lambda status, headers: statuses.append(status)))
+            assert statuses == ['200 OK'], content
+            return time.perf_counter() - submitted
+
+        latencies = []
+        with ThreadPoolExecutor(options['threads']) as pool:
+            start = time.perf_counter()
+            for _ in range(options['rounds']):
+                submitted = time.perf_counter()
+                latencies += pool.map(
+                    call, [submitted] * options['concurrency'])
+            elapsed = time.perf_counter() - start
+        return self.summarize(latencies, elapsed)
+
+    async def run_asgi(self, application, body, headers, options):
+        body = body.encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': 'POST', 'scheme': 'http',
+            'path': '/graphql', 'raw_path': b'/graphql',
+            'query_string': b'', 'root_path': '',
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            'headers': [(b'host', b'localhost'),
+                        (b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode()),
+                        *((name.encode(), value.encode())
+                          for name, value in headers.items())],
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': body}
+
+        async def call():
+            submitted = time.perf_counter()
+            messages = []
+
+            async def send(message):
+                messages.append(message)
+
+            await application(scope, receive, send)
+            assert messages[0]['status'] == 200, messages
+            return time.perf_counter() - submitted
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(options['rounds']):
+            latencies += await asyncio.gather(
+                *(call() for _ in range(options['concurrency'])))
+        return self.summarize(latencies, time.perf_counter() - start)
+
+    def summarize(self, latencies, elapsed):
+        return len(latencies) / elapsed, sorted(latencies)
+
+    def report(self, name, result):
+        throughput, latencies = result
+        self.stdout.write(
+            f'{name:>18}: {throughput:8.1f} requests/s  '
+            f'p50 {percentile(latencies, 0.50) * 1000:8.1f} ms  '
+            f'p99 {percentile(latencies, 0.99) * 1000:8.1f} ms')
+
+
+def urlconf(view):
+    """Return a URLconf module serving /graphql with view alone"""
+    module = ModuleType('graphql_urls')
+    module.urlpatterns = [path('graphql', view)]
+    return module
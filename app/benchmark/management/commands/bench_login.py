@@ -0,0 +1,69 @@
+"""
+Measure concurrent login latency for different password hasher setups
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from benchmark.seed import SEED_DOMAIN, SEED_PASSWORD, seed
+from benchmark.stats import percentile
+from core.models import User
+
+PRESETS = {
+    'pbkdf2 (Django default)': {
+        'PASSWORD_HASHERS': [
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher'],
+        'AUTHENTICATION_BACKENDS': [
+            'django.contrib.auth.backends.ModelBackend'],
+    },
+    'argon2 (tuned, pooled)': {},
+}
+
+
+class Command(BaseCommand):
+    help = ('Log seeded users in concurrently under each hasher preset and '
+            'report throughput with p50/p99 latency. Seeded users are '
+            'deleted afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--logins', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        mentor_ids, mentee_ids = seed(users=options['users'])
+        users = User.objects.filter(id__in=mentee_ids)
+        emails = list(users.values_list('email', flat=True))
+        try:
+            for name, overrides in PRESETS.items():
+                with override_settings(**overrides):
+                    users.update(password=make_password(SEED_PASSWORD))
+                    self.report(name, self.run(emails, options))
+        finally:
+            User.objects.filter(email__endswith=SEED_DOMAIN).delete()
+
+    def run(self, emails, options):
+        def login(i):
+            start = time.perf_counter()
+            user = authenticate(username=emails[i % len(emails)],
+                                password=SEED_PASSWORD)
+            assert user is not None
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            start = time.perf_counter()
+            latencies = sorted(pool.map(login, range(options['logins'])))
+            elapsed = time.perf_counter() - start
+        return options['logins'] / elapsed, latencies
+
+    def report(self, name, result):
+        throughput, latencies = result
+        self.stdout.write(
+            f'{name:>24}: {throughput:8.1f} logins/s  '
+            f'p50 {percentile(latencies, 0.50) * 1000:8.1f} ms  '
+            f'p99 {percentile(latencies, 0.99) * 1000:8.1f} ms')
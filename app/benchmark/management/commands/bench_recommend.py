@@ -0,0 +1,97 @@
+"""
+Measure mentor recommendation latency on a large synthetic index
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmark.stats import percentile
+from core.models import User
+from core.recommend import MentorIndex
+
+OCCUPATIONS = ['Backend engineer', 'Frontend engineer', 'Data scientist',
+               'Engineering manager', 'Product designer', 'SRE',
+               'Security engineer', 'Mobile developer']
+
+
+def vocabulary(size, rng):
+    """Return size made-up words"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choices(letters, k=rng.randint(4, 10)))
+            for _ in range(size)]
+
+
+def sample(words, count, rng):
+    # Skewed towards the start, like word frequencies in real profiles
+    return ' '.join(words[int(len(words) * rng.random() ** 3)]
+                    for _ in range(count))
+
+
+class Command(BaseCommand):
+    help = ('Build the recommendation index over synthetic mentor '
+            'profiles (nothing is written to the database) and report '
+            'build time with p50/p95/p99 latency of scoring questions '
+            'and of profile updates.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mentors', type=int, default=100_000)
+        parser.add_argument('--questions', type=int, default=2000)
+        parser.add_argument('--updates', type=int, default=2000)
+        parser.add_argument('--first', type=int, default=10)
+        parser.add_argument('--vocabulary', type=int, default=20_000)
+        parser.add_argument('--target-p99', type=float, default=10.0,
+                            help='Fail if scoring p99 exceeds this (ms).')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = vocabulary(options['vocabulary'], rng)
+
+        def mentor(id):
+            return User(id=id, is_mentor=True, is_active=True,
+                        expertise=sample(words, rng.randint(1, 4), rng),
+                        occupation=rng.choice(OCCUPATIONS),
+                        bio=sample(words, rng.randint(10, 40), rng))
+
+        mentors = [mentor(id) for id in range(1, options['mentors'] + 1)]
+        start = time.perf_counter()
+        index = MentorIndex.build(mentors)
+        self.stdout.write(
+            f'Indexed {len(index)} mentors ({index.matrix.nnz} entries) '
+            f'in {time.perf_counter() - start:.1f}s')
+
+        questions = [sample(words, rng.randint(5, 30), rng)
+                     for _ in range(options['questions'])]
+        scoring = self.measure(
+            lambda question: index.recommend(question, options['first']),
+            questions)
+        self.report('recommend', scoring)
+
+        updated = [mentor(rng.choice(mentors).id)
+                   for _ in range(options['updates'])]
+        self.report('update', self.measure(index.update, updated))
+        self.report('recommend after updates', self.measure(
+            lambda question: index.recommend(question, options['first']),
+            questions))
+
+        p99 = percentile(scoring, 0.99) * 1000
+        if p99 > options['target_p99']:
+            raise CommandError(f'recommend p99 {p99:.2f} ms exceeds the '
+                               f'target of {options["target_p99"]} ms.')
+
+    def measure(self, call, arguments):
+        latencies = []
+        for argument in arguments:
+            start = time.perf_counter()
+            call(argument)
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)
+
+    def report(self, name, latencies):
+        self.stdout.write(
+            f'{name:>24}: '
+            f'p50 {percentile(latencies, 0.5) * 1000:7.3f} ms  '
+            f'p95 {percentile(latencies, 0.95) * 1000:7.3f} ms  '
+            f'p99 {percentile(latencies, 0.99) * 1000:7.3f} ms')
@@ -0,0 +1,112 @@
+"""
+Measure refresh token lookup latency before and after pruning
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from graphql_jwt.refresh_token.shortcuts import get_refresh_token
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+from graphql_jwt.settings import jwt_settings
+
+from benchmark.seed import SEED_DOMAIN, seed
+from benchmark.stats import percentile
+from core.models import User
+from user.tokens import prune_tokens
+
+TOKEN_PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = ('Seed a refresh token table where most rows are revoked or '
+            'expired, time the lookup every refresh runs, prune, and time '
+            'it again. Use --tokens 50000000 on PostgreSQL for a table of '
+            'production scale. Seeded users and tokens are deleted '
+            'afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=200_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--live-ratio', type=float, default=0.05,
+                            help='Share of seeded tokens still usable.')
+        parser.add_argument('--lookups', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        RefreshToken = get_refresh_token_model()
+        _, user_ids = seed(users=options['users'])
+        try:
+            start = time.perf_counter()
+            live = self.seed_tokens(RefreshToken, user_ids, options)
+            self.stdout.write(
+                f'Seeded {options["tokens"]} tokens '
+                f'({len(live)} live) in {time.perf_counter() - start:.1f}s')
+
+            rng = random.Random(options['seed'])
+            lookups = [rng.choice(live) for _ in range(options['lookups'])]
+            self.report('before pruning', RefreshToken, lookups)
+
+            start = time.perf_counter()
+            deleted = prune_tokens(options['batch_size'])
+            self.stdout.write(f'Pruned {deleted} tokens in '
+                              f'{time.perf_counter() - start:.1f}s')
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'VACUUM ANALYZE {RefreshToken._meta.db_table}')
+            self.report('after pruning', RefreshToken, lookups)
+        finally:
+            RefreshToken.objects.filter(
+                token__startswith=TOKEN_PREFIX).delete()
+            User.objects.filter(email__endswith=SEED_DOMAIN).delete()
+
+    def seed_tokens(self, RefreshToken, user_ids, options):
+        """Insert tokens in batches and return the live ones.
+
+        One token in every 1 / live-ratio is live; the rest alternate
+        between revoked and expired. bulk_create() always stamps
+        created, so expired rows get theirs moved back afterwards by
+        the id range just inserted.
+        """
+        now = timezone.now()
+        expired = now - 2 * jwt_settings.JWT_REFRESH_EXPIRATION_DELTA
+        every = max(1, round(1 / options['live_ratio']))
+        live = []
+        for start in range(0, options['tokens'], options['batch_size']):
+            stop = min(start + options['batch_size'], options['tokens'])
+            kept, stale = [], []
+            for i in range(start, stop):
+                token = RefreshToken(user_id=user_ids[i % len(user_ids)],
+                                     token=f'{TOKEN_PREFIX}{i:012d}')
+                if i % every == 0:
+                    kept.append(token)
+                    live.append(token.token)
+                elif i % 2:
+                    token.revoked = now
+                    kept.append(token)
+                else:
+                    stale.append(token)
+            RefreshToken.objects.bulk_create(kept)
+            last = RefreshToken.objects.aggregate(last=Max('id'))['last'] or 0
+            RefreshToken.objects.bulk_create(stale)
+            RefreshToken.objects.filter(id__gt=last).update(
+                created=expired)
+        return live
+
+    def report(self, name, RefreshToken, lookups):
+        rows = RefreshToken.objects.count()
+        latencies = []
+        for token in lookups:
+            start = time.perf_counter()
+            get_refresh_token(token)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        self.stdout.write(
+            f'{name:>15}: {rows:>10} rows  '
+            f'p50 {percentile(latencies, 0.5) * 1000:7.3f} ms  '
+            f'p99 {percentile(latencies, 0.99) * 1000:7.3f} ms')
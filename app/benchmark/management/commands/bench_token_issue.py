@@ -0,0 +1,73 @@
+"""
+Measure JWT issue throughput with blocking prints vs queued event logging
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from graphql_jwt.utils import jwt_encode, jwt_payload
+
+from core.log import AsyncStreamHandler, JSONFormatter
+from core.models import User
+from core.utils import custom_jwt_payload_handler
+
+
+class Command(BaseCommand):
+    help = ('Issue tokens from several threads and report tokens/second '
+            'for the old print() payload handler and the current one '
+            'with event logging on and off.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tokens', type=int, default=20_000)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--sink', default=os.devnull,
+                            help='File the prints and log lines go to.')
+
+    def handle(self, *args, **options):
+        user = User(pk=1, email='bench@example.com', is_mentor=True)
+        sink = open(options['sink'], 'w', buffering=1)
+
+        def print_payload_handler(user, context=None):
+            payload = jwt_payload(user, context)
+            payload['isMentor'] = user.is_mentor
+            print('logged In User', user, file=sink)
+            return payload
+
+        handler = AsyncStreamHandler(sink)
+        handler.setFormatter(JSONFormatter())
+        logger = logging.getLogger('events.auth')
+        saved = (logger.handlers, logger.level, logger.propagate)
+        logger.handlers, logger.propagate = [handler], False
+
+        try:
+            logger.setLevel(logging.WARNING)
+            results = [
+                ('print()', self.run(print_payload_handler, user, options)),
+                ('logging off', self.run(custom_jwt_payload_handler, user,
+                                         options)),
+            ]
+            logger.setLevel(logging.DEBUG)
+            results.append(('queued JSON logging',
+                            self.run(custom_jwt_payload_handler, user,
+                                     options)))
+            handler.flush()
+        finally:
+            logger.handlers, logger.level, logger.propagate = saved
+            handler.close()
+            sink.close()
+
+        for name, rate in results:
+            self.stdout.write(f'{name:>20}: {rate:10.0f} tokens/s')
+
+    def run(self, payload_handler, user, options):
+        def issue(_):
+            return jwt_encode(payload_handler(user))
+
+        with ThreadPoolExecutor(options['threads']) as pool:
+            start = time.perf_counter()
+            list(pool.map(issue, range(options['tokens'])))
+            elapsed = time.perf_counter() - start
+        return options['tokens'] / elapsed
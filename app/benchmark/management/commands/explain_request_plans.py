@@ -0,0 +1,94 @@
+"""
+Compare query plans for the hot Request filters with and without the
+composite indexes
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from benchmark.seed import seed
+from core.models import Request
+
+# The single-column mentee foreign key index Request had before the
+# composite indexes replaced it.
+BASELINE_INDEXES = [
+    ('core_request_mentee_id_baseline', 'mentee_id'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Seed Request rows inside a transaction, print EXPLAIN output '
+            'and timings for the request list filters with the baseline '
+            'and the composite indexes, then roll everything back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1_000_000)
+        parser.add_argument('--mentors', type=int, default=1_000)
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.stdout.write('Seeding {requests} requests...'.format(
+                **options))
+            mentor_ids, mentee_ids = seed(users=options['users'],
+                                          mentors=options['mentors'],
+                                          requests=options['requests'])
+            queries = self.get_queries(mentor_ids[0], mentee_ids[0],
+                                       options['page_size'])
+
+            self.analyze()
+            after = self.run(queries, options['repeat'])
+
+            self.use_baseline_indexes()
+            self.analyze()
+            before = self.run(queries, options['repeat'])
+
+            for name in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for label, results in (('before', before), ('after', after)):
+                    plan, elapsed = results[name]
+                    self.stdout.write(f'  {label}: {elapsed * 1000:.3f} ms')
+                    for line in plan.splitlines():
+                        self.stdout.write(f'    {line}')
+
+            transaction.set_rollback(True)
+
+    def get_queries(self, mentor_id, mentee_id, page_size):
+        requests = Request.objects.order_by('id')
+        return {
+            'mentorRequests(status: PENDING)': requests.filter(
+                mentor_id=mentor_id,
+                status=Request.Status.PENDING)[:page_size + 1],
+            'mentorRequests': requests.filter(
+                mentor_id=mentor_id)[:page_size + 1],
+            'userRequests': requests.filter(
+                mentee_id=mentee_id)[:page_size + 1],
+        }
+
+    def run(self, queries, repeat):
+        results = {}
+        for name, queryset in queries.items():
+            plan = queryset.explain()
+            start = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            results[name] = (plan, (time.perf_counter() - start) / repeat)
+        return results
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def use_baseline_indexes(self):
+        quote = connection.ops.quote_name
+        table = quote(Request._meta.db_table)
+        with connection.cursor() as cursor:
+            for index in Request._meta.indexes:
+                cursor.execute(f'DROP INDEX {quote(index.name)}')
+            for name, column in BASELINE_INDEXES:
+                cursor.execute(f'CREATE INDEX {quote(name)} '
+                               f'ON {table} ({quote(column)})')
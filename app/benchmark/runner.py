@@ -0,0 +1,221 @@
+"""
+Run benchmark scenarios against the in-process app and compare results
+"""
+
+import json
+import platform
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+import django
+from django.db import close_old_connections, connection, connections
+from django.test import Client
+from graphql_jwt.shortcuts import get_token
+
+from benchmark.stats import percentile
+from core.models import User
+
+PERCENTILES = {'p50': 0.50, 'p95': 0.95, 'p99': 0.99}
+
+# Metrics compared against a baseline, and whether lower is better
+COMPARED = {'throughput': False, 'p50': True, 'p95': True, 'p99': True,
+            'max_queries': True, 'errors': True}
+# Metrics that do not depend on timing, so any increase is a regression
+EXACT = {'max_queries', 'errors'}
+
+
+class OperationError(Exception):
+    """An operation answered with errors or an unexpected status"""
+
+
+class Recorder:
+    """Latency, SQL statements and errors of each operation, by name.
+
+    Only operations that succeeded have their latency recorded, so fast
+    failures do not improve the percentiles.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, operation, latency, queries, failed):
+        with self._lock:
+            if not failed:
+                self.latencies[operation].append(latency)
+            self.queries[operation].append(queries)
+            self.errors[operation] += failed
+
+
+class QueryCounter:
+    """Execute wrapper counting the statements of one thread"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Session:
+    """A seeded user sending GraphQL operations through the test client.
+
+    Requests go through the WSGI handler, the middleware and the view,
+    so everything but the network is measured.
+    """
+
+    def __init__(self, user, token, rng, recorder):
+        self.user = user
+        self.rng = rng
+        self.recorder = recorder
+        # testserver is only an allowed host under the test runner
+        self.client = Client(SERVER_NAME='localhost')
+        self.headers = {}
+        if token is not None:
+            self.headers['HTTP_AUTHORIZATION'] = f'BEARER {token}'
+
+    def execute(self, operation, query, variables=None):
+        """Send an operation, returning its data"""
+        counter = QueryCounter()
+        body = json.dumps({'query': query, 'variables': variables,
+                           'operationName': operation})
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(counter))
+            response = self.client.post('/graphql', body,
+                                        content_type='application/json',
+                                        **self.headers)
+        latency = time.perf_counter() - start
+        try:
+            result = response.json()
+        except ValueError:
+            result = {'errors': [response.content.decode(errors='replace')]}
+        failed = response.status_code != 200 or bool(result.get('errors'))
+        self.recorder.record(operation, latency, counter.count, failed)
+        if failed:
+            raise OperationError(result.get('errors'))
+        return result['data']
+
+
+def run_scenario(scenario, user_ids, iterations, concurrency, seed=0):
+    """Run iterations of a scenario on concurrency threads.
+
+    Each iteration is one session of a user picked from user_ids. An
+    iteration stops at its first failed operation; failures are counted
+    rather than raised.
+    """
+    recorder = Recorder()
+    users = User.objects.in_bulk(user_ids)
+    tokens = {}
+    if scenario.authenticated:
+        tokens = {pk: get_token(user) for pk, user in users.items()}
+    rng = random.Random(seed)
+    sessions = [rng.choice(user_ids) for _ in range(iterations)]
+
+    def run(index):
+        close_old_connections()
+        pk = sessions[index]
+        session = Session(users[pk], tokens.get(pk),
+                          random.Random(seed + index), recorder)
+        try:
+            scenario.run(session)
+        except OperationError:
+            pass
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(run, range(iterations)))
+        elapsed = time.perf_counter() - start
+    return summarize(recorder, iterations, elapsed)
+
+
+def summarize_latencies(latencies):
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+    return {name: round(percentile(latencies, q) * 1000, 3)
+            for name, q in PERCENTILES.items()}
+
+
+def summarize(recorder, iterations, elapsed):
+    """Summarize a run by scenario and by operation, latency in ms.
+
+    Counts include failed operations; throughput and latencies only
+    those that succeeded.
+    """
+    operations = {}
+    for name, queries in sorted(recorder.queries.items()):
+        operations[name] = {
+            'count': len(queries),
+            'errors': recorder.errors[name],
+            **summarize_latencies(recorder.latencies[name]),
+            'queries': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+        }
+    latencies = [latency for values in recorder.latencies.values()
+                 for latency in values]
+    return {
+        'iterations': iterations,
+        'operations_count': sum(map(len, recorder.queries.values())),
+        'errors': sum(recorder.errors.values()),
+        'elapsed': round(elapsed, 3),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        **summarize_latencies(latencies),
+        'operations': operations,
+    }
+
+
+def environment():
+    """Describe where results were measured, to tell runs apart"""
+    return {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.machine(),
+    }
+
+
+def compare(baseline, results, tolerance):
+    """Return the metrics of results that regressed from the baseline.
+
+    Throughput and latency regress when they are worse by more than the
+    tolerance, a fraction of the baseline. The most queries an operation
+    ran, cache misses included, and the errors do not depend on timing,
+    so any increase is a regression.
+
+    Each regression is a tuple of scenario, operation or None for the
+    whole scenario, metric, baseline value and current value.
+    """
+    regressions = []
+
+    def check(scenario, operation, before, after):
+        for metric, lower_is_better in COMPARED.items():
+            if metric not in before or metric not in after:
+                continue
+            old, new = before[metric], after[metric]
+            allowed = 0 if metric in EXACT else abs(old) * tolerance
+            worse = new - old if lower_is_better else old - new
+            if worse > allowed:
+                regressions.append((scenario, operation, metric, old, new))
+
+    for name, current in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        check(name, None, previous, current)
+        for operation, after in current['operations'].items():
+            before = previous['operations'].get(operation)
+            if before is not None:
+                check(name, operation, before, after)
+    return regressions
@@ -0,0 +1,138 @@
+"""
+Scripted client sessions run by the benchmark runner
+"""
+
+from benchmark.seed import EXPERTISE, SEED_PASSWORD
+
+PAGE_SIZE = 20
+
+LOGIN = '''
+    mutation Login($email: String!, $password: String!) {
+        tokenAuth(email: $email, password: $password) { token }
+    }
+'''
+MENTORS = '''
+    query Mentors($first: Int!, $after: String) {
+        mentors(first: $first, after: $after) {
+            edges { node { id firstName lastName occupation expertise } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+'''
+MENTOR = '''
+    query Mentor($mentorId: Int!) {
+        mentor(mentorId: $mentorId) { id email firstName lastName bio }
+    }
+'''
+SEARCH_MENTORS = '''
+    query SearchMentors($query: String!, $first: Int!) {
+        searchMentors(query: $query, first: $first) {
+            edges { node { id firstName lastName expertise } }
+        }
+    }
+'''
+PENDING_REQUESTS = '''
+    query PendingRequests($first: Int!) {
+        mentorRequests(first: $first, status: PENDING) {
+            edges { node { id question mentee { email } } }
+        }
+    }
+'''
+ACCEPT_REQUEST = '''
+    mutation AcceptRequest($requestId: Int!) {
+        acceptRequest(requestId: $requestId) { request { id status } }
+    }
+'''
+REJECT_REQUEST = '''
+    mutation RejectRequest($requestId: Int!) {
+        rejectRequest(requestId: $requestId) { request { id status } }
+    }
+'''
+REQUEST_HISTORY = '''
+    query RequestHistory($menteeId: Int!, $first: Int!, $after: String) {
+        userRequests(menteeId: $menteeId, first: $first, after: $after) {
+            edges { node { id question status mentor { email } } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+'''
+
+
+class Scenario:
+    """One scripted session of a seeded user.
+
+    ``role`` picks whether sessions run as seeded mentors or mentees;
+    ``authenticated`` sends the user's token with every operation.
+    """
+    name = None
+    description = None
+    role = 'mentee'
+    authenticated = True
+
+    def run(self, session):
+        raise NotImplementedError
+
+
+class LoginStorm(Scenario):
+    name = 'login_storm'
+    description = 'Mentees obtain a token with their password.'
+    authenticated = False
+
+    def run(self, session):
+        session.execute('Login', LOGIN, {'email': session.user.email,
+                                         'password': SEED_PASSWORD})
+
+
+class MentorBrowse(Scenario):
+    name = 'mentor_browse'
+    description = ('Mentees page through mentors, open one profile and '
+                   'search by expertise.')
+
+    def run(self, session):
+        data = session.execute('Mentors', MENTORS, {'first': PAGE_SIZE})
+        mentors = data['mentors']
+        if mentors['pageInfo']['hasNextPage']:
+            data = session.execute('Mentors', MENTORS, {
+                'first': PAGE_SIZE,
+                'after': mentors['pageInfo']['endCursor']})
+        edges = data['mentors']['edges']
+        if edges:
+            mentor = session.rng.choice(edges)['node']
+            session.execute('Mentor', MENTOR,
+                            {'mentorId': int(mentor['id'])})
+        session.execute('SearchMentors', SEARCH_MENTORS, {
+            'query': session.rng.choice(EXPERTISE), 'first': PAGE_SIZE})
+
+
+class MentorTriage(Scenario):
+    name = 'mentor_triage'
+    description = ('Mentors list their pending requests, accept one and '
+                   'reject another.')
+    role = 'mentor'
+
+    def run(self, session):
+        data = session.execute('PendingRequests', PENDING_REQUESTS,
+                               {'first': PAGE_SIZE})
+        edges = data['mentorRequests']['edges']
+        for edge, (name, query) in zip(edges, (
+                ('AcceptRequest', ACCEPT_REQUEST),
+                ('RejectRequest', REJECT_REQUEST))):
+            session.execute(name, query,
+                            {'requestId': int(edge['node']['id'])})
+
+
+class MenteeHistory(Scenario):
+    name = 'mentee_history'
+    description = 'Mentees page through the requests they have sent.'
+
+    def run(self, session):
+        variables = {'menteeId': session.user.id, 'first': PAGE_SIZE}
+        data = session.execute('RequestHistory', REQUEST_HISTORY, variables)
+        page_info = data['userRequests']['pageInfo']
+        if page_info['hasNextPage']:
+            session.execute('RequestHistory', REQUEST_HISTORY, {
+                **variables, 'after': page_info['endCursor']})
+
+
+SCENARIOS = {scenario.name: scenario for scenario in (
+    LoginStorm(), MentorBrowse(), MentorTriage(), MenteeHistory())}
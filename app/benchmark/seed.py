@@ -0,0 +1,67 @@
+"""
+Bulk data seeding for benchmarks
+"""
+
+import random
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.db.models import Max
+
+from core.models import MentorStats, Request, User
+
+SEED_DOMAIN = 'bench.example.com'
+SEED_PASSWORD = 'bench-pass-123'
+EXPERTISE = ['Python', 'Django', 'GraphQL', 'Databases', 'Career']
+
+
+def _create_users(count, prefix, offset, password, batch_size, build):
+    for start in range(0, count, batch_size):
+        User.objects.bulk_create([
+            User(email=f'{prefix}{offset + i}@{SEED_DOMAIN}',
+                 password=password,
+                 first_name=prefix.title(),
+                 last_name=str(offset + i),
+                 **build(i))
+            for i in range(start, min(start + batch_size, count))
+        ])
+
+
+def seed(users=0, mentors=0, requests=0, batch_size=5000, seed=0):
+    """Bulk insert mentees, mentors and requests between them.
+
+    Every seeded user shares one precomputed password hash so seeding
+    does not pay for a key derivation per row. Returns the ids of the
+    seeded mentors and mentees.
+    """
+    rng = random.Random(seed)
+    offset = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    password = make_password(SEED_PASSWORD)
+
+    _create_users(mentors, 'mentor', offset, password, batch_size,
+                  lambda i: {'is_mentor': True,
+                             'occupation': 'Engineer',
+                             'expertise': rng.choice(EXPERTISE)})
+    _create_users(users, 'mentee', offset, password, batch_size,
+                  lambda i: {})
+
+    seeded = User.objects.filter(id__gte=offset, email__endswith=SEED_DOMAIN)
+    mentor_ids = list(seeded.filter(is_mentor=True)
+                      .values_list('id', flat=True))
+    mentee_ids = list(seeded.filter(is_mentor=False)
+                      .values_list('id', flat=True))
+
+    if requests and mentor_ids and mentee_ids:
+        statuses = Request.Status.values
+        for start in range(0, requests, batch_size):
+            batch = Request.objects.bulk_create([
+                Request(mentor_id=rng.choice(mentor_ids),
+                        mentee_id=rng.choice(mentee_ids),
+                        question=f'Question {i}',
+                        status=rng.choice(statuses))
+                for i in range(start, min(start + batch_size, requests))
+            ])
+            MentorStats.objects.record(Counter(
+                (request.mentor_id, request.status) for request in batch))
+
+    return mentor_ids, mentee_ids
@@ -0,0 +1,8 @@
+"""
+Latency statistics shared by the benchmark commands
+"""
+
+
+def percentile(values, q):
+    """Return the q-th percentile of already sorted values"""
+    return values[min(len(values) - 1, int(q * len(values)))]
@@ -0,0 +1,100 @@
+"""
+Tests for the benchmark runner
+"""
+
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test import override_settings
+
+from benchmark.runner import Recorder, compare, run_scenario, summarize
+from benchmark.scenarios import SCENARIOS
+from benchmark.seed import seed
+
+
+@override_settings(ALLOWED_HOSTS=['localhost'],
+                   READ_CACHE={'ENABLED': False})
+class RunScenarioTests(TransactionTestCase):
+    """Test scenarios run against the app and are summarized"""
+
+    def setUp(self):
+        self.mentor_ids, self.mentee_ids = seed(users=4, mentors=3,
+                                                requests=30)
+
+    def test_scenarios_run(self):
+        """Test every scenario runs its operations without errors"""
+        for name, scenario in SCENARIOS.items():
+            user_ids = (self.mentor_ids if scenario.role == 'mentor'
+                        else self.mentee_ids)
+            with self.subTest(scenario=name):
+                summary = run_scenario(scenario, user_ids, iterations=3,
+                                       concurrency=1)
+                self.assertEqual(summary['errors'], 0)
+                self.assertGreater(summary['throughput'], 0)
+                self.assertLessEqual(summary['p50'], summary['p99'])
+
+    def test_queries_are_counted(self):
+        """Test the SQL statements of each operation are recorded"""
+        summary = run_scenario(SCENARIOS['mentee_history'], self.mentee_ids,
+                               iterations=2, concurrency=2)
+
+        history = summary['operations']['RequestHistory']
+        self.assertEqual(history['count'], 2)
+        self.assertGreater(history['max_queries'], 0)
+
+
+class SummarizeTests(SimpleTestCase):
+    """Test a run's recordings are summarized"""
+
+    def test_failures_are_counted_but_not_timed(self):
+        """Test failed operations count as errors, not as latencies"""
+        recorder = Recorder()
+        recorder.record('Mentors', 0.010, 2, False)
+        recorder.record('Mentors', 0.001, 1, True)
+        recorder.record('Me', 0.001, 1, True)
+
+        summary = summarize(recorder, iterations=2, elapsed=1)
+
+        self.assertEqual((summary['operations_count'], summary['errors'],
+                          summary['throughput'], summary['p99']),
+                         (3, 2, 1, 10))
+        self.assertEqual(summary['operations']['Mentors']['p50'], 10)
+        self.assertEqual(summary['operations']['Me'],
+                         {'count': 1, 'errors': 1, 'queries': 1,
+                          'max_queries': 1})
+
+
+class CompareTests(SimpleTestCase):
+    """Test results are compared with a baseline"""
+
+    def results(self, throughput, p95, max_queries, errors=0):
+        return {'scenarios': {'browse': {
+            'throughput': throughput, 'p95': p95, 'errors': errors,
+            'operations': {'Mentors': {'p95': p95, 'errors': errors,
+                                       'max_queries': max_queries}},
+        }}}
+
+    def test_within_tolerance(self):
+        """Test noise within the tolerance is not a regression"""
+        self.assertEqual(compare(self.results(100, 10, 2),
+                                 self.results(90, 11.5, 2), 0.2), [])
+
+    def test_regressions(self):
+        """Test slower, less throughput and more queries are flagged"""
+        self.assertEqual(
+            compare(self.results(100, 10, 2), self.results(70, 13, 3), 0.2),
+            [('browse', None, 'throughput', 100, 70),
+             ('browse', None, 'p95', 10, 13),
+             ('browse', 'Mentors', 'p95', 10, 13),
+             ('browse', 'Mentors', 'max_queries', 2, 3)])
+
+    def test_any_new_error_is_a_regression(self):
+        """Test more errors are flagged whatever the tolerance"""
+        self.assertEqual(
+            compare(self.results(100, 10, 2, errors=5),
+                    self.results(100, 10, 2, errors=6), 0.5),
+            [('browse', None, 'errors', 5, 6),
+             ('browse', 'Mentors', 'errors', 5, 6)])
+
+    def test_new_scenarios_are_skipped(self):
+        """Test scenarios missing from the baseline are not compared"""
+        self.assertEqual(compare({'scenarios': {}},
+                                 self.results(1, 100, 50), 0.2), [])
@@ -0,0 +1,194 @@
+"""
+Stateless JWT authentication from signed token claims
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.exceptions import PermissionDenied
+from graphql_jwt.backends import JSONWebTokenBackend
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import (
+    get_credentials,
+    get_http_authorization,
+    get_payload,
+)
+
+DEFAULTS = {
+    # Build request users from token claims instead of loading the row.
+    'ENABLED': False,
+    # Number of verified tokens kept until they expire.
+    'TOKEN_CACHE_SIZE': 10000,
+}
+
+# User attribute for each claim custom_jwt_payload_handler writes.
+CLAIMS = {
+    'userId': 'id',
+    'email': 'email',
+    'isMentor': 'is_mentor',
+    'isStaff': 'is_staff',
+}
+
+
+def get_setting(name):
+    """Read a GRAPHQL_JWT_CLAIMS_AUTH setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_JWT_CLAIMS_AUTH', {}).get(
+        name, DEFAULTS[name])
+
+
+class ClaimsUser:
+    """Authenticated user backed by verified token claims.
+
+    Claim attributes are answered from the token. Anything else, and any
+    write to a model field, loads the user row once and delegates to it.
+    """
+    # Tokens are only issued to active users. One stays valid after its
+    # user is deactivated until it expires (JWT_EXPIRATION_DELTA), so
+    # deactivations should also revoke the user's refresh tokens.
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, claims):
+        object.__setattr__(self, '_claims', claims)
+        object.__setattr__(self, '_user', None)
+
+    @property
+    def __class__(self):
+        return get_user_model()
+
+    @property
+    def pk(self):
+        return self._claims['id']
+
+    def get_user(self):
+        """Return the user row, loading it on first use"""
+        if self._user is None:
+            user = get_user_model()._default_manager.get(pk=self.pk)
+            object.__setattr__(self, '_user', user)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        if name == '_meta':
+            return get_user_model()._meta
+        if self._user is None and name in self._claims:
+            return self._claims[name]
+        return getattr(self.get_user(), name)
+
+    def __setattr__(self, name, value):
+        fields = {f.name for f in get_user_model()._meta.concrete_fields}
+        if name not in fields:
+            object.__setattr__(self, name, value)
+            return
+        setattr(self.get_user(), name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, get_user_model()) and other.pk == self.pk
+
+    def __hash__(self):
+        return hash(self.pk)
+
+    def __str__(self):
+        return self.email
+
+
+class VerifiedTokenCache:
+    """LRU cache of decoded token payloads that drops expired tokens"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._payloads = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        with self._lock:
+            payload = self._payloads.get(token)
+            if payload is None:
+                return None
+            if payload['exp'] <= time.time():
+                del self._payloads[token]
+                return None
+            self._payloads.move_to_end(token)
+            return payload
+
+    def set(self, token, payload):
+        if 'exp' not in payload:
+            return
+        with self._lock:
+            self._payloads[token] = payload
+            self._payloads.move_to_end(token)
+            if len(self._payloads) > self.maxsize:
+                now = time.time()
+                for key in [k for k, p in self._payloads.items()
+                            if p['exp'] <= now]:
+                    del self._payloads[key]
+            while len(self._payloads) > self.maxsize:
+                self._payloads.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+
+    def __len__(self):
+        return len(self._payloads)
+
+
+verified_tokens = VerifiedTokenCache(get_setting('TOKEN_CACHE_SIZE'))
+
+
+class ClaimsJSONWebTokenBackend(JSONWebTokenBackend):
+    """Authenticate a JWT without reading the user table.
+
+    Only active when GRAPHQL_JWT_CLAIMS_AUTH['ENABLED'] is set. Tokens
+    without the id claim fall through to the next backend.
+    """
+
+    def authenticate(self, request=None, **kwargs):
+        if not get_setting('ENABLED'):
+            return None
+        if request is None or getattr(request, '_jwt_token_auth', False):
+            return None
+
+        token = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+
+        payload = verified_tokens.get(token)
+        if payload is None:
+            try:
+                payload = get_payload(token, request)
+            except JSONWebTokenError:
+                raise PermissionDenied
+            verified_tokens.set(token, payload)
+
+        if 'userId' not in payload:
+            return None
+        return ClaimsUser({
+            attribute: payload[claim]
+            for claim, attribute in CLAIMS.items() if claim in payload
+        })
+
+
+def authenticate_request(request):
+    """Resolve the request's JWT user before executing operations.
+
+    Used where the user is needed once for several operations, or
+    before any resolver runs. An invalid token is left for the JWT
+    middleware to report on each operation.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and not user.is_anonymous:
+        return
+    if get_http_authorization(request) is None:
+        return
+    try:
+        user = authenticate(request=request)
+    except JSONWebTokenError:
+        return
+    if user is not None:
+        request.user = user
@@ -0,0 +1,33 @@
+"""
+Batched GraphQL requests: several operations in one POST
+"""
+
+from django.conf import settings
+
+DEFAULTS = {
+    # Accept a JSON array of operations on the GraphQL endpoint.
+    'ENABLED': True,
+    # Most operations one batch may carry. Each is still checked against
+    # the query limits on its own.
+    'MAX_SIZE': 10,
+}
+
+
+def get_setting(name):
+    """Read a GRAPHQL_BATCH setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_BATCH', {}).get(name, DEFAULTS[name])
+
+
+def check_batch(entries):
+    """Return why entries cannot run as a batch, or None if they can"""
+    if not get_setting('ENABLED'):
+        return 'Batched requests are not enabled.'
+    if not entries:
+        return 'Received an empty list in the batch request.'
+    max_size = get_setting('MAX_SIZE')
+    if len(entries) > max_size:
+        return (f'Batch of {len(entries)} operations exceeds the maximum '
+                f'of {max_size}.')
+    if not all(isinstance(entry, dict) for entry in entries):
+        return 'Each operation of a batch must be a JSON object.'
+    return None
@@ -0,0 +1,188 @@
+"""
+Versioned read-through cache for hot, rarely changing reads
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Dotted path to the backend class, built with OPTIONS as kwargs.
+    'BACKEND': 'core.cache.LocalCache',
+    'OPTIONS': {},
+    # Seconds an entry is served before it is loaded again.
+    'TIMEOUT': 300,
+}
+
+
+def get_setting(name):
+    """Read a READ_CACHE setting, falling back to defaults"""
+    return getattr(settings, 'READ_CACHE', {}).get(name, DEFAULTS[name])
+
+
+class LocalCache:
+    """Thread-safe in-process LRU with a per-entry TTL.
+
+    Entries and versions live in this process only, so a version bump
+    in another process is only seen here once the entry expires.
+    """
+
+    def __init__(self, timeout=300, max_entries=1000):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_version(self, namespace):
+        return self._versions.get(namespace, 1)
+
+    def incr_version(self, namespace):
+        with self._lock:
+            self._versions[namespace] = self.get_version(namespace) + 1
+            return self._versions[namespace]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisCache:
+    """Backend storing pickled entries and versions in Redis.
+
+    Takes a ready client, or a URL a ``redis.Redis`` client is made
+    from; any client with ``get``, ``set(ex=)``, ``incr`` and ``info``
+    works. Versions are shared, so a bump is seen by every process.
+    """
+
+    def __init__(self, timeout=300, url=None, client=None,
+                 prefix='readcache:'):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @property
+    def evictions(self):
+        stats = self.client.info('stats')
+        return stats.get('evicted_keys', 0) + stats.get('expired_keys', 0)
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key,
+                        pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                        ex=self.timeout)
+
+    def get_version(self, namespace):
+        return int(self.client.get(f'{self.prefix}{namespace}:version') or 1)
+
+    def incr_version(self, namespace):
+        # A missing version reads as 1, so the first bump must reach 2.
+        key = f'{self.prefix}{namespace}:version'
+        version = self.client.incr(key)
+        if version == 1:
+            version = self.client.incr(key)
+        return version
+
+
+class ReadThroughCache:
+    """Load values through a backend under versioned namespace keys.
+
+    Bumping a namespace's version makes every key written under the
+    old version unreachable, so invalidation is one write however many
+    entries the namespace holds. Cached values are shared between
+    requests and must not be mutated.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_set(self, namespace, key, loader):
+        version = self.backend.get_version(namespace)
+        full_key = f'{namespace}:{version}:{key}'
+        value = self.backend.get(full_key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = loader()
+        if value is not None:
+            self.backend.set(full_key, value)
+        return value
+
+    def invalidate(self, namespace):
+        return self.backend.incr_version(namespace)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.backend.evictions}
+
+
+def make_key(*parts):
+    """Hash the parts of a lookup into a fixed length key"""
+    return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the configured read cache, or None when it is disabled"""
+    global _cache
+    if not get_setting('ENABLED'):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            backend = import_string(get_setting('BACKEND'))
+            _cache = ReadThroughCache(backend(
+                timeout=get_setting('TIMEOUT'), **get_setting('OPTIONS')))
+        return _cache
+
+
+@receiver(setting_changed)
+def reset_cache(setting, **kwargs):
+    global _cache
+    if setting == 'READ_CACHE':
+        _cache = None
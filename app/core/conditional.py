@@ -0,0 +1,174 @@
+"""
+ETags, table version stamps and Cache-Control hints for GET queries
+"""
+
+import hashlib
+import json
+import time
+from typing import NamedTuple
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from graphql import TypeInfo, TypeInfoVisitor, get_named_type, visit
+from graphql.language import Visitor
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Models whose writes bump a version stamp, as 'app_label.Model'.
+    'MODELS': ['core.User', 'core.Request', 'core.MentorStats'],
+    # Cache-Control hints by 'Type.field' or bare field name, each a
+    # dict with 'max_age' seconds and a 'scope' of 'public', 'private'
+    # or 'no-store'. An operation gets the lowest max_age and the most
+    # restrictive scope of its fields; no-store also disables its ETag.
+    'CACHE_CONTROL': {},
+    # Seconds root fields without a max_age hint may be cached for.
+    'DEFAULT_MAX_AGE': 0,
+}
+
+SCOPES = ('public', 'private', 'no-store')
+
+
+def get_setting(name):
+    """Read a GRAPHQL_CONDITIONAL_GET setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_CONDITIONAL_GET', {}).get(
+        name, DEFAULTS[name])
+
+
+def version_key(label):
+    return f'table-version:{label}'
+
+
+def bump_version(model):
+    """Change the version stamp of model's table once the write commits.
+
+    Bumping at commit keeps readers from pairing the new stamp with the
+    old rows. ``QuerySet.update()`` and ``bulk_create()`` send no
+    signals, so code writing with them must bump the version itself.
+    """
+    key = version_key(model._meta.label)
+    transaction.on_commit(lambda: incr_version(key))
+
+
+def incr_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing stamps start from the clock, not 1, so a stamp lost
+        # with the cache never repeats one an old ETag was made from.
+        if not cache.add(key, time.time_ns(), timeout=None):
+            cache.incr(key)
+
+
+def table_versions(labels):
+    """Return the version stamp of each model label.
+
+    Stamps live in the default Django cache, which must be shared by
+    every app server process for a write in one to change the ETags
+    another serves.
+    """
+    keys = {version_key(label): label for label in labels}
+    versions = cache.get_many(keys)
+    for key in keys.keys() - versions.keys():
+        cache.add(key, time.time_ns(), timeout=None)
+        versions[key] = cache.get(key)
+    return {label: versions[key] for key, label in keys.items()}
+
+
+def model_changed(sender, **kwargs):
+    bump_version(sender)
+
+
+def connect_receivers():
+    """Bump versions on saves and deletes of the tracked models.
+
+    Receivers are connected per model, not to every sender, so deletes
+    of other models keep Django's fast path that never loads the rows.
+    """
+    for label in get_setting('MODELS'):
+        model = apps.get_model(label)
+        post_save.connect(model_changed, sender=model,
+                          dispatch_uid=f'conditional-save:{label}')
+        post_delete.connect(model_changed, sender=model,
+                            dispatch_uid=f'conditional-delete:{label}')
+
+
+class CachePolicy(NamedTuple):
+    """How long and by whom an operation's response may be cached"""
+    max_age: int
+    scope: str
+    # Labels of the tracked models the operation reads
+    models: frozenset
+
+    @property
+    def header(self):
+        if self.scope == 'no-store':
+            return 'no-store'
+        if not self.max_age:
+            return f'{self.scope}, no-cache'
+        return f'{self.scope}, max-age={self.max_age}'
+
+
+class PolicyVisitor(Visitor):
+    """Collect the hints and models of every field a document selects"""
+
+    def __init__(self, type_info, root_type):
+        super().__init__()
+        self.type_info = type_info
+        self.root_type = root_type
+        self.hints = get_setting('CACHE_CONTROL')
+        self.max_age = None
+        self.scope = 'public'
+        self.models = set()
+
+    def enter_field(self, node, *_):
+        parent_type = self.type_info.get_parent_type()
+        name = node.name.value
+        if parent_type is None or name.startswith('__'):
+            return
+        hint = self.hints.get(f'{parent_type.name}.{name}',
+                              self.hints.get(name))
+        if parent_type is self.root_type:
+            hint = {'max_age': get_setting('DEFAULT_MAX_AGE'), **(hint or {})}
+        if hint is not None:
+            self.add_hint(hint)
+
+        field_type = self.type_info.get_type()
+        graphene_type = getattr(get_named_type(field_type), 'graphene_type',
+                                None)
+        model = getattr(getattr(graphene_type, '_meta', None), 'model', None)
+        if model is not None:
+            self.models.add(model._meta.label)
+
+    def add_hint(self, hint):
+        if 'max_age' in hint:
+            self.max_age = (hint['max_age'] if self.max_age is None
+                            else min(self.max_age, hint['max_age']))
+        scope = hint.get('scope', 'public')
+        if SCOPES.index(scope) > SCOPES.index(self.scope):
+            self.scope = scope
+
+
+def cache_policy(schema, document):
+    """Return the CachePolicy of a query document.
+
+    Documents selecting no tracked model depend on every tracked model,
+    since what they read is unknown.
+    """
+    type_info = TypeInfo(schema)
+    visitor = PolicyVisitor(type_info, schema.query_type)
+    visit(document, TypeInfoVisitor(type_info, visitor))
+    tracked = set(get_setting('MODELS'))
+    models = visitor.models & tracked or tracked
+    return CachePolicy(visitor.max_age or 0, visitor.scope,
+                       frozenset(models))
+
+
+def make_etag(document_hash, variables, operation_name, viewer, policy):
+    """Return a strong ETag for one viewer's result of an operation"""
+    versions = table_versions(sorted(policy.models))
+    key = json.dumps([document_hash, variables, operation_name, viewer,
+                      versions], sort_keys=True, default=str)
+    return '"%s"' % hashlib.sha256(key.encode('utf-8')).hexdigest()
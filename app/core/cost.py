@@ -0,0 +1,237 @@
+"""
+Query depth, alias and cost limits checked before execution
+"""
+
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    InlineFragmentNode,
+    IntValueNode,
+    VariableNode,
+    get_named_type,
+    get_nullable_type,
+    is_leaf_type,
+    is_list_type,
+    type_from_ast,
+)
+from graphql.language import SKIP
+from graphql.validation import ASTValidationRule
+
+DEFAULTS = {
+    # Highest cost an operation may have; None disables the check.
+    'MAX_COST': 5000,
+    # Deepest field nesting an operation may have, fragments included.
+    'MAX_DEPTH': 10,
+    # Most aliased fields an operation may have, fragments included.
+    'MAX_ALIASES': 30,
+    # Cost of a field by 'Type.field' or bare field name. Fields not
+    # listed cost 1 when they return an object and 0 for scalars.
+    'FIELD_COSTS': {},
+    # Items assumed for list fields without a page size argument.
+    'LIST_SIZE': 10,
+}
+
+# Arguments giving the number of items a connection returns
+PAGE_ARGUMENTS = ('first', 'last')
+
+
+def get_setting(name):
+    """Read a GRAPHQL_QUERY_LIMITS setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_QUERY_LIMITS', {}).get(
+        name, DEFAULTS[name])
+
+
+class OperationRule(ASTValidationRule):
+    """Rule measuring each operation with its fragments inlined"""
+
+    def enter_operation_definition(self, node, *_):
+        self.check(node)
+        return SKIP
+
+    def check(self, operation):
+        raise NotImplementedError
+
+    def fragment(self, spread, seen):
+        """Return the fragment a spread refers to, once per path"""
+        name = spread.name.value
+        if name in seen:
+            # Cycles are reported by the NoFragmentCycles rule
+            return None
+        return self.context.get_fragment(name)
+
+
+class DepthLimitRule(OperationRule):
+    """Reject operations nesting fields deeper than MAX_DEPTH"""
+
+    def check(self, operation):
+        max_depth = get_setting('MAX_DEPTH')
+        depth = self.depth(operation.selection_set, frozenset())
+        if max_depth is not None and depth > max_depth:
+            self.report_error(GraphQLError(
+                f'Query depth of {depth} exceeds the maximum of '
+                f'{max_depth}.', operation,
+                extensions={'code': 'QUERY_TOO_DEEP'}))
+
+    def depth(self, selection_set, seen):
+        deepest = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                if selection.name.value.startswith('__'):
+                    continue
+                depth = 1
+                if selection.selection_set:
+                    depth += self.depth(selection.selection_set, seen)
+            elif isinstance(selection, InlineFragmentNode):
+                depth = self.depth(selection.selection_set, seen)
+            else:
+                fragment = self.fragment(selection, seen)
+                if fragment is None:
+                    continue
+                depth = self.depth(fragment.selection_set,
+                                   seen | {fragment.name.value})
+            deepest = max(deepest, depth)
+        return deepest
+
+
+class AliasLimitRule(OperationRule):
+    """Reject operations with more than MAX_ALIASES aliased fields"""
+
+    def check(self, operation):
+        max_aliases = get_setting('MAX_ALIASES')
+        aliases = self.aliases(operation.selection_set, frozenset())
+        if max_aliases is not None and aliases > max_aliases:
+            self.report_error(GraphQLError(
+                f'Query uses {aliases} aliases, more than the maximum of '
+                f'{max_aliases}.', operation,
+                extensions={'code': 'TOO_MANY_ALIASES'}))
+
+    def aliases(self, selection_set, seen):
+        count = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                count += selection.alias is not None
+                if selection.selection_set:
+                    count += self.aliases(selection.selection_set, seen)
+            elif isinstance(selection, InlineFragmentNode):
+                count += self.aliases(selection.selection_set, seen)
+            else:
+                fragment = self.fragment(selection, seen)
+                if fragment is not None:
+                    count += self.aliases(fragment.selection_set,
+                                          seen | {fragment.name.value})
+        return count
+
+
+class QueryCostRule(OperationRule):
+    """Reject operations costing more than MAX_COST.
+
+    A field costs its FIELD_COSTS entry plus the cost of its selections
+    times the items it returns: its ``first`` or ``last`` argument, the
+    connection page limit when both are omitted, or LIST_SIZE for other
+    lists. The cost therefore grows with the rows an operation can load
+    and serialize. Page sizes given by variables are read from
+    ``variables``, so use ``bind`` to make a rule for each request.
+    """
+    variables = {}
+    costs = None
+
+    @classmethod
+    def bind(cls, variables=None, costs=None):
+        """Return the rule for one request's variables.
+
+        The cost of each operation is stored in costs, when given, under
+        the operation's name.
+        """
+        return type(cls.__name__, (cls,), {
+            'variables': variables if isinstance(variables, dict) else {},
+            'costs': costs,
+        })
+
+    def check(self, operation):
+        max_cost = get_setting('MAX_COST')
+        cost = self.selection_cost(
+            self.context.schema.get_root_type(operation.operation),
+            operation.selection_set, False, frozenset())
+        if self.costs is not None:
+            self.costs[operation.name and operation.name.value] = cost
+        if max_cost is not None and cost > max_cost:
+            self.report_error(GraphQLError(
+                f'Query cost of {cost} exceeds the maximum of {max_cost}.',
+                operation, extensions={'code': 'QUERY_TOO_COSTLY',
+                                       'cost': cost, 'maxCost': max_cost}))
+
+    def selection_cost(self, parent_type, selection_set, paged, seen):
+        cost = 0
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                cost += self.field_cost(parent_type, selection, paged, seen)
+                continue
+            if isinstance(selection, FragmentSpreadNode):
+                fragment = self.fragment(selection, seen)
+                if fragment is None:
+                    continue
+                inner_seen = seen | {fragment.name.value}
+            else:
+                fragment, inner_seen = selection, seen
+            type_ = parent_type
+            if fragment.type_condition is not None:
+                type_ = type_from_ast(self.context.schema,
+                                      fragment.type_condition) or type_
+            cost += self.selection_cost(type_, fragment.selection_set,
+                                        paged, inner_seen)
+        return cost
+
+    def field_cost(self, parent_type, node, paged, seen):
+        name = node.name.value
+        field = getattr(parent_type, 'fields', {}).get(name)
+        if field is None or name.startswith('__'):
+            return 0
+        named_type = get_named_type(field.type)
+        field_costs = get_setting('FIELD_COSTS')
+        cost = field_costs.get(
+            f'{parent_type.name}.{name}',
+            field_costs.get(name, 0 if is_leaf_type(named_type) else 1))
+        if node.selection_set is None:
+            return cost
+
+        page_size = self.page_size(field, node)
+        if page_size is not None:
+            items = page_size
+        elif is_list_type(get_nullable_type(field.type)) and not paged:
+            items = get_setting('LIST_SIZE')
+        else:
+            # Edges of a paged connection are already counted by its page.
+            items = 1
+        return cost + items * self.selection_cost(
+            named_type, node.selection_set, page_size is not None, seen)
+
+    def page_size(self, field, node):
+        """Return the items a paged field returns, or None if unpaged"""
+        if not any(name in field.args for name in PAGE_ARGUMENTS):
+            return None
+        sizes = []
+        for argument in node.arguments:
+            if argument.name.value not in PAGE_ARGUMENTS:
+                continue
+            value = argument.value
+            if isinstance(value, VariableNode):
+                size = self.variables.get(value.name.value)
+            elif isinstance(value, IntValueNode):
+                size = int(value.value)
+            else:
+                size = None
+            if isinstance(size, int) and not isinstance(size, bool):
+                sizes.append(max(size, 0))
+        if sizes:
+            return max(sizes)
+        return graphene_settings.RELAY_CONNECTION_MAX_LIMIT or get_setting(
+            'LIST_SIZE')
+
+
+def limit_rules(variables=None, costs=None):
+    """Return the validation rules enforcing GRAPHQL_QUERY_LIMITS"""
+    return [DepthLimitRule, AliasLimitRule,
+            QueryCostRule.bind(variables, costs)]
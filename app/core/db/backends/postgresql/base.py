@@ -0,0 +1,43 @@
+"""
+PostgreSQL backend borrowing connections from a per-process pool
+"""
+
+from functools import partial
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL backend with a bounded connection pool.
+
+    ``DATABASES[alias]['POOL']`` sets ``MAX_SIZE`` and ``TIMEOUT``.
+    Closing a connection, as Django does at the end of each request
+    with ``CONN_MAX_AGE = 0``, gives it back to the pool instead.
+    """
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+        self.pool = get_pool(self.alias, conn_params,
+                             options.get('MAX_SIZE', 10),
+                             options.get('TIMEOUT', 30))
+        connection = self.pool.acquire(
+            partial(super().get_new_connection, conn_params))
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        broken = bool(self.connection.closed) or self.errors_occurred
+        if not broken and self.connection.get_transaction_status() != \
+                extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                self.connection.rollback()
+            except base.Database.Error:
+                broken = True
+        self.pool.release(self.connection, discard=broken)
@@ -0,0 +1,33 @@
+"""
+SQLite backend applying the PRAGMAS setting to every new connection
+"""
+
+import os
+
+from django.db.backends.sqlite3 import base, creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """Test database creation removing WAL files with the database"""
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        super()._destroy_test_db(test_database_name, verbosity)
+        if not self.is_in_memory_db(test_database_name):
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(f'{test_database_name}{suffix}'):
+                    os.remove(f'{test_database_name}{suffix}')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend tuned for a single node.
+
+    ``DATABASES[alias]['PRAGMAS']`` maps pragma names to values, e.g.
+    WAL journaling so readers do not block the writer.
+    """
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
@@ -0,0 +1,113 @@
+"""
+Bounded pool of database connections shared by a process's threads
+"""
+
+import threading
+import time
+
+from django.db import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """No connection was released within the pool's timeout"""
+
+
+class ConnectionPool:
+    """Hand out at most max_size connections, made by the caller's
+    connect() when none is idle.
+
+    Callers beyond max_size wait up to timeout seconds for a connection
+    to be released. Released connections are reused, newest first, so
+    idle ones beyond what the load needs age out on the server side.
+    """
+
+    def __init__(self, max_size=10, timeout=30, params=None):
+        self.params = params
+        self.max_size = max_size
+        self.timeout = timeout
+        self.in_use = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self._idle = []
+        self._condition = threading.Condition()
+
+    def acquire(self, connect):
+        with self._condition:
+            deadline = time.monotonic() + self.timeout
+            self.waiting += 1
+            try:
+                while self.in_use >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        self.timeouts += 1
+                        raise PoolTimeout(
+                            f'No database connection free after '
+                            f'{self.timeout}s ({self.max_size} in use).')
+            finally:
+                self.waiting -= 1
+            self.in_use += 1
+            idle = self._idle.pop() if self._idle else None
+        if idle is not None:
+            return idle
+        try:
+            return connect()
+        except Exception:
+            self._return_slot()
+            raise
+
+    def release(self, connection, discard=False):
+        """Give a connection back, closing it instead if discard is set"""
+        if discard:
+            connection.close()
+        else:
+            with self._condition:
+                self._idle.append(connection)
+        self._return_slot()
+
+    def _return_slot(self):
+        with self._condition:
+            self.in_use -= 1
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'waiting': self.waiting,
+                'timeouts': self.timeouts,
+                'saturation': self.in_use / self.max_size,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, params, max_size, timeout):
+    """Return the process's pool for a database alias.
+
+    A new pool replaces the old one when the connection parameters
+    change, as they do when the test runner switches to the test
+    database.
+    """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None or pool.params != params:
+            if pool is not None:
+                pool.close()
+            pool = _pools[alias] = ConnectionPool(max_size, timeout, params)
+        return pool
+
+
+def pool_stats(alias):
+    """Return the stats of an alias's pool, or None if it has none"""
+    pool = _pools.get(alias)
+    return pool and pool.stats()
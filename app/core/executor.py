@@ -0,0 +1,112 @@
+"""
+Bounded thread pool and root field splitting for async GraphQL execution
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    FragmentDefinitionNode,
+    OperationDefinitionNode,
+    OperationType,
+    SelectionSetNode,
+)
+from graphql.execution.collect_fields import collect_fields
+from graphql.execution.values import get_variable_values
+
+DEFAULTS = {
+    # Serve /graphql with the async view; set for the ASGI app.
+    'ENABLED': False,
+    # Threads sync resolvers run on, which bounds the database
+    # connections the async view holds.
+    'WORKERS': 32,
+}
+
+
+def get_setting(name):
+    """Read a GRAPHQL_ASYNC setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_ASYNC', {}).get(name, DEFAULTS[name])
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def resolver_pool():
+    """Return the shared executor resolvers run on"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(get_setting('WORKERS'),
+                                       thread_name_prefix='graphql')
+        return _pool
+
+
+def _run(func, *args):
+    # Pool threads outlive requests, so apply CONN_MAX_AGE around each job
+    # the way request_started and request_finished do.
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args):
+    """Await func(*args) run on the resolver pool"""
+    return await sync_to_async(_run, thread_sensitive=False,
+                               executor=resolver_pool())(func, *args)
+
+
+def split_root_fields(schema, document, operation_ast, raw_variables):
+    """Split a query into one document per root field.
+
+    Returns None when there is nothing to split: mutations, which must
+    run in order, single field queries and invalid variables, which the
+    unsplit execution reports.
+    """
+    if (operation_ast is None
+            or operation_ast.operation != OperationType.QUERY):
+        return None
+    variables = get_variable_values(
+        schema, operation_ast.variable_definitions or (),
+        raw_variables or {})
+    if isinstance(variables, list):
+        return None
+
+    fragments = [definition for definition in document.definitions
+                 if isinstance(definition, FragmentDefinitionNode)]
+    fields = collect_fields(
+        schema, {fragment.name.value: fragment for fragment in fragments},
+        variables, schema.query_type, operation_ast.selection_set)
+    if len(fields) < 2:
+        return None
+
+    return [
+        DocumentNode(definitions=[OperationDefinitionNode(
+            operation=operation_ast.operation,
+            name=operation_ast.name,
+            variable_definitions=operation_ast.variable_definitions,
+            directives=operation_ast.directives,
+            selection_set=SelectionSetNode(selections=tuple(nodes)),
+        ), *fragments])
+        for nodes in fields.values()
+    ]
+
+
+def merge_results(results):
+    """Combine the results of split root fields in their original order"""
+    data = {}
+    errors = []
+    for result in results:
+        errors.extend(result.errors or ())
+        if result.data is None:
+            data = None
+        elif data is not None:
+            data.update(result.data)
+    return ExecutionResult(data=data, errors=errors or None)
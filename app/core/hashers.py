@@ -0,0 +1,135 @@
+"""
+Tuned password hashers and a bounded hashing pool
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    check_password,
+    make_password,
+)
+
+DEFAULT_COST = {
+    # Argon2id at the OWASP baseline: 19 MiB, two passes, one lane.
+    'ARGON2_TIME_COST': 2,
+    'ARGON2_MEMORY_COST': 19456,
+    'ARGON2_PARALLELISM': 1,
+    # Only used to verify, and then upgrade, existing PBKDF2 hashes.
+    'PBKDF2_ITERATIONS': PBKDF2PasswordHasher.iterations,
+    # Threads password hashes are computed on.
+    'POOL_SIZE': os.cpu_count() or 1,
+}
+
+
+def get_cost(name):
+    """Read a PASSWORD_HASHER_COST setting, falling back to defaults"""
+    return getattr(settings, 'PASSWORD_HASHER_COST', {}).get(
+        name, DEFAULT_COST[name])
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2 hasher with cost parameters from PASSWORD_HASHER_COST.
+
+    Hashes made with other parameters are rehashed on the next
+    successful login.
+    """
+
+    @property
+    def time_cost(self):
+        return get_cost('ARGON2_TIME_COST')
+
+    @property
+    def memory_cost(self):
+        return get_cost('ARGON2_MEMORY_COST')
+
+    @property
+    def parallelism(self):
+        return get_cost('ARGON2_PARALLELISM')
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 hasher with its iteration count from PASSWORD_HASHER_COST"""
+
+    @property
+    def iterations(self):
+        return get_cost('PBKDF2_ITERATIONS')
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def hashing_pool():
+    """Return the shared executor password hashes run on"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(get_cost('POOL_SIZE'),
+                                       thread_name_prefix='hashing')
+        return _pool
+
+
+def _verify(password, encoded):
+    rehashed = []
+    valid = check_password(password, encoded,
+                           setter=lambda raw: rehashed.append(raw))
+    return valid, make_password(password) if rehashed else None
+
+
+def _apply(user, result):
+    valid, encoded = result
+    if encoded is not None:
+        user.password = encoded
+        user.save(update_fields=['password'])
+    return valid
+
+
+def verify_password(user, password):
+    """Check user's password with the hash computed on the hashing pool.
+
+    Outdated hashes are replaced and saved in the calling thread, so the
+    pool never touches the database.
+    """
+    return _apply(user, hashing_pool().submit(
+        _verify, password, user.password).result())
+
+
+async def averify_password(user, password):
+    """Await verify_password without blocking the event loop.
+
+    A rehash is saved through sync_to_async, in the thread that owns
+    the caller's database connection.
+    """
+    result = await asyncio.wrap_future(
+        hashing_pool().submit(_verify, password, user.password))
+    return await sync_to_async(_apply)(user, result)
+
+
+class PooledModelBackend(ModelBackend):
+    """Model backend that verifies passwords on the hashing pool"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash anyway so unknown emails take as long as wrong passwords.
+            hashing_pool().submit(make_password, password).result()
+            return None
+        if verify_password(user, password) and \
+                self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,129 @@
+"""
+Per-request data loaders
+"""
+
+from django.contrib.auth import get_user_model
+
+
+class DataLoader:
+    """Batch and cache lookups by key for the lifetime of one request.
+
+    Keys queued with ``prime`` are fetched together with the first
+    ``load`` that misses the cache, so a list resolver can queue the
+    foreign keys of every row it returns and the nested resolvers share
+    a single query.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._queue = {}
+
+    def batch_load(self, keys):
+        """Return a mapping of key to value for the given keys"""
+        raise NotImplementedError
+
+    def is_cached(self, key):
+        """Whether key's cached value can be returned without a fetch"""
+        return key in self._cache
+
+    def prime(self, keys):
+        """Queue keys to be fetched with the next batch"""
+        for key in keys:
+            if key is not None and not self.is_cached(key):
+                self._queue[key] = None
+
+    def load(self, key):
+        """Return the value for key, fetching the queued batch on a miss"""
+        if key is None:
+            return None
+        if not self.is_cached(key):
+            self._queue[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        """Return the values for keys using at most one batch"""
+        keys = list(keys)
+        self.prime(keys)
+        return [self.load(key) for key in keys]
+
+    def dispatch(self):
+        """Fetch every queued key in one batch"""
+        keys = [key for key in self._queue if not self.is_cached(key)]
+        self._queue.clear()
+        if not keys:
+            return
+        found = self.batch_load(keys)
+        for key in keys:
+            self._cache[key] = found.get(key)
+
+    def clear(self, key):
+        """Drop a cached key so the next load refetches it"""
+        self._cache.pop(key, None)
+
+
+class UserLoader(DataLoader):
+    """Load users by id.
+
+    Each cached user remembers the columns it was fetched with. Once a
+    selection widens the columns, users fetched narrower count as misses
+    and are fetched again in the next batch rather than loading each
+    missing column row by row.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.fields = None
+        self._whole_rows = False
+        # Columns each cached key was fetched with, None for whole rows
+        self._columns = {}
+
+    def select(self, fields):
+        """Widen the columns later batches fetch; None fetches whole rows"""
+        if fields is None:
+            self._whole_rows = True
+        elif not self._whole_rows:
+            self.fields = (self.fields or set()) | set(fields)
+
+    def columns(self):
+        """Return the columns the next batch fetches, None for all"""
+        if self._whole_rows or not self.fields:
+            return None
+        return frozenset(self.fields)
+
+    def is_cached(self, key):
+        if key not in self._cache:
+            return False
+        fetched = self._columns.get(key)
+        if fetched is None:
+            return True
+        wanted = self.columns()
+        return wanted is not None and wanted <= fetched
+
+    def batch_load(self, keys):
+        users = get_user_model().objects
+        columns = self.columns()
+        if columns is not None:
+            users = users.only(*columns)
+        for key in keys:
+            self._columns[key] = columns
+        return users.in_bulk(keys)
+
+
+class Loaders:
+    """The loaders available to resolvers of one request"""
+
+    def __init__(self):
+        self.user = UserLoader()
+
+
+def get_loaders(info):
+    """Return the loaders scoped to the current execution context"""
+    context = info.context
+    if context is None:
+        return Loaders()
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
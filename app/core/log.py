@@ -0,0 +1,114 @@
+"""
+Structured, non-blocking event logging
+"""
+
+import atexit
+import json
+import logging
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+def get_event_logger(flow):
+    """Return the event logger for a flow such as 'auth' or 'request'"""
+    return logging.getLogger(f'events.{flow}')
+
+
+def log_event(logger, event, level=logging.INFO, exc_info=False, **fields):
+    """Log a named event with structured fields.
+
+    Pass exc_info=True from an except block to add the traceback.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info,
+                   extra={'event': event, 'fields': fields})
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(
+                record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': getattr(record, 'event', None),
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class EventFilter(logging.Filter):
+    """Apply per-event minimum levels and sampling rates.
+
+    ``levels`` maps an event name to the lowest level that is kept and
+    ``sample_rates`` maps it to the fraction of records that is kept.
+    Records without an event pass through untouched.
+    """
+
+    def __init__(self, levels=None, sample_rates=None):
+        super().__init__()
+        self.levels = {
+            event: level if isinstance(level, int)
+            else logging.getLevelName(level.upper())
+            for event, level in (levels or {}).items()
+        }
+        self.sample_rates = sample_rates or {}
+
+    def filter(self, record):
+        event = getattr(record, 'event', None)
+        if event is None:
+            return True
+        if record.levelno < self.levels.get(event, logging.NOTSET):
+            return False
+        rate = self.sample_rates.get(event, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class AsyncStreamHandler(QueueHandler):
+    """Queue records for a background thread that writes them to a stream.
+
+    The logging call only enqueues the record; formatting and the write
+    happen on the listener thread. When the queue is full records are
+    dropped and counted rather than blocking the caller.
+    """
+
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self.target = logging.StreamHandler(stream)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Block until every queued record has been written"""
+        if self.listener._thread is not None:
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,75 @@
+"""
+Rebuild the mentor request counters from core_request and report drift
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+
+from core.conditional import bump_version
+from core.models import MentorStats, Request
+
+
+ZERO = dict.fromkeys(MentorStats.COLUMNS.values(), 0)
+
+
+def count_requests(requests):
+    """Return {mentor_id: {column: count}} counted from requests"""
+    totals = requests.values('mentor_id').annotate(**{
+        column: Count('id', filter=Q(status=status))
+        for status, column in MentorStats.COLUMNS.items()}).order_by()
+    return {row.pop('mentor_id'): row for row in totals}
+
+
+def stored_counters(stats):
+    return {row.pop('mentor_id'): row
+            for row in stats.values('mentor_id', *ZERO)}
+
+
+class Command(BaseCommand):
+    help = ('Count every mentor\'s requests by status, compare the counts '
+            'with core_mentorstats and rewrite the counters that drifted. '
+            'Each mentor is fixed under a lock on their counters, so it '
+            'is safe to run while requests are being written.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drift without fixing it.')
+
+    def handle(self, *args, **options):
+        actual = count_requests(Request.objects.all())
+        stored = stored_counters(MentorStats.objects.all())
+        drifted = sorted(
+            mentor_id for mentor_id in actual.keys() | stored.keys()
+            if actual.get(mentor_id, ZERO) != stored.get(mentor_id, ZERO))
+
+        for mentor_id in drifted:
+            if not options['dry_run']:
+                actual[mentor_id] = self.rebuild(mentor_id)
+            before = stored.get(mentor_id, ZERO)
+            after = actual.get(mentor_id, ZERO)
+            self.stdout.write(f'mentor {mentor_id}: ' + ', '.join(
+                f'{column} {before[column]} -> {after[column]}'
+                for column in ZERO if before[column] != after[column]))
+
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(f'{verb} drift for {len(drifted)} of '
+                          f'{len(actual.keys() | stored.keys())} mentors.')
+
+    def rebuild(self, mentor_id):
+        """Recount one mentor's requests while holding their counters.
+
+        Request writes move the counters in their own transaction, so a
+        write that committed before the lock is in the recount and one
+        that commits after it applies its change on top.
+        """
+        with transaction.atomic():
+            MentorStats.objects.bulk_create(
+                [MentorStats(mentor_id=mentor_id)], ignore_conflicts=True)
+            stats = MentorStats.objects.filter(mentor_id=mentor_id)
+            stats.select_for_update().get()
+            counts = count_requests(Request.objects.filter(
+                mentor_id=mentor_id)).get(mentor_id, ZERO)
+            stats.update(**counts)
+            bump_version(MentorStats)
+        return counts
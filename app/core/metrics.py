@@ -0,0 +1,321 @@
+"""
+GraphQL resolver, operation and SQL metrics in Prometheus text format
+"""
+
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter as Tally
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connections
+from graphql import OperationType
+
+from core.log import get_event_logger, log_event
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Add an Apollo tracing style extensions.tracing block to responses.
+    'TRACING': False,
+    # Report an operation running one SQL statement more often than this.
+    'N_PLUS_ONE_THRESHOLD': 10,
+    # Label sets a metric keeps before folding new ones into "other".
+    'MAX_SERIES': 1000,
+}
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+logger = get_event_logger('graphql')
+
+
+def get_setting(name):
+    """Read a GRAPHQL_METRICS setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_METRICS', {}).get(name, DEFAULTS[name])
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join(f'{name}="{escape(value)}"'
+                             for name, value in pairs)
+
+
+class Metric:
+    """Metric with one series per combination of label values.
+
+    Values are kept per process, so each app server process exposes
+    its own series for Prometheus to aggregate.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def series(self, labels):
+        """Return the series for labels, creating it under the lock"""
+        key = tuple(str(labels[name]) for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            if len(self._series) >= get_setting('MAX_SERIES'):
+                key = ('other',) * len(self.labels)
+                series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self.new_series()
+        return series
+
+    def new_series(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                lines.extend(self.render_series(key, series))
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def new_series(self):
+        return [0]
+
+    def inc(self, amount=1, **labels):
+        with self._lock:
+            self.series(labels)[0] += amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self.series(labels)[0]
+
+    def render_series(self, key, series):
+        yield f'{self.name}{format_labels(self.labels, key)} {series[0]}'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def new_series(self):
+        # One count per bucket and +Inf, then the sum
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value, **labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series(labels)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        with self._lock:
+            return sum(self.series(labels)[:-1])
+
+    def render_series(self, key, series):
+        cumulative = 0
+        bounds = [*map(repr, self.buckets), '+Inf']
+        for bound, count in zip(bounds, series):
+            cumulative += count
+            labels = format_labels(self.labels, key, [('le', bound)])
+            yield f'{self.name}_bucket{labels} {cumulative}'
+        labels = format_labels(self.labels, key)
+        yield f'{self.name}_sum{labels} {series[-1]}'
+        yield f'{self.name}_count{labels} {cumulative}'
+
+
+class Registry:
+    """Metrics rendered together on the metrics endpoint"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+resolver_duration = REGISTRY.register(Histogram(
+    'graphql_resolver_duration_seconds',
+    'Time spent resolving each field.', ['field']))
+operation_duration = REGISTRY.register(Histogram(
+    'graphql_operation_duration_seconds',
+    'Time spent executing each operation.', ['type', 'operation']))
+operations = REGISTRY.register(Counter(
+    'graphql_operations_total',
+    'Operations executed, by outcome.', ['type', 'operation', 'status']))
+sql_queries = REGISTRY.register(Histogram(
+    'graphql_sql_queries_per_operation',
+    'SQL statements run by each operation.', ['type', 'operation'],
+    buckets=QUERY_COUNT_BUCKETS))
+sql_duration = REGISTRY.register(Histogram(
+    'graphql_sql_duration_seconds_per_operation',
+    'Time spent in SQL by each operation.', ['type', 'operation']))
+n_plus_one = REGISTRY.register(Counter(
+    'graphql_n_plus_one_total',
+    'Operations repeating one SQL statement over the threshold.',
+    ['type', 'operation']))
+
+# The trace of the operation executing in this context
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class OperationTrace:
+    """Timings and SQL statements of one operation.
+
+    Installed as a Django execute wrapper it counts every statement by
+    its SQL, parameters left out, so a statement repeated per row shows
+    up as one template run many times. Parts of an operation may run on
+    several threads and share the trace.
+    """
+
+    def __init__(self, operation_ast):
+        if operation_ast is None:
+            self.type, self.name = 'unknown', 'anonymous'
+        else:
+            self.type = operation_ast.operation.value
+            self.name = (operation_ast.name and operation_ast.name.value
+                         or 'anonymous')
+        self.tracing = get_setting('TRACING')
+        self.started_at = datetime.now(timezone.utc)
+        self.start = time.perf_counter()
+        self.statements = Tally()
+        self.sql_time = 0.0
+        self.resolvers = []
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.statements[sql] += 1
+                self.sql_time += time.perf_counter() - start
+
+    @contextmanager
+    def activate(self):
+        """Trace SQL and resolvers run in this thread within the block"""
+        token = current_trace.set(self)
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(
+                        self))
+                yield self
+        finally:
+            current_trace.reset(token)
+
+    def add_resolver(self, info, start, duration):
+        if not self.tracing:
+            return
+        with self._lock:
+            self.resolvers.append({
+                'path': info.path.as_list(),
+                'parentType': info.parent_type.name,
+                'fieldName': info.field_name,
+                'returnType': str(info.return_type),
+                'startOffset': int((start - self.start) * 1e9),
+                'duration': int(duration * 1e9),
+            })
+
+    def finish(self, result):
+        """Record the operation's metrics, returning its tracing block"""
+        duration = time.perf_counter() - self.start
+        labels = {'type': self.type, 'operation': self.name}
+        operation_duration.observe(duration, **labels)
+        operations.inc(status='error' if result.errors else 'ok', **labels)
+        sql_queries.observe(sum(self.statements.values()), **labels)
+        sql_duration.observe(self.sql_time, **labels)
+
+        threshold = get_setting('N_PLUS_ONE_THRESHOLD')
+        repeated = {sql: count for sql, count in self.statements.items()
+                    if count > threshold}
+        if repeated:
+            n_plus_one.inc(**labels)
+            for sql, count in repeated.items():
+                log_event(logger, 'sql.n_plus_one', level=logging.WARNING,
+                          operation=self.name, count=count, sql=sql)
+
+        if not self.tracing:
+            return None
+        return {
+            'version': 1,
+            'startTime': self.started_at.isoformat(),
+            'endTime': datetime.now(timezone.utc).isoformat(),
+            'duration': int(duration * 1e9),
+            'execution': {'resolvers': sorted(
+                self.resolvers, key=lambda r: r['startOffset'])},
+        }
+
+
+def start_trace(operation_ast):
+    """Return a trace for the operation, or None when metrics are off"""
+    if not get_setting('ENABLED'):
+        return None
+    if (operation_ast is not None
+            and operation_ast.operation == OperationType.SUBSCRIPTION):
+        return None
+    return OperationTrace(operation_ast)
+
+
+def activate(trace):
+    """Trace the block with trace, if there is one"""
+    return trace.activate() if trace is not None else nullcontext()
+
+
+class MetricsMiddleware:
+    """Graphene middleware timing every resolver.
+
+    List it first in ``GRAPHENE['MIDDLEWARE']`` so the time measured is
+    the resolver's own and not that of the other middleware.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        trace = current_trace.get()
+        if trace is None:
+            return next(root, info, **kwargs)
+        start = time.perf_counter()
+        try:
+            return next(root, info, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            resolver_duration.observe(
+                duration, field=f'{info.parent_type.name}.{info.field_name}')
+            trace.add_resolver(info, start, duration)
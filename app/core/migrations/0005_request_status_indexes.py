@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+STATUS_CODES = {'Pending': 0, 'Accepted': 1, 'Rejected': 2}
+
+
+def status_to_code(apps, schema_editor):
+    requests = apps.get_model('core', 'Request').objects.using(
+        schema_editor.connection.alias)
+    for label, code in STATUS_CODES.items():
+        requests.filter(status=label).update(status_code=code)
+
+
+def code_to_status(apps, schema_editor):
+    requests = apps.get_model('core', 'Request').objects.using(
+        schema_editor.connection.alias)
+    for label, code in STATUS_CODES.items():
+        requests.filter(status_code=code).update(status=label)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_request_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='status_code',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Pending'), (1, 'Accepted'), (2, 'Rejected')], default=0),
+        ),
+        migrations.RunPython(status_to_code, code_to_status),
+        migrations.RemoveField(
+            model_name='request',
+            name='status',
+        ),
+        migrations.RenameField(
+            model_name='request',
+            old_name='status_code',
+            new_name='status',
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='mentee',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='mentee', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['mentor', 'status', 'id'], name='request_mentor_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['mentee', 'id'], name='request_mentee_idx'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:30
+
+from django.db import migrations
+
+# SQLite: an FTS5 table holding the searchable columns of mentors, kept up
+# to date by triggers. Rebuilding core_user on SQLite (as some later
+# AlterField operations do) drops the triggers; such migrations must run
+# SQLITE_FORWARD again.
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS core_user_search
+       USING fts5(expertise, occupation, bio)""",
+    """DROP TRIGGER IF EXISTS core_user_search_insert""",
+    """CREATE TRIGGER core_user_search_insert
+       AFTER INSERT ON core_user WHEN new.is_mentor BEGIN
+           INSERT INTO core_user_search(rowid, expertise, occupation, bio)
+           VALUES (new.id, new.expertise, new.occupation, new.bio);
+       END""",
+    """DROP TRIGGER IF EXISTS core_user_search_update""",
+    """CREATE TRIGGER core_user_search_update
+       AFTER UPDATE OF is_mentor, expertise, occupation, bio ON core_user
+       BEGIN
+           DELETE FROM core_user_search WHERE rowid = old.id;
+           INSERT INTO core_user_search(rowid, expertise, occupation, bio)
+           SELECT new.id, new.expertise, new.occupation, new.bio
+           WHERE new.is_mentor;
+       END""",
+    """DROP TRIGGER IF EXISTS core_user_search_delete""",
+    """CREATE TRIGGER core_user_search_delete
+       AFTER DELETE ON core_user WHEN old.is_mentor BEGIN
+           DELETE FROM core_user_search WHERE rowid = old.id;
+       END""",
+    """DELETE FROM core_user_search""",
+    """INSERT INTO core_user_search(rowid, expertise, occupation, bio)
+       SELECT id, expertise, occupation, bio FROM core_user
+       WHERE is_mentor""",
+]
+
+SQLITE_BACKWARD = [
+    """DROP TRIGGER IF EXISTS core_user_search_insert""",
+    """DROP TRIGGER IF EXISTS core_user_search_update""",
+    """DROP TRIGGER IF EXISTS core_user_search_delete""",
+    """DROP TABLE IF EXISTS core_user_search""",
+]
+
+# Postgres: a generated, weighted tsvector column the database keeps up
+# to date on every write, with a GIN index over mentors only.
+POSTGRES_FORWARD = [
+    """ALTER TABLE core_user ADD COLUMN search_vector tsvector
+       GENERATED ALWAYS AS (
+           setweight(to_tsvector('english', expertise), 'A') ||
+           setweight(to_tsvector('english', occupation), 'B') ||
+           setweight(to_tsvector('english', bio), 'C')
+       ) STORED""",
+    """CREATE INDEX core_user_search_idx ON core_user
+       USING gin (search_vector) WHERE is_mentor""",
+]
+
+POSTGRES_BACKWARD = [
+    """DROP INDEX IF EXISTS core_user_search_idx""",
+    """ALTER TABLE core_user DROP COLUMN IF EXISTS search_vector""",
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+}
+
+
+def run(direction):
+    def operation(apps, schema_editor):
+        statements = STATEMENTS.get(schema_editor.connection.vendor)
+        for sql in statements[direction] if statements else ():
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_request_status_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(0), run(1)),
+    ]
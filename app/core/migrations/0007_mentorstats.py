@@ -0,0 +1,38 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:56
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+STATUS_COLUMNS = {0: 'pending', 1: 'accepted', 2: 'rejected'}
+
+
+def count_requests(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    totals = apps.get_model('core', 'Request').objects.using(alias).values(
+        'mentor_id').annotate(**{
+            column: Count('id', filter=Q(status=code))
+            for code, column in STATUS_COLUMNS.items()})
+    MentorStats = apps.get_model('core', 'MentorStats')
+    MentorStats.objects.using(alias).bulk_create(
+        [MentorStats(**row) for row in totals.order_by()], batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_user_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MentorStats',
+            fields=[
+                ('mentor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.user')),
+                ('pending', models.IntegerField(default=0)),
+                ('accepted', models.IntegerField(default=0)),
+                ('rejected', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_requests, migrations.RunPython.noop),
+    ]
@@ -2,14 +2,19 @@
 Database Models
 """
 
+from collections import Counter, defaultdict
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
+from core.conditional import bump_version
+
 
 class UserManager(BaseUserManager):
     """Manager for user."""
@@ -29,7 +34,7 @@ class UserManager(BaseUserManager):
         user = self.create_user(email, password)
         user.is_staff = True
         user.is_superuser = True
-        user.save(using=self._db)
+        user.save(using=self._db, update_fields=['is_staff', 'is_superuser'])
 
         return user
 
@@ -55,11 +60,84 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class RequestQuerySet(models.QuerySet):
+    """Request queries"""
+
+    def lock(self):
+        """Take the write locks on the matching rows before reading them.
+
+        The UPDATE changes nothing, but SQLite takes its write lock up
+        front instead of upgrading a read lock, which fails while another
+        connection writes, and Postgres locks the rows like SELECT ...
+        FOR UPDATE. Call inside a transaction."""
+        return self.update(status=F('status'))
+
+    def transition(self, status):
+        """Move the matching requests to status where the state machine
+        allows it. Returns the rows changed.
+
+        The requests are locked and then read in one transaction, so of
+        two concurrent transitions on the same request only one applies
+        and the counters move by the rows actually moved."""
+        with transaction.atomic():
+            requests = self.filter(status__in=Request.sources(status))
+            requests.lock()
+            return self.move(list(requests.only('mentor', 'status')),
+                             status)
+
+    def move(self, requests, status):
+        """Move requests, read in the current transaction, to status and
+        their mentors' counters with them. Returns the rows changed.
+
+        Requests are grouped by mentor and the status they were read
+        with, and each group is moved by one UPDATE conditioned on that
+        status. The counters move by the rows each UPDATE changed, so a
+        request changed since it was read (rows read without lock())
+        is neither moved nor counted."""
+        groups = defaultdict(list)
+        for request in requests:
+            if status in Request.TRANSITIONS[request.status]:
+                groups[request.mentor_id, request.status].append(request.id)
+        if not groups:
+            return 0
+        changes = Counter()
+        moved = 0
+        for (mentor_id, source), ids in groups.items():
+            changed = self.filter(id__in=ids, status=source).update(
+                status=status)
+            changes[mentor_id, source] -= changed
+            changes[mentor_id, status] += changed
+            moved += changed
+        MentorStats.objects.record(changes)
+        bump_version(self.model)
+        return moved
+
+
 class Request(models.Model):
     """Mentorship Request Model"""
     class Meta:
         ordering = ['id']
-
+        indexes = [
+            models.Index(fields=['mentor', 'status', 'id'],
+                         name='request_mentor_status_idx'),
+            models.Index(fields=['mentee', 'id'],
+                         name='request_mentee_idx'),
+        ]
+
+    class Status(models.IntegerChoices):
+        PENDING = 0, 'Pending'
+        ACCEPTED = 1, 'Accepted'
+        REJECTED = 2, 'Rejected'
+
+    # The statuses a request in each status may move to
+    TRANSITIONS = {
+        Status.PENDING: (Status.ACCEPTED, Status.REJECTED),
+        Status.ACCEPTED: (),
+        Status.REJECTED: (),
+    }
+
+    # The mentor foreign key index still serves mentorRequests without a
+    # status filter in id order; (mentee, id) covers the mentee one.
     mentor = models.ForeignKey(
        settings.AUTH_USER_MODEL,
        related_name='mentor',
@@ -68,11 +146,87 @@ class Request(models.Model):
     mentee = models.ForeignKey(
        settings.AUTH_USER_MODEL,
        related_name='mentee',
-       on_delete=models.CASCADE
+       on_delete=models.CASCADE,
+       db_index=False
     )
     question = models.CharField(max_length=255)
-    status = models.CharField(max_length=255, default="Pending")
+    status = models.PositiveSmallIntegerField(
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+
+    objects = RequestQuerySet.as_manager()
+
+    @classmethod
+    def sources(cls, status):
+        """Return the statuses that may move to status"""
+        return [source for source, targets in cls.TRANSITIONS.items()
+                if status in targets]
+
+    def can_transition(self, status):
+        """Whether this request may move to status"""
+        return status in self.TRANSITIONS[self.status]
 
     def __str__(self) -> str:
         """To string method"""
         return self.question
+
+
+class MentorStatsQuerySet(models.QuerySet):
+    """Mentor counter queries"""
+
+    def record(self, changes, insert=True):
+        """Add changes, a mapping of (mentor_id, status) to a count, to
+        the mentors' counters with one INSERT and one UPDATE.
+
+        Missing rows are inserted at zero and every counter is moved
+        with an F() expression, so concurrent writers never overwrite
+        each other. With insert=False mentors without a row are left
+        alone. Call it in the transaction writing the requests."""
+        changes = {key: delta for key, delta in changes.items() if delta}
+        if not changes:
+            return
+        mentor_ids = {mentor_id for mentor_id, _ in changes}
+        if insert:
+            self.bulk_create([self.model(mentor_id=mentor_id)
+                              for mentor_id in mentor_ids],
+                             ignore_conflicts=True)
+        counters = {}
+        for status, column in MentorStats.COLUMNS.items():
+            deltas = [When(mentor_id=mentor_id, then=Value(delta))
+                      for (mentor_id, source), delta in changes.items()
+                      if source == status]
+            if deltas:
+                counters[column] = F(column) + Case(*deltas,
+                                                    default=Value(0))
+        self.filter(mentor_id__in=mentor_ids).update(**counters)
+        bump_version(self.model)
+
+
+class MentorStats(models.Model):
+    """Running totals of a mentor's requests by status.
+
+    Saving a new request counts it, transitions move it between counters
+    and deleting it uncounts it; bulk inserts must record their requests
+    themselves. Writes bypassing these, such as QuerySet.update() or raw
+    SQL, drift the counters until the reconcile_mentor_stats command
+    rebuilds them from core_request.
+    """
+    mentor = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        primary_key=True,
+        related_name='stats',
+        on_delete=models.CASCADE
+    )
+    pending = models.IntegerField(default=0)
+    accepted = models.IntegerField(default=0)
+    rejected = models.IntegerField(default=0)
+
+    # The counter of each request status
+    COLUMNS = {
+        Request.Status.PENDING: 'pending',
+        Request.Status.ACCEPTED: 'accepted',
+        Request.Status.REJECTED: 'rejected',
+    }
+
+    objects = MentorStatsQuerySet.as_manager()
@@ -0,0 +1,179 @@
+"""
+Keyset (cursor) pagination for Relay connections
+"""
+
+import binascii
+from functools import partial
+
+import graphene
+from django.db.models import QuerySet
+from graphene_django.settings import graphene_settings
+from graphene_django.types import DjangoObjectType
+from graphql import GraphQLError
+from graphql_relay.utils import base64, unbase64
+
+from core.cache import get_cache, make_key
+from core.projection import project
+
+CURSOR_PREFIX = 'keyset:'
+
+
+def id_to_cursor(pk):
+    """Encode a primary key as an opaque cursor"""
+    return base64(f'{CURSOR_PREFIX}{pk}')
+
+
+def cursor_to_id(cursor):
+    """Decode a cursor back to the primary key it points at"""
+    try:
+        value = unbase64(cursor)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        value = ''
+    prefix, _, pk = value.partition(':')
+    if prefix + ':' != CURSOR_PREFIX or not pk.isdigit():
+        raise GraphQLError(f'Invalid cursor "{cursor}".')
+    return int(pk)
+
+
+class CountableConnection(graphene.relay.Connection):
+    """Connection exposing the total row count on demand"""
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(self, info):
+        """Count is only run when the client selects totalCount"""
+        count = getattr(self, 'count', None) or self.iterable.count
+        return count()
+
+
+class KeysetConnectionField(graphene.relay.ConnectionField):
+    """Connection field paging a queryset by primary key.
+
+    Pages are fetched with ``WHERE id > after`` / ``WHERE id < before``
+    and a ``LIMIT`` one row larger than the page, so the cost of a page
+    does not grow with its depth the way ``OFFSET`` does. ``first`` and
+    ``last`` are capped at ``RELAY_CONNECTION_MAX_LIMIT`` and default to
+    it when neither is given. Querysets are projected down to the
+    columns the selected nodes read. Pages of fields given a
+    ``cache_namespace`` are read through the read cache, keyed on the
+    projected query and the arguments.
+    """
+
+    def __init__(self, type_, *args, on_page=None, cache_namespace=None,
+                 **kwargs):
+        self.on_page = on_page
+        self.cache_namespace = cache_namespace
+        super().__init__(type_, *args, **kwargs)
+
+    @classmethod
+    def page_limits(cls, args):
+        """Return the checked first and last, defaulting to a full page"""
+        first = args.get('first')
+        last = args.get('last')
+        max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+
+        for name, value in (('first', first), ('last', last)):
+            if value is None:
+                continue
+            if value < 0:
+                raise GraphQLError(f'Argument `{name}` must be non-negative.')
+            if max_limit and value > max_limit:
+                raise GraphQLError(
+                    f'Requesting {value} records exceeds the `{name}` '
+                    f'limit of {max_limit} records.')
+        if first is None and last is None:
+            first = max_limit
+        return first, last
+
+    @classmethod
+    def cursor_for(cls, node):
+        return id_to_cursor(node.pk)
+
+    @classmethod
+    def fetch_page(cls, queryset, args):
+        """Return the page's nodes and whether pages exist either side"""
+        first, last = cls.page_limits(args)
+        after = args.get('after')
+        before = args.get('before')
+
+        window = queryset
+        if after is not None:
+            window = window.filter(pk__gt=cursor_to_id(after))
+        if before is not None:
+            window = window.filter(pk__lt=cursor_to_id(before))
+
+        has_next_page = has_previous_page = False
+        if first is not None:
+            nodes = list(window.order_by('pk')[:first + 1])
+            has_next_page = len(nodes) > first
+            nodes = nodes[:first]
+            if last is not None and len(nodes) > last:
+                nodes = nodes[len(nodes) - last:]
+                has_previous_page = True
+        else:
+            nodes = list(window.order_by('-pk')[:last + 1])
+            has_previous_page = len(nodes) > last
+            nodes = nodes[:last][::-1]
+        return nodes, has_previous_page, has_next_page
+
+    @classmethod
+    def resolve_connection(cls, connection_type, args, queryset,
+                           cache_namespace=None):
+        if isinstance(queryset, connection_type):
+            return queryset
+
+        cache = (cache_namespace and isinstance(queryset, QuerySet)
+                 and get_cache())
+        if cache:
+            key = make_key(str(queryset.query), sorted(args.items()))
+            page = cache.get_or_set(cache_namespace, key,
+                                    partial(cls.fetch_page, queryset, args))
+            count = partial(cache.get_or_set, cache_namespace,
+                            make_key(str(queryset.query)), queryset.count)
+        else:
+            page = cls.fetch_page(queryset, args)
+            count = queryset.count
+        nodes, has_previous_page, has_next_page = page
+
+        edges = [
+            connection_type.Edge(node=node, cursor=cls.cursor_for(node))
+            for node in nodes
+        ]
+        connection = connection_type(
+            edges=edges,
+            page_info=graphene.relay.PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            ),
+        )
+        connection.iterable = queryset
+        connection.count = count
+        return connection
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection_type, on_page,
+                            cache_namespace, root, info, **args):
+        if isinstance(connection_type, graphene.NonNull):
+            connection_type = connection_type.of_type
+
+        resolved = resolver(root, info, **args)
+        node_type = connection_type._meta.node
+        if isinstance(resolved, QuerySet) and issubclass(
+                node_type, DjangoObjectType):
+            resolved = project(resolved, info, node_type, 'edges', 'node')
+
+        connection = cls.resolve_connection(connection_type, args, resolved,
+                                            cache_namespace)
+        if on_page is not None:
+            on_page(info, [edge.node for edge in connection.edges])
+        return connection
+
+    def wrap_resolve(self, parent_resolver):
+        resolver = super(graphene.relay.ConnectionField, self).wrap_resolve(
+            parent_resolver)
+        return partial(self.connection_resolver, resolver, self.type,
+                       self.on_page, self.cache_namespace)
@@ -0,0 +1,77 @@
+"""
+Persisted query registry and parsed document cache
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+
+DEFAULTS = {
+    # Number of parsed and validated documents kept in memory.
+    'CACHE_SIZE': 1000,
+    # Path to a JSON file mapping sha256 hashes to query documents.
+    'ALLOW_LIST': None,
+    # Reject every query that is not in the allow-list.
+    'ALLOW_LIST_ONLY': False,
+}
+
+
+def get_setting(name):
+    """Read a GRAPHQL_PERSISTED_QUERIES setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', {}).get(
+        name, DEFAULTS[name])
+
+
+def query_hash(query):
+    """Return the APQ hash (hex sha256) of a query document"""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_allow_list(path):
+    """Read a hash to query mapping, checking every hash matches its query"""
+    if not path:
+        return {}
+    with open(path) as f:
+        queries = json.load(f)
+    for sha, query in queries.items():
+        if query_hash(query) != sha:
+            raise ValueError(f'Allow-list hash {sha} does not match its query')
+    return queries
+
+
+class DocumentCache:
+    """Thread-safe LRU cache of validated documents keyed by query hash"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+            return document
+
+    def set(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    def __len__(self):
+        return len(self._documents)
+
+
+documents = DocumentCache(get_setting('CACHE_SIZE'))
@@ -0,0 +1,142 @@
+"""
+Selection-aware queryset projection
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene import Dynamic, List, NonNull
+from graphene.utils.str_converters import to_camel_case
+from graphene_django.types import DjangoObjectType
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def collect_fields(info, field_nodes):
+    """Map each field name selected under field_nodes to its nodes.
+
+    Fragment spreads and inline fragments are expanded and aliases are
+    folded onto the underlying field name, so ``a: email`` and a
+    fragment selecting ``email`` both count as ``email``.
+    """
+    fields = {}
+
+    def collect(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                fields.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, FragmentSpreadNode):
+                collect(info.fragments[selection.name.value].selection_set)
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+
+    for node in field_nodes:
+        collect(node.selection_set)
+    return fields
+
+
+def descend(info, field_nodes, *path):
+    """Return the nodes found by following path down the selection"""
+    for name in path:
+        field_nodes = collect_fields(info, field_nodes).get(name, [])
+    return field_nodes
+
+
+def _unwrap(field):
+    if isinstance(field, Dynamic):
+        field = field.get_type()
+    type_ = getattr(field, 'type', None)
+    while isinstance(type_, (NonNull, List)):
+        type_ = type_.of_type
+    return type_
+
+
+def _graphql_names(object_type):
+    names = {}
+    for name, field in object_type._meta.fields.items():
+        names[getattr(field, 'name', None) or to_camel_case(name)] = name
+    return names
+
+
+def get_projection(info, object_type, field_nodes):
+    """Work out the columns and relations a selection reads.
+
+    Returns ``(only, select_related, prefetch_related)`` for the model
+    behind object_type, or ``None`` when a selected field cannot be
+    mapped to model columns and the whole row has to be loaded. Types
+    may declare ``field_projections`` mapping a field to the model
+    paths its resolver reads.
+    """
+    model = object_type._meta.model
+    hints = getattr(object_type, 'field_projections', {})
+    names = _graphql_names(object_type)
+    only = {model._meta.pk.name}
+    select_related = set()
+    prefetch_related = []
+
+    for graphql_name, nodes in collect_fields(info, field_nodes).items():
+        name = names.get(graphql_name)
+        if name is None:
+            if graphql_name.startswith('__'):
+                continue
+            return None
+        if name in hints:
+            only.update(hints[name])
+            continue
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+        related_type = _unwrap(object_type._meta.fields[name])
+        if not model_field.is_relation or not (
+                isinstance(related_type, type)
+                and issubclass(related_type, DjangoObjectType)):
+            only.add(model_field.name)
+            continue
+
+        related = get_projection(info, related_type, nodes)
+        if model_field.many_to_one or (
+                model_field.one_to_one and model_field.concrete):
+            if related is None:
+                related = ({f.name for f in related_type._meta.model._meta
+                            .concrete_fields}, set(), [])
+            only.add(model_field.name)
+            select_related.add(model_field.name)
+            only.update(f'{model_field.name}__{f}' for f in related[0])
+            select_related.update(
+                f'{model_field.name}__{f}' for f in related[1])
+            prefetch_related.extend(
+                Prefetch(f'{model_field.name}__{p.prefetch_through}',
+                         queryset=p.queryset)
+                for p in related[2])
+        else:
+            queryset = related_type._meta.model._default_manager.all()
+            if related is not None:
+                remote = getattr(model_field, 'field', None)
+                if model_field.one_to_many and remote is not None:
+                    related[0].add(remote.name)
+                queryset = apply_projection(queryset, related)
+            prefetch_related.append(Prefetch(name, queryset=queryset))
+
+    return only, select_related, prefetch_related
+
+
+def apply_projection(queryset, projection):
+    """Apply a projection from get_projection to queryset"""
+    if projection is None:
+        return queryset
+    only, select_related, prefetch_related = projection
+    queryset = queryset.only(*only)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+
+def project(queryset, info, object_type, *path):
+    """Restrict queryset to what the current selection under path reads"""
+    field_nodes = descend(info, info.field_nodes, *path)
+    return apply_projection(
+        queryset, get_projection(info, object_type, field_nodes))
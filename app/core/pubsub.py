@@ -0,0 +1,192 @@
+"""
+Channel layers delivering published events to subscribers
+"""
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    # Dotted path to the channel layer class, built with OPTIONS as kwargs.
+    'BACKEND': 'core.pubsub.InMemoryChannelLayer',
+    'OPTIONS': {},
+    # Seconds a WebSocket may stay open without sending connection_init.
+    'CONNECTION_INIT_TIMEOUT': 10,
+}
+
+
+def get_setting(name):
+    """Read a GRAPHQL_SUBSCRIPTIONS setting, falling back to defaults"""
+    return getattr(settings, 'GRAPHQL_SUBSCRIPTIONS', {}).get(
+        name, DEFAULTS[name])
+
+
+class Subscription:
+    """Buffer of messages for one subscriber on its event loop.
+
+    Messages may be put from any thread. Once ``capacity`` messages wait
+    unread the oldest are dropped, so a slow subscriber cannot hold
+    memory for everything published to it.
+    """
+
+    def __init__(self, capacity):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.capacity = capacity
+        self.dropped = 0
+
+    def _put(self, message):
+        if self.queue.qsize() >= self.capacity:
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    def put(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The subscriber's loop closed before it unsubscribed.
+            pass
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InMemoryChannelLayer:
+    """Channel layer fanning messages out within this process.
+
+    Each group has its own set of subscribers, so publishing to a group
+    only touches the subscribers of that group. Suits a single app
+    server; events published by other processes are never seen.
+    """
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._groups = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, group, message):
+        """Send a JSON serializable message to the group's subscribers"""
+        self.deliver(group, json.loads(json.dumps(message)))
+
+    def deliver(self, group, message):
+        with self._lock:
+            subscriptions = list(self._groups.get(group, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def group_added(self, group):
+        """Called when a group gets its first subscriber"""
+
+    def group_discarded(self, group):
+        """Called when a group loses its last subscriber"""
+
+    async def subscribe(self, group):
+        """Yield messages published to group until closed"""
+        subscription = Subscription(self.capacity)
+        # Hooks run under the lock so they see groups change in order.
+        with self._lock:
+            subscriptions = self._groups[group]
+            subscriptions.add(subscription)
+            if len(subscriptions) == 1:
+                self.group_added(group)
+        try:
+            while True:
+                yield await subscription.get()
+        finally:
+            with self._lock:
+                subscriptions = self._groups[group]
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._groups[group]
+                    self.group_discarded(group)
+
+    def group_sizes(self):
+        """Return the number of local subscribers of each group"""
+        with self._lock:
+            return {group: len(subscriptions)
+                    for group, subscriptions in self._groups.items()}
+
+
+class RedisChannelLayer(InMemoryChannelLayer):
+    """Channel layer sharing messages between processes over Redis.
+
+    Takes a ready client, or a URL a ``redis.Redis`` client is made
+    from; any client with ``publish`` and a ``pubsub`` supporting
+    ``subscribe``, ``unsubscribe`` and ``get_message`` works. Each
+    process holds one Redis subscription per group with local
+    subscribers and a single thread reading them, then fans messages
+    out locally, so a message only reaches processes serving one of its
+    recipients.
+    """
+
+    def __init__(self, capacity=100, url=None, client=None,
+                 prefix='graphql:', poll_interval=1.0):
+        super().__init__(capacity)
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._reader = None
+        self._reader_lock = threading.Lock()
+        self._closed = threading.Event()
+
+    def publish(self, group, message):
+        self.client.publish(self.prefix + group, json.dumps(message))
+
+    def group_added(self, group):
+        self.pubsub.subscribe(self.prefix + group)
+        with self._reader_lock:
+            if self._reader is None:
+                self._reader = threading.Thread(
+                    target=self.read, name='graphql-pubsub', daemon=True)
+                self._reader.start()
+
+    def group_discarded(self, group):
+        self.pubsub.unsubscribe(self.prefix + group)
+
+    def read(self):
+        while not self._closed.is_set():
+            message = self.pubsub.get_message(timeout=self.poll_interval)
+            if not message or message.get('type') != 'message':
+                continue
+            channel, data = message['channel'], message['data']
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            self.deliver(channel[len(self.prefix):], json.loads(data))
+
+    def close(self):
+        self._closed.set()
+        if self._reader is not None:
+            self._reader.join()
+        self.pubsub.close()
+
+
+_layer = None
+_layer_lock = threading.Lock()
+
+
+def get_channel_layer():
+    """Return the configured channel layer"""
+    global _layer
+    with _layer_lock:
+        if _layer is None:
+            backend = import_string(get_setting('BACKEND'))
+            _layer = backend(**get_setting('OPTIONS'))
+        return _layer
+
+
+@receiver(setting_changed)
+def reset_channel_layer(setting, **kwargs):
+    global _layer
+    if setting == 'GRAPHQL_SUBSCRIPTIONS':
+        _layer = None
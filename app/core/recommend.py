@@ -0,0 +1,321 @@
+"""
+Mentor recommendations from hashed TF-IDF vectors of mentor profiles
+"""
+
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from scipy import sparse
+
+from core.log import get_event_logger, log_event
+from core.models import User
+from core.search import SEARCH_FIELDS
+
+DEFAULTS = {
+    # Columns words and word pairs are hashed into; more columns mean
+    # fewer collisions and a larger document frequency array.
+    'FEATURES': 2 ** 20,
+    # How much a term counts towards a profile by the field it is in.
+    'FIELD_WEIGHTS': {'expertise': 3.0, 'occupation': 2.0, 'bio': 1.0},
+    # Seconds after which the index is rebuilt in the background. Saves
+    # in this process update it at once; this picks up the rest (other
+    # processes, QuerySet.update()). None never rebuilds.
+    'MAX_AGE': 300,
+    # Saved profiles wait in a side matrix until this many are merged
+    # into the main one.
+    'MERGE_EVERY': 1000,
+    # Most mentors one query may ask for.
+    'MAX_FIRST': 50,
+}
+
+# Columns a profile change must touch to change its vector
+PROFILE_FIELDS = frozenset(SEARCH_FIELDS) | {'is_mentor', 'is_active'}
+WORDS = re.compile(r'\w+')
+
+logger = get_event_logger('recommend')
+
+
+def get_setting(name):
+    """Read a MENTOR_RECOMMENDATIONS setting, falling back to defaults"""
+    return getattr(settings, 'MENTOR_RECOMMENDATIONS', {}).get(
+        name, DEFAULTS[name])
+
+
+def hash_terms(text, weight=1.0, counts=None):
+    """Add weight to the hashed column of each word and word pair"""
+    counts = Counter() if counts is None else counts
+    words = WORDS.findall((text or '').lower())
+    size = get_setting('FEATURES')
+    for term in words + [f'{a} {b}' for a, b in zip(words, words[1:])]:
+        counts[zlib.crc32(term.encode()) % size] += weight
+    return counts
+
+
+def to_vector(counts):
+    """Return sorted columns and their log-scaled, unit length weights"""
+    columns = np.fromiter(counts, np.int64, len(counts))
+    weights = np.log1p(np.fromiter(counts.values(), np.float64,
+                                   len(counts)))
+    order = np.argsort(columns)
+    norm = np.linalg.norm(weights)
+    return columns[order], weights[order] / (norm or 1.0)
+
+
+def profile_vector(user):
+    """Return the columns and weights of a mentor's profile"""
+    counts = Counter()
+    for field, weight in get_setting('FIELD_WEIGHTS').items():
+        hash_terms(getattr(user, field), weight, counts)
+    return to_vector(counts)
+
+
+def is_listed(user):
+    return user.is_mentor and user.is_active
+
+
+class MentorIndex:
+    """Profile vectors of the mentors, one sparse row each.
+
+    Rows carry term frequencies only. Inverse document frequencies are
+    applied to the question, twice, so they can change as mentors come
+    and go without rewriting any row. The main matrix is CSC: a question
+    reads just the columns of its own terms and is scored against every
+    mentor with one sparse matrix-vector product. Saved profiles go to
+    a small side matrix and their old rows are masked out until the two
+    are merged.
+    """
+
+    def __init__(self, ids, matrix):
+        self.lock = threading.Lock()
+        self.load(ids, matrix)
+        self.df = np.diff(self.matrix.indptr).astype(np.int32)
+        self.built = time.monotonic()
+
+    def load(self, ids, matrix):
+        """Make ids and the CSR matrix of their vectors the main rows"""
+        self.ids = ids
+        # Rows are read to drop a mentor, columns to score a question
+        self.rows_matrix = matrix
+        self.matrix = matrix.tocsc()
+        self.live = np.ones(len(ids), bool)
+        self.rows = {id: row for row, id in enumerate(ids.tolist())}
+        # Saved profiles since the last merge, by mentor id
+        self.side = {}
+        self.side_matrix = None
+
+    @classmethod
+    def build(cls, users):
+        """Vectorize the profiles of users in one pass"""
+        ids, indptr, columns, weights = [], [0], [], []
+        for user in users:
+            user_columns, user_weights = profile_vector(user)
+            ids.append(user.pk)
+            columns.append(user_columns)
+            weights.append(user_weights)
+            indptr.append(indptr[-1] + len(user_columns))
+        matrix = sparse.csr_matrix(
+            (np.concatenate(weights) if weights else np.empty(0),
+             np.concatenate(columns) if columns else np.empty(0, np.int64),
+             np.array(indptr)),
+            shape=(len(ids), get_setting('FEATURES')))
+        return cls(np.array(ids, np.int64), matrix)
+
+    def __len__(self):
+        return int(self.live.sum()) + len(self.side)
+
+    def update(self, user):
+        """Replace a mentor's vector, or drop it if they are not listed"""
+        with self.lock:
+            self._drop(user.pk)
+            if is_listed(user):
+                vector = profile_vector(user)
+                self.side[user.pk] = vector
+                self.df[vector[0]] += 1
+            self.side_matrix = None
+            if len(self.side) >= get_setting('MERGE_EVERY'):
+                self._merge()
+
+    def remove(self, user_id):
+        with self.lock:
+            self._drop(user_id)
+            self.side_matrix = None
+
+    def _drop(self, user_id):
+        if user_id in self.side:
+            self.df[self.side.pop(user_id)[0]] -= 1
+        row = self.rows.pop(user_id, None)
+        if row is not None:
+            self.live[row] = False
+            start, end = self.rows_matrix.indptr[row:row + 2]
+            self.df[self.rows_matrix.indices[start:end]] -= 1
+
+    def _merge(self):
+        """Fold the side matrix into the main one, dropping masked rows"""
+        kept = np.flatnonzero(self.live)
+        self.load(
+            np.concatenate([self.ids[kept], np.fromiter(
+                self.side, np.int64, len(self.side))]),
+            sparse.vstack([self.rows_matrix[kept], self._side_matrix()],
+                          format='csr'))
+
+    def _side_matrix(self):
+        if self.side_matrix is None:
+            vectors = list(self.side.values())
+            self.side_matrix = sparse.csr_matrix(
+                (np.concatenate([w for _, w in vectors] or [np.empty(0)]),
+                 np.concatenate([c for c, _ in vectors]
+                                or [np.empty(0, np.int64)]),
+                 np.cumsum([0] + [len(c) for c, _ in vectors])),
+                shape=(len(vectors), self.matrix.shape[1]))
+        return self.side_matrix
+
+    def recommend(self, question, first):
+        """Return up to first (mentor id, score) pairs, best first"""
+        counts = hash_terms(question)
+        if not counts:
+            return []
+        columns, weights = to_vector(counts)
+        with self.lock:
+            documents = len(self)
+            idf = np.log((1 + documents) / (1 + self.df[columns])) + 1
+            query = weights * idf
+            query *= idf / (np.linalg.norm(query) or 1.0)
+            scores = self.matrix[:, columns] @ query
+            scores[~self.live] = 0
+            ids = self.ids
+            if self.side:
+                scores = np.concatenate(
+                    [scores, self._side_matrix()[:, columns] @ query])
+                ids = np.concatenate([ids, np.fromiter(
+                    self.side, np.int64, len(self.side))])
+        matches = np.flatnonzero(scores > 0)
+        if len(matches) > first:
+            matches = matches[np.argpartition(-scores[matches],
+                                              first - 1)[:first]]
+        ranked = matches[np.lexsort((ids[matches], -scores[matches]))]
+        return list(zip(ids[ranked].tolist(), scores[ranked].tolist()))
+
+
+_index = None
+_index_lock = threading.Lock()
+# Saves seen while a rebuild runs, replayed on the rebuilt index
+_replay = None
+
+
+def listed_mentors():
+    return User.objects.filter(is_mentor=True, is_active=True).only(
+        'id', *SEARCH_FIELDS).order_by().iterator(chunk_size=2000)
+
+
+def get_index():
+    """Return this process's index, or None until the first one is built.
+
+    The first call starts the build in a background thread, so no
+    request waits for it. An index older than MAX_AGE keeps serving
+    while a thread builds its replacement.
+    """
+    index = _index
+    if index is None:
+        start_rebuild()
+        return None
+    max_age = get_setting('MAX_AGE')
+    if (max_age is not None and _replay is None
+            and time.monotonic() - index.built > max_age):
+        start_rebuild()
+    return index
+
+
+def build_index():
+    """Build the index in this thread and serve it from now on"""
+    global _index
+    index = MentorIndex.build(listed_mentors())
+    with _index_lock:
+        _index = index
+    return index
+
+
+def start_rebuild():
+    global _replay
+    with _index_lock:
+        if _replay is not None:
+            return
+        _replay = []
+    threading.Thread(target=rebuild, name='mentor-index-rebuild',
+                     daemon=True).start()
+
+
+def rebuild():
+    """Build a fresh index and swap it in with saves made meanwhile"""
+    global _index, _replay
+    try:
+        index = MentorIndex.build(listed_mentors())
+        with _index_lock:
+            for change in _replay:
+                change(index)
+            _index, _replay = index, None
+        log_event(logger, 'recommend.index_rebuilt', mentors=len(index))
+    except Exception:
+        # Keep serving the old index, if any, and try again once MAX_AGE
+        # passes
+        with _index_lock:
+            if _index is not None:
+                _index.built = time.monotonic()
+            _replay = None
+        log_event(logger, 'recommend.index_rebuild_failed', logging.ERROR,
+                  exc_info=True)
+    finally:
+        connection.close()
+
+
+def reset_index():
+    """Forget the index so the next query builds it from the database"""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def recommend(question, first):
+    """Return up to first (mentor id, score) pairs for question.
+
+    Nothing is recommended while the first index is being built.
+    """
+    index = get_index()
+    return [] if index is None else index.recommend(question, first)
+
+
+def apply_change(change):
+    """Apply change to the index, and to one being rebuilt, at commit"""
+    def apply():
+        with _index_lock:
+            index = _index
+            if _replay is not None:
+                _replay.append(change)
+        if index is not None:
+            change(index)
+
+    transaction.on_commit(apply)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if update_fields is not None and not PROFILE_FIELDS & update_fields:
+        return
+    if created and not is_listed(instance):
+        return
+    apply_change(lambda index: index.update(instance))
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # Deleting clears instance.pk before the change is applied
+    user_id = instance.pk
+    apply_change(lambda index: index.remove(user_id))
@@ -0,0 +1,115 @@
+"""
+Read-replica routing for GraphQL operations
+"""
+
+import contextvars
+import random
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from graphql import OperationType
+
+DEFAULTS = {
+    # Database aliases query operations may read from.
+    'REPLICAS': [],
+    # Seconds a user's reads stay on the primary after a mutation, so
+    # they see their own writes before the replicas catch up.
+    'STICKY_SECONDS': 5,
+}
+
+# Set to a replica alias while a query operation may read from it
+replica = contextvars.ContextVar('replica', default=None)
+
+
+def get_setting(name):
+    """Read a DATABASE_REPLICATION setting, falling back to defaults"""
+    return getattr(settings, 'DATABASE_REPLICATION', {}).get(
+        name, DEFAULTS[name])
+
+
+def pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+class ReplicaRouter:
+    """Route reads to the replica chosen for the current operation.
+
+    Writes, and reads outside a query operation (mutations, admin,
+    management commands), always use the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_setting('REPLICAS')}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """Graphene middleware choosing the database for each operation.
+
+    Query operations read from a random replica unless the user ran a
+    mutation within ``STICKY_SECONDS``; every mutation field renews that
+    pin. Pins live in the default cache, which settings require to be
+    shared when replicas are configured. Must be listed before
+    ``JSONWebTokenMiddleware`` so the user is authenticated first.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        if root is not None:
+            return next(root, info, **kwargs)
+
+        user = getattr(info.context, 'user', None)
+        authenticated = user is not None and user.is_authenticated
+        operation = info.operation.operation
+        if operation == OperationType.MUTATION:
+            replica.set(None)
+            result = next(root, info, **kwargs)
+            if authenticated and get_setting('STICKY_SECONDS'):
+                cache.set(pin_key(user), True, get_setting('STICKY_SECONDS'))
+            return result
+
+        replicas = get_setting('REPLICAS')
+        if replica.get() is None and replicas and not (
+                authenticated and cache.get(pin_key(user))):
+            replica.set(random.choice(replicas))
+        return next(root, info, **kwargs)
+
+
+class ReplicaRoutingMiddleware:
+    """Django middleware confining replica routing to one request.
+
+    Runs sync or async to match the handler, so under ASGI requests
+    reach the async view without a hop through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = replica.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            replica.reset(token)
+
+    async def __acall__(self, request):
+        token = replica.set(None)
+        try:
+            return await self.get_response(request)
+        finally:
+            replica.reset(token)
@@ -3,7 +3,8 @@ import graphene
 from user.schema import Query as UserQuery, Mutation as UserMutation
 from request.schema import (
     RequestQueries as RequestQuery,
-    RequestMutations as RequestMutation
+    RequestMutations as RequestMutation,
+    RequestSubscriptions as RequestSubscription,
 )
 
 
@@ -15,4 +16,9 @@ class Mutation(UserMutation, RequestMutation, graphene.ObjectType):
     pass
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+class Subscription(RequestSubscription, graphene.ObjectType):
+    pass
+
+
+schema = graphene.Schema(query=Query, mutation=Mutation,
+                         subscription=Subscription)
@@ -0,0 +1,183 @@
+"""
+Full-text mentor search over the database's own text index
+"""
+
+import binascii
+import re
+from functools import partial
+
+import graphene
+from django.db import connections
+from django.db.models import Count, Q
+from graphql import GraphQLError
+from graphql_relay.utils import base64, unbase64
+
+from core.cache import get_cache, make_key
+from core.pagination import KeysetConnectionField
+
+# Columns indexed for search, most relevant first
+SEARCH_FIELDS = ('expertise', 'occupation', 'bio')
+CURSOR_PREFIX = 'ranked:'
+
+
+class SQLiteSearchBackend:
+    """FTS5 table of mentors kept up to date by triggers on core_user"""
+    table = 'core_user_search'
+
+    def match(self, queryset, terms):
+        user = queryset.model._meta.db_table
+        queryset = queryset.extra(
+            tables=[self.table],
+            where=[f'"{self.table}"."rowid" = "{user}"."id"',
+                   f'"{self.table}" MATCH %s'],
+            params=[' '.join(f'"{term}"*' for term in terms)])
+        # bm25 score, lower is more relevant
+        return queryset, f'"{self.table}"."rank"', []
+
+
+class PostgresSearchBackend:
+    """Generated tsvector column with a partial GIN index on mentors"""
+
+    def match(self, queryset, terms):
+        vector = f'"{queryset.model._meta.db_table}"."search_vector"'
+        tsquery = "to_tsquery('english', %s)"
+        terms = ' & '.join(f'{term}:*' for term in terms)
+        queryset = queryset.extra(where=[f'{vector} @@ {tsquery}'],
+                                  params=[terms])
+        return queryset, f'(-ts_rank_cd({vector}, {tsquery}))::float8', [
+            terms]
+
+
+class LikeSearchBackend:
+    """Unranked substring search for databases without a text index"""
+
+    def match(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(Q(*(
+                (f'{field}__icontains', term) for field in SEARCH_FIELDS),
+                _connector=Q.OR))
+        return queryset, '0.0', []
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(alias):
+    """Return the search backend for a database alias"""
+    return BACKENDS.get(connections[alias].vendor, LikeSearchBackend)()
+
+
+def search(queryset, query):
+    """Narrow queryset to rows matching every word of query.
+
+    Rows are annotated with ``search_rank``, lower being more relevant;
+    an empty query matches every row with the same rank.
+    """
+    terms = re.findall(r'\w+', query or '')
+    rank_sql, rank_params = '0.0', []
+    if terms:
+        queryset, rank_sql, rank_params = get_backend(queryset.db).match(
+            queryset, terms)
+    return queryset.extra(select={'search_rank': rank_sql},
+                          select_params=rank_params)
+
+
+def facet_counts(queryset, field):
+    """Count rows of queryset per value of field, most common first"""
+    rows = queryset.order_by().values(field).annotate(
+        count=Count('pk')).order_by('-count', field)
+    return [{'value': row[field], 'count': row['count']} for row in rows]
+
+
+def rank_to_cursor(rank, pk):
+    return base64(f'{CURSOR_PREFIX}{float(rank)!r}:{pk}')
+
+
+def cursor_to_rank(cursor):
+    """Decode a search cursor to the rank and primary key it points at"""
+    try:
+        prefix, rank, pk = unbase64(cursor).split(':')
+        if prefix + ':' != CURSOR_PREFIX:
+            raise ValueError(prefix)
+        return float(rank), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise GraphQLError(f'Invalid cursor "{cursor}".')
+
+
+class FacetType(graphene.ObjectType):
+    """Number of results with one value of a field"""
+    value = graphene.String()
+    count = graphene.Int()
+
+
+class SearchConnectionField(KeysetConnectionField):
+    """Connection field paging search() results by relevance.
+
+    Pages are keyed on ``(search_rank, id)``, so they stay as cheap as
+    primary key pages and only page forwards. Each name in ``facets`` is
+    added as an argument filtering that field; connections get a
+    ``facet_counts`` callable per facet counting the results with every
+    other filter applied, so clients can show the alternatives.
+    """
+
+    def __init__(self, type_, *args, facets=(), **kwargs):
+        self.facets = facets
+        kwargs.update((name, graphene.String()) for name in facets)
+        super().__init__(type_, *args, **kwargs)
+
+    @classmethod
+    def cursor_for(cls, node):
+        return rank_to_cursor(node.search_rank, node.pk)
+
+    @classmethod
+    def fetch_page(cls, queryset, args):
+        if args.get('last') is not None or args.get('before') is not None:
+            raise GraphQLError('Search results can only be paged forwards.')
+        first, _ = cls.page_limits(args)
+
+        window = queryset
+        if args.get('after') is not None:
+            rank, pk = cursor_to_rank(args['after'])
+            rank_sql, rank_params = queryset.query.extra['search_rank']
+            meta = queryset.model._meta
+            pk_sql = f'"{meta.db_table}"."{meta.pk.column}"'
+            window = window.extra(
+                where=[f'(({rank_sql}) > %s OR '
+                       f'(({rank_sql}) = %s AND {pk_sql} > %s))'],
+                params=[*rank_params, rank, *rank_params, rank, pk])
+
+        nodes = list(window.order_by('search_rank', 'pk')[:first + 1])
+        return nodes[:first], False, len(nodes) > first
+
+    @classmethod
+    def search_resolver(cls, resolver, connection_type, on_page,
+                        cache_namespace, facets, root, info, **args):
+        matches = resolver(root, info, **args)
+        chosen = {name: args[name] for name in facets
+                  if args.get(name) is not None}
+
+        connection = cls.connection_resolver(
+            lambda root, info, **args: matches.filter(**chosen),
+            connection_type, on_page, cache_namespace, root, info, **args)
+
+        cache = cache_namespace and get_cache()
+        connection.facet_counts = {}
+        for name in facets:
+            others = matches.filter(**{
+                field: value for field, value in chosen.items()
+                if field != name})
+            count = partial(facet_counts, others, name)
+            if cache:
+                count = partial(cache.get_or_set, cache_namespace,
+                                make_key(str(others.query), name), count)
+            connection.facet_counts[name] = count
+        return connection
+
+    def wrap_resolve(self, parent_resolver):
+        resolver = super(graphene.relay.ConnectionField, self).wrap_resolve(
+            parent_resolver)
+        return partial(self.search_resolver, resolver, self.type,
+                       self.on_page, self.cache_namespace, self.facets)
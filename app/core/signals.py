@@ -0,0 +1,32 @@
+"""
+Mentor counters for requests saved or deleted one at a time
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import MentorStats, Request
+
+
+@receiver(post_save, sender=Request)
+def request_saved(sender, instance, created, **kwargs):
+    """Count a new request in its mentor's counters.
+
+    The counter UPDATE runs inside the save's transaction when there is
+    one. Status changes go through ``RequestQuerySet.transition()``,
+    which moves the counters itself.
+    """
+    if created:
+        MentorStats.objects.record({(instance.mentor_id, instance.status): 1})
+
+
+@receiver(post_delete, sender=Request)
+def request_deleted(sender, instance, **kwargs):
+    """Uncount a deleted request from its mentor's counters.
+
+    Runs once per request, including those deleted by a cascade. No
+    counter row is inserted, as the mentor's own row may be deleted by
+    the same cascade.
+    """
+    MentorStats.objects.record({(instance.mentor_id, instance.status): -1},
+                               insert=False)
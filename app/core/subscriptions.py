@@ -0,0 +1,245 @@
+"""
+GraphQL over WebSockets using the graphql-transport-ws protocol
+"""
+
+import asyncio
+import json
+from functools import partial
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView
+from graphql import (
+    ExecutionResult,
+    GraphQLError,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+)
+from graphql.execution import create_source_event_stream
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_user_by_token
+
+from core.cost import limit_rules
+from core.executor import run_in_pool
+from core.pubsub import get_setting
+
+PROTOCOL = 'graphql-transport-ws'
+
+# Close codes defined by the protocol
+INVALID_MESSAGE = 4400
+UNAUTHORIZED = 4401
+FORBIDDEN = 4403
+INIT_TIMEOUT = 4408
+SUBSCRIBER_EXISTS = 4409
+TOO_MANY_INIT = 4429
+
+
+def get_token(scope, payload):
+    """Read the JWT from connection_init, or the handshake headers"""
+    prefix = jwt_settings.JWT_AUTH_HEADER_PREFIX.lower()
+    headers = dict(scope.get('headers', ()))
+    authorization = (payload.get('authorization')
+                     or payload.get('Authorization')
+                     or headers.get(b'authorization', b'').decode('latin1'))
+    parts = str(authorization).split()
+    if len(parts) == 2 and parts[0].lower() == prefix:
+        return parts[1]
+    return payload.get('token')
+
+
+class GraphQLWebSocket:
+    """One WebSocket connection serving GraphQL operations.
+
+    The client authenticates with a JWT in its ``connection_init``
+    payload, then may run any number of operations side by side.
+    Subscriptions stream an event per channel layer message until the
+    client completes them or disconnects; queries and mutations send a
+    single result. Resolvers run on the resolver pool, as they do under
+    the async view.
+    """
+
+    def __init__(self, schema, scope, receive, send):
+        self.schema = schema
+        self.scope = scope
+        self.receive = receive
+        self._send = send
+        self.send_lock = asyncio.Lock()
+        self.user = None
+        self.operations = {}
+        self.closed = False
+
+    @classmethod
+    def as_asgi(cls, schema=None):
+        """Return an ASGI application serving one connection per call"""
+        async def application(scope, receive, send):
+            graphql_schema = (schema or graphene_settings.SCHEMA)
+            await cls(graphql_schema.graphql_schema, scope, receive,
+                      send).run()
+        return application
+
+    async def send(self, message):
+        async with self.send_lock:
+            if not self.closed:
+                await self._send(message)
+
+    async def send_json(self, message):
+        await self.send({'type': 'websocket.send',
+                         'text': json.dumps(message)})
+
+    async def close(self, code, reason=''):
+        await self.send({'type': 'websocket.close', 'code': code,
+                         'reason': reason})
+        self.closed = True
+
+    async def run(self):
+        message = await self.receive()
+        if message['type'] != 'websocket.connect':
+            return
+        if PROTOCOL not in self.scope.get('subprotocols', ()):
+            await self.close(1002, 'Unsupported subprotocol.')
+            return
+        await self.send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+
+        timeout = asyncio.get_running_loop().call_later(
+            get_setting('CONNECTION_INIT_TIMEOUT'),
+            lambda: asyncio.ensure_future(self.close_unless_initialised()))
+        try:
+            while not self.closed:
+                message = await self.receive()
+                if message['type'] == 'websocket.disconnect':
+                    break
+                if message['type'] == 'websocket.receive':
+                    await self.handle(message.get('text')
+                                      or message.get('bytes'))
+        finally:
+            timeout.cancel()
+            tasks = list(self.operations.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close_unless_initialised(self):
+        if self.user is None:
+            await self.close(INIT_TIMEOUT, 'Connection initialisation timeout')
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text)
+            kind = message['type']
+        except (TypeError, ValueError, KeyError):
+            await self.close(INVALID_MESSAGE, 'Invalid message received')
+            return
+
+        if kind == 'connection_init':
+            await self.connection_init(message.get('payload') or {})
+        elif kind == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif self.user is None:
+            await self.close(UNAUTHORIZED, 'Unauthorized')
+        elif kind == 'subscribe':
+            await self.subscribe(message)
+        elif kind == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            await self.close(INVALID_MESSAGE, f'Invalid message type {kind}')
+
+    async def connection_init(self, payload):
+        if self.user is not None:
+            await self.close(TOO_MANY_INIT, 'Too many initialisation requests')
+            return
+        token = get_token(self.scope, payload)
+        if token is None:
+            self.user = AnonymousUser()
+        else:
+            try:
+                self.user = await run_in_pool(get_user_by_token, token)
+            except JSONWebTokenError:
+                await self.close(FORBIDDEN, 'Forbidden')
+                return
+        await self.send_json({'type': 'connection_ack'})
+
+    async def subscribe(self, message):
+        operation_id = message.get('id')
+        payload = message.get('payload') or {}
+        if not isinstance(operation_id, str) or 'query' not in payload:
+            await self.close(INVALID_MESSAGE, 'Invalid message received')
+            return
+        if operation_id in self.operations:
+            await self.close(SUBSCRIBER_EXISTS,
+                             f'Subscriber for {operation_id} already exists')
+            return
+        task = asyncio.ensure_future(self.run_operation(operation_id, payload))
+        self.operations[operation_id] = task
+
+    def context(self):
+        # A fresh context per result, so loaders never serve stale rows.
+        return SimpleNamespace(user=self.user, scope=self.scope)
+
+    async def run_operation(self, operation_id, payload):
+        try:
+            try:
+                document = parse(payload['query'])
+            except GraphQLError as error:
+                errors = [error]
+            else:
+                errors = validate(self.schema, document) or validate(
+                    self.schema, document,
+                    limit_rules(payload.get('variables')))
+            if errors:
+                await self.send_json({
+                    'id': operation_id, 'type': 'error',
+                    'payload': [GraphQLView.format_error(error)
+                                for error in errors]})
+                return
+
+            options = {
+                'variable_values': payload.get('variables'),
+                'operation_name': payload.get('operationName'),
+            }
+            operation = get_operation_ast(document, options['operation_name'])
+            if (operation is not None
+                    and operation.operation == OperationType.SUBSCRIPTION):
+                await self.stream(operation_id, document, options)
+            else:
+                result = await run_in_pool(partial(
+                    execute, self.schema, document,
+                    context_value=self.context(), **options))
+                await self.send_result(operation_id, result)
+            await self.send_json({'id': operation_id, 'type': 'complete'})
+        finally:
+            # The id may already serve a new operation if this one was
+            # completed by the client.
+            if self.operations.get(operation_id) is asyncio.current_task():
+                del self.operations[operation_id]
+
+    async def stream(self, operation_id, document, options):
+        events = await create_source_event_stream(
+            self.schema, document, context_value=self.context(), **options)
+        if isinstance(events, ExecutionResult):
+            await self.send_result(operation_id, events)
+            return
+        try:
+            async for event in events:
+                result = await run_in_pool(partial(
+                    execute, self.schema, document, event,
+                    self.context(), **options))
+                await self.send_result(operation_id, result)
+        finally:
+            await events.aclose()
+
+    async def send_result(self, operation_id, result):
+        payload = {'data': result.data}
+        if result.errors:
+            payload['errors'] = [GraphQLView.format_error(error)
+                                 for error in result.errors]
+        await self.send_json({'id': operation_id, 'type': 'next',
+                              'payload': payload})
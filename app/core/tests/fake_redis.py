@@ -0,0 +1,94 @@
+"""
+In-memory stand-in for the subset of redis.Redis the app uses
+"""
+
+import queue
+import threading
+import time
+
+
+class FakeRedis:
+    """Keys with optional expiry, counting expired keys like INFO stats"""
+
+    def __init__(self):
+        self.data = {}
+        self.expired_keys = 0
+        self.subscribers = []
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        value, expires = self.data.get(key, (None, None))
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            self.expired_keys += 1
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key)
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            expires = None if ex is None else time.monotonic() + ex
+            self.data[key] = (value, expires)
+            return True
+
+    def incr(self, key, amount=1):
+        with self._lock:
+            value = int(self._live(key) or 0) + amount
+            self.data[key] = (str(value).encode(), None)
+            return value
+
+    def info(self, section=None):
+        return {'evicted_keys': 0, 'expired_keys': self.expired_keys}
+
+    def flushdb(self):
+        with self._lock:
+            self.data.clear()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        received = 0
+        for pubsub in subscribers:
+            received += pubsub.receive(channel, message)
+        return received
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        pubsub = FakePubSub()
+        with self._lock:
+            self.subscribers.append(pubsub)
+        return pubsub
+
+
+class FakePubSub:
+    """Channel subscriptions of one connection, delivering bytes"""
+
+    def __init__(self):
+        self.channels = set()
+        self.messages = queue.Queue()
+
+    def subscribe(self, *channels):
+        self.channels.update(channels)
+
+    def unsubscribe(self, *channels):
+        self.channels.difference_update(channels)
+
+    def receive(self, channel, message):
+        if channel not in self.channels:
+            return 0
+        if isinstance(message, str):
+            message = message.encode()
+        self.messages.put({'type': 'message', 'channel': channel.encode(),
+                           'data': message})
+        return 1
+
+    def get_message(self, timeout=0.0):
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.channels.clear()
@@ -0,0 +1,132 @@
+"""
+Tests for the async GraphQL view and root field splitting
+"""
+
+import json
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import AsyncRequestFactory, TransactionTestCase
+from django.test import override_settings
+from graphql import parse
+from graphql_jwt.shortcuts import get_token
+
+from core.executor import split_root_fields
+from core.models import Request, User
+from core.schema import schema
+from core.views import AsyncGraphQLView
+
+MENTORS = '{ mentors { edges { node { email } } } }'
+
+
+@override_settings(READ_CACHE={'ENABLED': False})
+class AsyncGraphQLViewTests(TransactionTestCase):
+    """Test requests served by the async view"""
+
+    def setUp(self):
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+        self.request = Request.objects.create(
+            mentor=self.mentor, mentee=self.mentee, question='Async?')
+        self.token = get_token(self.mentor)
+        self.view = AsyncGraphQLView.as_view(schema=schema)
+
+    async def post(self, query, variables=None, token=None):
+        headers = {'authorization': f'BEARER {token}'} if token else {}
+        request = AsyncRequestFactory().post(
+            '/graphql', json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json', **headers)
+        # As AuthenticationMiddleware would
+        request.user = AnonymousUser()
+        response = await self.view(request)
+        return response.status_code, json.loads(response.content)
+
+    async def test_root_fields_resolve_together(self):
+        """Test split root fields are merged back in query order"""
+        query = ('{ mentorRequests { edges { node { question } } } '
+                 'mentors { edges { node { email } } } }')
+        status, content = await self.post(query, token=self.token)
+
+        self.assertEqual(status, 200)
+        self.assertNotIn('errors', content)
+        self.assertEqual(list(content['data']), ['mentorRequests', 'mentors'])
+        self.assertEqual(
+            content['data']['mentorRequests']['edges'][0]['node'],
+            {'question': 'Async?'})
+        self.assertEqual(
+            content['data']['mentors']['edges'][0]['node'],
+            {'email': 'mentor@example.com'})
+
+    async def test_field_errors_are_merged(self):
+        """Test one failing root field does not lose the others' data"""
+        query = ('{ mentor(mentorId: 0) { email } '
+                 'mentors { edges { node { email } } } }')
+        status, content = await self.post(query)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(content['errors'][0]['path'], ['mentor'])
+        self.assertIsNone(content['data']['mentor'])
+        self.assertEqual(len(content['data']['mentors']['edges']), 1)
+
+    async def test_mutation(self):
+        """Test mutations run unsplit on the primary"""
+        query = '''
+            mutation Accept($id: Int!) {
+                acceptRequest(requestId: $id) { request { status } }
+            }
+        '''
+        status, content = await self.post(
+            query, {'id': self.request.id}, token=self.token)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            content['data']['acceptRequest']['request']['status'],
+            'Accepted')
+
+    async def test_invalid_query(self):
+        """Test validation errors are reported without executing"""
+        status, content = await self.post('{ mentors { nope } }')
+
+        self.assertEqual(status, 400)
+        self.assertNotIn('data', content)
+        self.assertIn('nope', content['errors'][0]['message'])
+
+
+class SplitRootFieldsTests(TransactionTestCase):
+    """Test which operations are split into one document per root field"""
+
+    def split(self, query, variables=None):
+        document = parse(query)
+        return split_root_fields(
+            schema.graphql_schema, document, document.definitions[0],
+            variables)
+
+    def test_query_is_split(self):
+        """Test each root field gets a document with the fragments"""
+        documents = self.split('''
+            query ($first: Int) {
+                mentors(first: $first) { ...Emails }
+                users { ...Emails }
+            }
+            fragment Emails on UserConnection {
+                edges { node { email } }
+            }
+        ''', {'first': 1})
+
+        self.assertEqual(len(documents), 2)
+        for document, field in zip(documents, ('mentors', 'users')):
+            operation, fragment = document.definitions
+            self.assertEqual(
+                operation.selection_set.selections[0].name.value, field)
+            self.assertEqual(fragment.name.value, 'Emails')
+
+    def test_not_split(self):
+        """Test single fields, mutations and bad variables are not split"""
+        self.assertIsNone(self.split(MENTORS))
+        self.assertIsNone(self.split(
+            'mutation { a: acceptRequest(requestId: 1) { request { id } } '
+            'b: rejectRequest(requestId: 1) { request { id } } }'))
+        self.assertIsNone(self.split(
+            'query ($first: Int) { mentors(first: $first) { totalCount } '
+            'users { totalCount } }', {'first': 'many'}))
@@ -0,0 +1,116 @@
+"""
+Tests for stateless JWT authentication
+"""
+
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+
+from core.auth import VerifiedTokenCache, verified_tokens
+
+CLAIMS_AUTH = {'ENABLED': True, 'TOKEN_CACHE_SIZE': 10}
+
+
+@override_settings(GRAPHQL_JWT_CLAIMS_AUTH=CLAIMS_AUTH)
+class ClaimsAuthTests(TestCase):
+    """Test authenticating requests from token claims"""
+
+    def setUp(self):
+        verified_tokens.clear()
+        self.user = get_user_model().objects.create_user(
+            email='mentor@example.com',
+            password='P@ss12345',
+            first_name='Gasaro',
+            is_mentor=True)
+        self.token = get_token(self.user)
+
+    def post(self, query):
+        response = self.client.post(
+            '/graphql', json.dumps({'query': query}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'BEARER {self.token}')
+        return response.json()
+
+    def test_claim_fields_do_not_load_user(self):
+        """Test fields carried in the token are served without a query"""
+        with self.assertNumQueries(0):
+            result = self.post('{ me { email isMentor isStaff } }')
+
+        self.assertEqual(result['data']['me'], {
+            'email': 'mentor@example.com',
+            'isMentor': True,
+            'isStaff': False,
+        })
+
+    def test_deactivated_user_keeps_access_until_expiry(self):
+        """Test is_active is not checked until the token expires"""
+        get_user_model().objects.filter(id=self.user.id).update(
+            is_active=False)
+
+        with self.assertNumQueries(0):
+            result = self.post('{ me { email } }')
+
+        self.assertEqual(result['data']['me'],
+                         {'email': 'mentor@example.com'})
+        with override_settings(GRAPHQL_JWT_CLAIMS_AUTH={'ENABLED': False}):
+            self.assertIsNone(self.post('{ me { email } }')['data']['me'])
+
+    def test_other_fields_load_user_once(self):
+        """Test a non-claim field loads the user row once"""
+        with self.assertNumQueries(1):
+            result = self.post('{ me { firstName lastName } }')
+
+        self.assertEqual(result['data']['me']['firstName'], 'Gasaro')
+
+    def test_verified_tokens_are_cached(self):
+        """Test a repeated token skips signature verification"""
+        self.post('{ me { email } }')
+
+        with mock.patch('core.auth.get_payload') as get_payload:
+            result = self.post('{ me { email } }')
+
+        get_payload.assert_not_called()
+        self.assertEqual(result['data']['me']['email'], self.user.email)
+
+    def test_invalid_token_is_anonymous(self):
+        """Test a bad signature leaves the request anonymous"""
+        self.token = self.token[:-2] + 'xx'
+
+        result = self.post('{ me { email } }')
+
+        self.assertIsNone(result['data']['me'])
+
+    def test_writes_go_to_user_row(self):
+        """Test mutations through the claims user update the database"""
+        self.user.is_mentor = False
+        self.user.save()
+        self.token = get_token(self.user)
+
+        result = self.post('mutation { changeUserToMentor { success } }')
+
+        self.assertTrue(result['data']['changeUserToMentor']['success'])
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_mentor)
+
+
+class VerifiedTokenCacheTests(TestCase):
+    """Test the verified token cache"""
+
+    def test_expired_tokens_are_evicted(self):
+        """Test expired payloads are dropped on read and when full"""
+        cache = VerifiedTokenCache(2)
+        now = time.time()
+        cache.set('expired', {'exp': now - 1})
+        self.assertIsNone(cache.get('expired'))
+
+        cache.set('old', {'exp': now - 1})
+        cache.set('a', {'exp': now + 60})
+        cache.set('b', {'exp': now + 60})
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
@@ -0,0 +1,165 @@
+"""
+Tests for batched GraphQL requests
+"""
+
+import json
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase
+from django.test import override_settings
+from graphql_jwt.shortcuts import get_token
+
+from core import auth
+from core.models import Request, User
+from core.schema import schema
+from core.views import AsyncGraphQLView
+
+ME = '{ me { email } }'
+MENTORS = '{ mentors { edges { node { email } } } }'
+MENTOR_REQUESTS = '{ mentorRequests { edges { node { question } } } }'
+HISTORY = '''
+    query ($id: Int!) {
+        userRequests(menteeId: $id) { edges { node { mentee { isMentor } } } }
+    }
+'''
+
+
+@override_settings(READ_CACHE={'ENABLED': False})
+class BatchTests(TestCase):
+    """Test an array of operations is executed in one request"""
+
+    def setUp(self):
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+        Request.objects.create(mentor=self.mentor, mentee=self.mentee,
+                               question='Batched?')
+        self.headers = {
+            'HTTP_AUTHORIZATION': f'BEARER {get_token(self.mentor)}'}
+
+    def post(self, body, **headers):
+        response = self.client.post('/graphql', json.dumps(body),
+                                    content_type='application/json',
+                                    **headers)
+        return response.status_code, response.json()
+
+    def test_batch(self):
+        """Test each operation's result is returned in order"""
+        status, results = self.post([
+            {'id': 'me', 'query': ME},
+            {'id': 'mentors', 'query': MENTORS},
+            {'id': 'requests', 'query': MENTOR_REQUESTS},
+        ], **self.headers)
+
+        self.assertEqual(status, 200)
+        self.assertEqual([r['id'] for r in results],
+                         ['me', 'mentors', 'requests'])
+        self.assertEqual([r['status'] for r in results], [200] * 3)
+        self.assertEqual(results[0]['data'],
+                         {'me': {'email': 'mentor@example.com'}})
+        self.assertEqual(
+            results[2]['data']['mentorRequests']['edges'][0]['node'],
+            {'question': 'Batched?'})
+
+    def test_user_is_resolved_once(self):
+        """Test the token is authenticated once for the whole batch"""
+        with mock.patch('core.auth.authenticate',
+                        wraps=auth.authenticate) as batch_auth, \
+                mock.patch('graphql_jwt.middleware.authenticate') \
+                as middleware_auth:
+            _, results = self.post([{'query': ME}] * 3, **self.headers)
+
+        self.assertEqual(batch_auth.call_count, 1)
+        middleware_auth.assert_not_called()
+        self.assertEqual([r['data']['me']['email'] for r in results],
+                         ['mentor@example.com'] * 3)
+
+    def test_errors_are_isolated(self):
+        """Test failing operations do not fail the rest of the batch"""
+        status, results = self.post([
+            {'id': 1, 'query': '{ mentors { nope } }'},
+            {'id': 2, 'query': MENTORS},
+            {'id': 3, 'variables': {}},
+        ])
+
+        self.assertEqual(status, 200)
+        self.assertEqual([r['status'] for r in results], [400, 200, 400])
+        self.assertIn('nope', results[0]['errors'][0]['message'])
+        self.assertEqual(len(results[1]['data']['mentors']['edges']), 1)
+        self.assertEqual(results[2]['errors'][0]['message'],
+                         'Must provide query string.')
+
+    def test_mutation_clears_loaders(self):
+        """Test operations after a mutation do not read stale users"""
+        history = {'query': HISTORY, 'variables': {'id': self.mentee.id}}
+        _, results = self.post([
+            history,
+            {'query': 'mutation { changeUserToMentor { success } }'},
+            history,
+        ], HTTP_AUTHORIZATION=f'BEARER {get_token(self.mentee)}')
+
+        self.assertEqual(
+            [r['data']['userRequests']['edges'][0]['node']['mentee']
+             for r in (results[0], results[2])],
+            [{'isMentor': False}, {'isMentor': True}])
+
+    @override_settings(GRAPHQL_BATCH={'MAX_SIZE': 2})
+    def test_max_size(self):
+        """Test batches over MAX_SIZE are refused before executing"""
+        with self.assertNumQueries(0):
+            status, result = self.post([{'query': MENTORS}] * 3)
+
+        self.assertEqual(status, 400)
+        self.assertEqual(result['errors'][0]['message'],
+                         'Batch of 3 operations exceeds the maximum of 2.')
+
+    def test_invalid_batches(self):
+        """Test empty batches and non-object entries are refused"""
+        for body, message in (
+                ([], 'Received an empty list in the batch request.'),
+                ([MENTORS], 'Each operation of a batch must be a JSON '
+                            'object.')):
+            with self.subTest(body=body):
+                status, result = self.post(body)
+                self.assertEqual(status, 400)
+                self.assertEqual(result['errors'][0]['message'], message)
+
+    @override_settings(GRAPHQL_BATCH={'ENABLED': False})
+    def test_disabled(self):
+        """Test arrays are refused when batching is disabled"""
+        status, result = self.post([{'query': MENTORS}])
+
+        self.assertEqual(status, 400)
+        self.assertEqual(result['errors'][0]['message'],
+                         'Batched requests are not enabled.')
+
+
+@override_settings(READ_CACHE={'ENABLED': False})
+class AsyncBatchTests(TransactionTestCase):
+    """Test the async view executes batches"""
+
+    def setUp(self):
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+
+    async def test_batch(self):
+        """Test a batch of split and unsplit operations"""
+        request = AsyncRequestFactory().post(
+            '/graphql', json.dumps([
+                {'id': 'a', 'query': f'{{ me {{ email }} {MENTORS[1:]}'},
+                {'id': 'b', 'query': ME},
+            ]), content_type='application/json',
+            authorization=f'BEARER {get_token(self.mentor)}')
+        request.user = AnonymousUser()
+        response = await AsyncGraphQLView.as_view(schema=schema)(request)
+        results = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in results], ['a', 'b'])
+        self.assertEqual(results[0]['data']['me'],
+                         {'email': 'mentor@example.com'})
+        self.assertEqual(len(results[0]['data']['mentors']['edges']), 1)
+        self.assertEqual(results[1]['data'],
+                         {'me': {'email': 'mentor@example.com'}})
@@ -0,0 +1,83 @@
+"""
+Tests for the versioned read-through cache
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache import LocalCache, ReadThroughCache, RedisCache
+from core.tests.fake_redis import FakeRedis
+
+
+class ReadThroughCacheTests(SimpleTestCase):
+    """Test loading, versioning and counters over both backends"""
+
+    backends = {
+        'local': lambda: LocalCache(timeout=60, max_entries=2),
+        'redis': lambda: RedisCache(timeout=60, client=FakeRedis()),
+    }
+
+    def test_read_through_and_invalidate(self):
+        """Test a value is loaded once until its namespace is bumped"""
+        for name, backend in self.backends.items():
+            with self.subTest(backend=name):
+                cache = ReadThroughCache(backend())
+                loader = mock.Mock(side_effect=['first', 'second'])
+
+                self.assertEqual(cache.get_or_set('ns', 'k', loader), 'first')
+                self.assertEqual(cache.get_or_set('ns', 'k', loader), 'first')
+                cache.invalidate('ns')
+                self.assertEqual(cache.get_or_set('ns', 'k', loader),
+                                 'second')
+
+                self.assertEqual(loader.call_count, 2)
+                self.assertEqual(cache.hits, 1)
+                self.assertEqual(cache.misses, 2)
+
+    def test_invalidation_is_per_namespace(self):
+        """Test bumping one namespace keeps the others cached"""
+        cache = ReadThroughCache(LocalCache())
+        cache.get_or_set('a', 'k', lambda: 'a')
+        cache.get_or_set('b', 'k', lambda: 'b')
+
+        cache.invalidate('a')
+
+        self.assertEqual(cache.get_or_set('b', 'k', lambda: 'new'), 'b')
+        self.assertEqual(cache.get_or_set('a', 'k', lambda: 'new'), 'new')
+
+    def test_local_lru_eviction(self):
+        """Test the least recently used entry is evicted and counted"""
+        cache = ReadThroughCache(LocalCache(max_entries=2))
+        cache.get_or_set('ns', 'a', lambda: 1)
+        cache.get_or_set('ns', 'b', lambda: 2)
+        cache.get_or_set('ns', 'a', lambda: 1)
+        cache.get_or_set('ns', 'c', lambda: 3)
+
+        self.assertEqual(cache.get_or_set('ns', 'a', lambda: 0), 1)
+        self.assertEqual(cache.get_or_set('ns', 'b', lambda: 0), 0)
+        self.assertEqual(cache.stats()['evictions'], 2)
+
+    def test_entries_expire(self):
+        """Test entries are reloaded after the timeout on both backends"""
+        for name, backend in self.backends.items():
+            with self.subTest(backend=name):
+                cache = ReadThroughCache(backend())
+                with mock.patch('time.monotonic', return_value=0):
+                    cache.get_or_set('ns', 'k', lambda: 'old')
+                with mock.patch('time.monotonic', return_value=61):
+                    value = cache.get_or_set('ns', 'k', lambda: 'new')
+
+                self.assertEqual(value, 'new')
+                self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_redis_versions_are_shared(self):
+        """Test a bump through one client is seen by another process"""
+        client = FakeRedis()
+        reader = ReadThroughCache(RedisCache(client=client))
+        writer = ReadThroughCache(RedisCache(client=client))
+        reader.get_or_set('ns', 'k', lambda: 'old')
+
+        writer.invalidate('ns')
+
+        self.assertEqual(reader.get_or_set('ns', 'k', lambda: 'new'), 'new')
@@ -0,0 +1,171 @@
+"""
+Tests for ETags and Cache-Control on GET queries
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.deletion import Collector
+from django.test import TestCase, override_settings
+from graphql import parse
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+from graphql_jwt.shortcuts import get_token
+
+from core.conditional import cache_policy, table_versions
+from core.metrics import resolver_duration
+from core.models import Request, User
+from core.schema import schema
+
+MENTORS = '{ mentors { edges { node { email } } } }'
+HISTORY = '''
+    query History($id: Int!) {
+        userRequests(menteeId: $id) { edges { node { question } } }
+    }
+'''
+# The test process is the only one using its cache
+ENABLED = {**settings.GRAPHQL_CONDITIONAL_GET, 'ENABLED': True}
+
+
+@override_settings(READ_CACHE={'ENABLED': False},
+                   GRAPHQL_CONDITIONAL_GET=ENABLED)
+class ConditionalGetTests(TestCase):
+    """Test unchanged GET queries are answered with 304"""
+
+    def setUp(self):
+        cache.clear()
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+        self.request = Request.objects.create(
+            mentor=self.mentor, mentee=self.mentee, question='Cached?')
+        self.auth = {'HTTP_AUTHORIZATION': f'BEARER {get_token(self.mentee)}'}
+
+    def get(self, query, variables=None, etag=None, **headers):
+        params = {'query': query}
+        if variables:
+            params['variables'] = variables
+        if etag:
+            headers['HTTP_IF_NONE_MATCH'] = etag
+        return self.client.get('/graphql', params,
+                               HTTP_ACCEPT='application/json', **headers)
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match skips execution"""
+        first = self.get(MENTORS)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('"'))
+        self.assertEqual(first['Cache-Control'], 'public, max-age=30')
+
+        resolver_duration.clear()
+        with self.assertNumQueries(0):
+            second = self.get(MENTORS, etag=first['ETag'])
+
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(resolver_duration.count(field='Query.mentors'), 0)
+
+    def test_write_changes_etag(self):
+        """Test writing a table the query reads changes its ETag"""
+        variables = f'{{"id": {self.mentee.id}}}'
+        first = self.get(HISTORY, variables, **self.auth)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Request.objects.filter(id=self.request.id).transition(
+                Request.Status.ACCEPTED)
+        second = self.get(HISTORY, variables, etag=first['ETag'],
+                          **self.auth)
+
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.get(HISTORY, variables, etag=second['ETag'],
+                                  **self.auth).status_code, 304)
+
+    def test_unrelated_write_keeps_etag(self):
+        """Test writes to tables the query does not read are ignored"""
+        first = self.get(MENTORS)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Request.objects.create(mentor=self.mentor, mentee=self.mentee,
+                                   question='Unrelated')
+
+        self.assertEqual(self.get(MENTORS, etag=first['ETag']).status_code,
+                         304)
+
+    def test_untracked_models_keep_fast_deletes(self):
+        """Test version receivers leave other models' deletes alone"""
+        collector = Collector(using='default')
+
+        self.assertTrue(collector.can_fast_delete(
+            get_refresh_token_model().objects.all()))
+        self.assertFalse(collector.can_fast_delete(Request.objects.all()))
+
+    def test_etag_depends_on_viewer_and_variables(self):
+        """Test viewers and variables get ETags of their own"""
+        anonymous = self.get(MENTORS)
+        viewer = self.get(MENTORS, **self.auth)
+        history = [self.get(HISTORY, f'{{"id": {id}}}', **self.auth)
+                   for id in (self.mentee.id, self.mentor.id)]
+
+        self.assertNotEqual(anonymous['ETag'], viewer['ETag'])
+        self.assertNotEqual(history[0]['ETag'], history[1]['ETag'])
+        self.assertIn('Authorization', viewer['Vary'])
+
+    def test_post_is_not_cached(self):
+        """Test only GET requests carry caching headers"""
+        response = self.client.post('/graphql', {'query': MENTORS},
+                                    content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_errors_are_not_cached(self):
+        """Test responses with errors are marked no-store"""
+        response = self.get(
+            'query ($id: Int!) { mentor(mentorId: $id) { email } }',
+            '{"id": 0}')
+
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        self.assertFalse(response.has_header('ETag'))
+
+    @override_settings(GRAPHQL_CONDITIONAL_GET={'ENABLED': False})
+    def test_disabled(self):
+        """Test no caching headers are sent when disabled"""
+        response = self.get(MENTORS)
+
+        self.assertFalse(response.has_header('ETag'))
+        self.assertFalse(response.has_header('Cache-Control'))
+
+
+class CachePolicyTests(TestCase):
+    """Test the cache policy derived from a document's fields"""
+
+    def policy(self, query):
+        return cache_policy(schema.graphql_schema, parse(query))
+
+    def test_most_restrictive_hint_wins(self):
+        """Test the lowest max-age and strictest scope are used"""
+        policy = self.policy('{ mentors { totalCount } me { email } }')
+
+        self.assertEqual(policy.header, 'private, no-cache')
+        self.assertEqual(policy.models, {'core.User'})
+
+    def test_models_follow_nested_types(self):
+        """Test models read through nested fields are included"""
+        policy = self.policy(
+            '{ mentorRequests { edges { node { mentee { email } } } } }')
+
+        self.assertEqual(policy.models, {'core.User', 'core.Request'})
+
+    def test_no_store(self):
+        """Test no-store hints win over every other hint"""
+        self.assertEqual(self.policy('{ cacheStats { hits } mentors '
+                                     '{ totalCount } }').header, 'no-store')
+
+    def test_versions_survive_a_cache_reset(self):
+        """Test stamps lost with the cache are not handed out again"""
+        cache.clear()
+        before = table_versions(['core.User'])
+        cache.clear()
+
+        self.assertNotEqual(table_versions(['core.User']), before)
@@ -0,0 +1,97 @@
+"""
+Tests for query depth, alias and cost limits
+"""
+
+import json
+
+from django.test import TestCase, override_settings
+
+from core import persisted_queries
+from core.models import User
+
+MENTORS = 'query ($first: Int) { mentors(first: $first) { %s } }'
+EDGES = 'edges { node { email } }'
+
+
+@override_settings(READ_CACHE={'ENABLED': False})
+class QueryLimitTests(TestCase):
+    """Test documents are measured and limited before execution"""
+
+    def setUp(self):
+        persisted_queries.documents.clear()
+        User.objects.create_user(email='mentor@example.com',
+                                 password='mentor', is_mentor=True)
+
+    def post(self, query, variables=None):
+        response = self.client.post(
+            '/graphql', json.dumps({'query': query, 'variables': variables}),
+            content_type='application/json')
+        return response.status_code, response.json()
+
+    def test_cost_is_reported(self):
+        """Test a page of objects costs one per object and per edge"""
+        status, result = self.post(MENTORS % EDGES, {'first': 5})
+
+        self.assertEqual(status, 200)
+        self.assertEqual(len(result['data']['mentors']['edges']), 1)
+        self.assertEqual(result['extensions']['cost'],
+                         {'requested': 11, 'maximum': 5000})
+
+    def test_cost_follows_variables(self):
+        """Test a cached document is costed with each request's page size"""
+        for first, cost in ((5, 11), (50, 101), (None, 201)):
+            with self.subTest(first=first):
+                _, result = self.post(MENTORS % EDGES, {'first': first})
+                self.assertEqual(result['extensions']['cost']['requested'],
+                                 cost)
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={'MAX_COST': 100})
+    def test_costly_query_is_rejected(self):
+        """Test a query over budget is refused without touching the DB"""
+        with self.assertNumQueries(0):
+            status, result = self.post(MENTORS % EDGES, {'first': 50})
+
+        self.assertEqual(status, 400)
+        self.assertNotIn('data', result)
+        self.assertEqual(result['errors'][0]['message'],
+                         'Query cost of 101 exceeds the maximum of 100.')
+        self.assertEqual(result['errors'][0]['extensions']['code'],
+                         'QUERY_TOO_COSTLY')
+        self.assertEqual(result['extensions']['cost'],
+                         {'requested': 101, 'maximum': 100})
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={
+        'FIELD_COSTS': {'totalCount': 10, 'UserType.email': 2}})
+    def test_field_costs(self):
+        """Test configured field costs by type and field or field name"""
+        _, result = self.post(MENTORS % f'totalCount {EDGES}', {'first': 2})
+
+        self.assertEqual(result['extensions']['cost']['requested'],
+                         1 + 2 * (10 + 1 + 1 + 2))
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={'MAX_DEPTH': 3})
+    def test_depth_limit_follows_fragments(self):
+        """Test nesting hidden in fragments counts towards the depth"""
+        status, result = self.post('''
+            { mentors { ...Edges } }
+            fragment Edges on UserConnection { edges { ...Node } }
+            fragment Node on UserEdge { node { email } }
+        ''')
+
+        self.assertEqual(status, 400)
+        self.assertEqual(result['errors'][0]['message'],
+                         'Query depth of 4 exceeds the maximum of 3.')
+
+        status, _ = self.post(MENTORS % 'edges { cursor }')
+        self.assertEqual(status, 200)
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={'MAX_ALIASES': 2})
+    def test_alias_limit(self):
+        """Test repeating a field under many aliases is refused"""
+        status, result = self.post(
+            '{ a: mentors { totalCount } b: mentors { totalCount } '
+            'c: mentors { totalCount } }')
+
+        self.assertEqual(status, 400)
+        self.assertEqual(result['errors'][0]['extensions']['code'],
+                         'TOO_MANY_ALIASES')
@@ -0,0 +1,123 @@
+"""
+Tests for the database backends, connection pool and health check
+"""
+
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from core.db.backends.sqlite3.base import DatabaseWrapper
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class SQLitePragmaTests(SimpleTestCase):
+    """Test pragmas are applied to each new SQLite connection"""
+
+    def test_pragmas_applied_on_connect(self):
+        """Test WAL, synchronous and busy timeout on a file database"""
+        with tempfile.TemporaryDirectory() as tmp:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': str(Path(tmp) / 'db.sqlite3'),
+                'TEST': {},
+            }, alias='pragmas')
+            try:
+                with wrapper.cursor() as cursor:
+                    values = {}
+                    for name in ('journal_mode', 'synchronous',
+                                 'busy_timeout'):
+                        cursor.execute(f'PRAGMA {name}')
+                        values[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1,
+                                  'busy_timeout': 5000})
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test connections are reused and bounded"""
+
+    def setUp(self):
+        self.connect = mock.Mock(side_effect=lambda: mock.Mock())
+
+    def test_released_connections_are_reused(self):
+        """Test a released connection is handed out again"""
+        pool = ConnectionPool(max_size=2)
+        first = pool.acquire(self.connect)
+        pool.release(first)
+
+        self.assertIs(pool.acquire(self.connect), first)
+        self.assertEqual(self.connect.call_count, 1)
+
+    def test_discarded_connections_are_closed(self):
+        """Test a broken connection is closed, not reused"""
+        pool = ConnectionPool(max_size=1)
+        broken = pool.acquire(self.connect)
+        pool.release(broken, discard=True)
+
+        broken.close.assert_called_once_with()
+        self.assertIsNot(pool.acquire(self.connect), broken)
+
+    def test_saturation_and_timeout(self):
+        """Test a full pool times out waiting callers and reports it"""
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        pool.acquire(self.connect)
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+        self.assertEqual(pool.stats(), {
+            'max_size': 1, 'in_use': 1, 'idle': 0, 'waiting': 0,
+            'timeouts': 1, 'saturation': 1.0})
+
+    def test_waiter_gets_released_connection(self):
+        """Test a waiting caller is woken by a release"""
+        pool = ConnectionPool(max_size=1, timeout=5)
+        held = pool.acquire(self.connect)
+        acquired = []
+        waiter = threading.Thread(
+            target=lambda: acquired.append(pool.acquire(self.connect)))
+        waiter.start()
+
+        pool.release(held)
+        waiter.join()
+
+        self.assertEqual(acquired, [held])
+
+    def test_failed_connect_frees_its_slot(self):
+        """Test a connect error does not leak capacity"""
+        pool = ConnectionPool(max_size=1)
+        with self.assertRaises(ConnectionError):
+            pool.acquire(mock.Mock(side_effect=ConnectionError))
+
+        self.assertEqual(pool.stats()['in_use'], 0)
+
+
+class HealthCheckTests(TestCase):
+    """Test the health endpoint"""
+
+    def test_reports_database_and_pool(self):
+        """Test a reachable database is reported ok with its pool"""
+        stats = {'max_size': 4, 'in_use': 4, 'idle': 0, 'waiting': 2,
+                 'timeouts': 0, 'saturation': 1.0}
+        with mock.patch('core.views.pool_stats', return_value=stats):
+            response = self.client.get('/health')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['databases']['default'], {
+            'status': 'saturated', 'vendor': 'sqlite',
+            'latency_ms': mock.ANY, 'pool': stats})
+
+    def test_unreachable_database_is_503(self):
+        """Test a failing database makes the check fail"""
+        with mock.patch('django.db.backends.utils.CursorWrapper.execute',
+                        side_effect=PoolTimeout('full')):
+            response = self.client.get('/health')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['databases']['default']['status'],
+                         'error')
@@ -0,0 +1,68 @@
+"""
+Tests for password hashing configuration
+"""
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.test import TestCase, override_settings
+
+from core.hashers import averify_password
+
+
+class PasswordHashingTests(TestCase):
+    """Test tuned hashers and rehash on login"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='mentee@example.com', password='P@ss12345')
+
+    def login(self, password='P@ss12345'):
+        return authenticate(username='mentee@example.com', password=password)
+
+    def test_new_passwords_use_tuned_argon2(self):
+        """Test passwords are hashed with the configured Argon2 cost"""
+        self.assertTrue(self.user.password.startswith(
+            'argon2$argon2id$v=19$m=19456,t=2,p=1$'))
+
+    def test_login_upgrades_pbkdf2_hash(self):
+        """Test a PBKDF2 hash is replaced with Argon2 on login"""
+        self.user.password = make_password(
+            'P@ss12345', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        self.assertEqual(self.login(), self.user)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
+
+    @override_settings(PASSWORD_HASHER_COST={'ARGON2_TIME_COST': 3})
+    def test_login_rehashes_after_cost_change(self):
+        """Test changing the cost rehashes on the next login"""
+        self.assertEqual(self.login(), self.user)
+
+        self.user.refresh_from_db()
+        self.assertIn(',t=3,', self.user.password)
+
+    def test_wrong_password_is_rejected(self):
+        """Test a wrong password does not authenticate or rehash"""
+        password = self.user.password
+
+        self.assertIsNone(self.login('wrong'))
+        self.assertIsNone(authenticate(username='nobody@example.com',
+                                       password='P@ss12345'))
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, password)
+
+    def test_async_verify_upgrades_pbkdf2_hash(self):
+        """Test the async check saves the rehash off the event loop"""
+        self.user.password = make_password(
+            'P@ss12345', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        self.assertTrue(async_to_sync(averify_password)(
+            self.user, 'P@ss12345'))
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('argon2$'))
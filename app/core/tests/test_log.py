@@ -0,0 +1,87 @@
+"""
+Tests for structured event logging
+"""
+
+import io
+import json
+import logging
+
+from django.test import SimpleTestCase
+
+from core.log import AsyncStreamHandler, EventFilter, JSONFormatter, log_event
+
+
+class EventLoggingTests(SimpleTestCase):
+    """Test the event logging handler, formatter and filter"""
+
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.handler = AsyncStreamHandler(self.stream)
+        self.handler.setFormatter(JSONFormatter())
+        self.logger = logging.getLogger('events.test')
+        self.logger.addHandler(self.handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+    def lines(self):
+        self.handler.flush()
+        return [json.loads(line)
+                for line in self.stream.getvalue().splitlines()]
+
+    def test_events_are_written_as_json_lines(self):
+        """Test an event is written with its fields on a background thread"""
+        log_event(self.logger, 'request.created', request_id=7)
+
+        [line] = self.lines()
+        self.assertEqual(line['event'], 'request.created')
+        self.assertEqual(line['level'], 'INFO')
+        self.assertEqual(line['request_id'], 7)
+
+    def test_exceptions_carry_their_traceback(self):
+        """Test exc_info adds the traceback rather than a field"""
+        try:
+            raise ValueError('broken')
+        except ValueError:
+            log_event(self.logger, 'job.failed', logging.ERROR,
+                      exc_info=True, job='prune')
+
+        [line] = self.lines()
+        self.assertNotIn('exc_info', line)
+        self.assertEqual(line['job'], 'prune')
+        self.assertIn('ValueError: broken', line['exception'])
+
+    def test_per_event_levels(self):
+        """Test an event below its configured level is dropped"""
+        self.handler.addFilter(
+            EventFilter(levels={'auth.token_issued': 'INFO'}))
+
+        log_event(self.logger, 'auth.token_issued', logging.DEBUG)
+        log_event(self.logger, 'auth.login_failed', logging.DEBUG)
+
+        self.assertEqual([line['event'] for line in self.lines()],
+                         ['auth.login_failed'])
+
+    def test_sampling(self):
+        """Test a zero sample rate drops every record of that event"""
+        self.handler.addFilter(EventFilter(sample_rates={'noisy': 0.0}))
+
+        for _ in range(10):
+            log_event(self.logger, 'noisy')
+        log_event(self.logger, 'quiet')
+
+        self.assertEqual([line['event'] for line in self.lines()], ['quiet'])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test records are counted as dropped when the queue is full"""
+        handler = AsyncStreamHandler(io.StringIO(), maxsize=1)
+        handler.listener.stop()
+
+        for _ in range(3):
+            handler.emit(logging.makeLogRecord({'msg': 'x'}))
+
+        self.assertEqual(handler.dropped, 2)
+        handler.close()
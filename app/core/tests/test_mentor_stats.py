@@ -0,0 +1,191 @@
+"""
+Tests for the per-mentor request counters
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+from graphene.test import Client
+
+from core.models import MentorStats, Request, User
+from core.schema import schema
+
+STATS = '''
+    query ($id: Int) {
+        mentorStats(mentorId: $id) { pending accepted rejected total }
+    }
+'''
+
+
+class MentorStatsTests(TestCase):
+    """Test request writes keep the mentor counters up to date"""
+
+    def setUp(self):
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.other = User.objects.create_user(
+            email='other@example.com', password='other', is_mentor=True)
+        self.mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+
+    def execute(self, query, user, **variables):
+        request = RequestFactory().post('/graphql')
+        request.user = user
+        return Client(schema).execute(query, context_value=request,
+                                      variables=variables)
+
+    def counters(self, mentor):
+        stats = MentorStats.objects.filter(mentor=mentor).first()
+        return stats and (stats.pending, stats.accepted, stats.rejected)
+
+    def test_mutations_move_counters(self):
+        """Test creating, accepting and rejecting move the counters"""
+        create = '''
+            mutation ($id: Int!) {
+                createRequest(mentorId: $id, question: "Counted?") {
+                    request { id }
+                }
+            }
+        '''
+        ids = [int(self.execute(create, self.mentee, id=self.mentor.id)
+                   ['data']['createRequest']['request']['id'])
+               for _ in range(3)]
+        self.assertEqual(self.counters(self.mentor), (3, 0, 0))
+
+        self.execute('mutation ($id: Int!) { acceptRequest(requestId: $id) '
+                     '{ request { id } } }', self.mentor, id=ids[0])
+        self.execute('mutation ($ids: [Int!]!) { rejectRequests('
+                     'requestIds: $ids) { results { error } } }',
+                     self.mentor, ids=ids)
+
+        self.assertEqual(self.counters(self.mentor), (0, 1, 2))
+
+    def test_bulk_create_counts_each_mentor(self):
+        """Test createRequests counts requests for several mentors"""
+        self.execute('''
+            mutation ($requests: [CreateRequestInput!]!) {
+                createRequests(requests: $requests) { results { error } }
+            }
+        ''', self.mentee, requests=[
+            {'mentorId': self.mentor.id, 'question': 'One?'},
+            {'mentorId': self.other.id, 'question': 'Two?'},
+            {'mentorId': self.mentor.id, 'question': 'Three?'},
+        ])
+
+        self.assertEqual(self.counters(self.mentor), (2, 0, 0))
+        self.assertEqual(self.counters(self.other), (1, 0, 0))
+
+    def test_move_counts_only_rows_changed(self):
+        """Test requests changed since they were read are not counted"""
+        requests = [Request.objects.create(
+            mentor=self.mentor, mentee=self.mentee, question='Stale?')
+            for _ in range(3)]
+        # Another writer accepts one after it was read, without locks
+        Request.objects.filter(id=requests[0].id).update(
+            status=Request.Status.ACCEPTED)
+
+        moved = Request.objects.move(requests, Request.Status.REJECTED)
+
+        self.assertEqual(moved, 2)
+        self.assertEqual(self.counters(self.mentor), (1, 0, 2))
+        self.assertEqual(Request.objects.get(id=requests[0].id).status,
+                         Request.Status.ACCEPTED)
+
+    def test_deletes_move_counters(self):
+        """Test deleted requests are uncounted, also through a cascade"""
+        requests = [Request.objects.create(
+            mentor=mentor, mentee=self.mentee, question='Deleted?')
+            for mentor in (self.mentor, self.mentor, self.other)]
+        Request.objects.filter(id=requests[1].id).transition(
+            Request.Status.ACCEPTED)
+
+        requests[0].delete()
+        self.assertEqual(self.counters(self.mentor), (0, 1, 0))
+        self.mentee.delete()
+        self.assertEqual(self.counters(self.mentor), (0, 0, 0))
+        self.assertEqual(self.counters(self.other), (0, 0, 0))
+
+        Request.objects.create(mentor=self.other, mentee=self.mentor,
+                               question='Cascaded?')
+        self.other.delete()
+        self.assertFalse(MentorStats.objects.filter(
+            mentor_id=self.other.id).exists())
+
+    def test_record_is_one_update(self):
+        """Test counters of several mentors move with one UPDATE"""
+        with self.assertNumQueries(2):
+            MentorStats.objects.record({
+                (self.mentor.id, Request.Status.PENDING): 2,
+                (self.other.id, Request.Status.PENDING): -1,
+                (self.other.id, Request.Status.ACCEPTED): 1,
+                (self.mentee.id, Request.Status.REJECTED): 0,
+            })
+
+        self.assertEqual(self.counters(self.mentor), (2, 0, 0))
+        self.assertEqual(self.counters(self.other), (-1, 1, 0))
+        self.assertIsNone(self.counters(self.mentee))
+
+    def test_mentor_stats_query(self):
+        """Test mentors read their own totals and staff anyone's"""
+        Request.objects.create(mentor=self.mentor, mentee=self.mentee,
+                               question='Counted?')
+
+        mine = self.execute(STATS, self.mentor)['data']['mentorStats']
+        self.assertEqual(mine, {'pending': 1, 'accepted': 0,
+                                'rejected': 0, 'total': 1})
+        self.assertEqual(
+            self.execute(STATS, self.other)['data']['mentorStats'],
+            {'pending': 0, 'accepted': 0, 'rejected': 0, 'total': 0})
+
+        denied = self.execute(STATS, self.other, id=self.mentor.id)
+        self.assertEqual(denied['errors'][0]['message'],
+                         'You do not have permission to perform this action')
+        self.other.is_staff = True
+        self.assertEqual(self.execute(STATS, self.other, id=self.mentor.id)
+                         ['data']['mentorStats'], mine)
+
+
+class ReconcileMentorStatsTests(TestCase):
+    """Test the command rebuilding counters from the requests"""
+
+    def setUp(self):
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.other = User.objects.create_user(
+            email='other@example.com', password='other', is_mentor=True)
+        mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+        Request.objects.bulk_create([
+            Request(mentor=self.mentor, mentee=mentee, question='One?'),
+            Request(mentor=self.mentor, mentee=mentee, question='Two?',
+                    status=Request.Status.ACCEPTED),
+        ])
+        MentorStats.objects.create(mentor=self.other, rejected=4)
+
+    def reconcile(self, *args):
+        out = StringIO()
+        call_command('reconcile_mentor_stats', *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        """Test drift is reported without being fixed"""
+        self.assertEqual(self.reconcile('--dry-run'),
+                         f'mentor {self.mentor.id}: pending 0 -> 1, '
+                         f'accepted 0 -> 1\n'
+                         f'mentor {self.other.id}: rejected 4 -> 0\n'
+                         f'Found drift for 2 of 2 mentors.\n')
+        self.assertFalse(MentorStats.objects.filter(
+            mentor=self.mentor).exists())
+
+    def test_reconcile(self):
+        """Test drifted counters are rebuilt and then left alone"""
+        self.assertTrue(self.reconcile().endswith(
+            'Fixed drift for 2 of 2 mentors.\n'))
+
+        self.assertEqual(
+            list(MentorStats.objects.order_by('mentor').values_list(
+                'pending', 'accepted', 'rejected')),
+            [(1, 1, 0), (0, 0, 0)])
+        self.assertEqual(self.reconcile(),
+                         'Fixed drift for 0 of 2 mentors.\n')
@@ -0,0 +1,161 @@
+"""
+Tests for GraphQL metrics and tracing
+"""
+
+import json
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from graphql import parse
+
+from core.metrics import (
+    REGISTRY,
+    Counter,
+    Histogram,
+    OperationTrace,
+    n_plus_one,
+    operations,
+    resolver_duration,
+    sql_queries,
+)
+from core.models import User
+
+QUERY = 'query Mentors { mentors { edges { node { email } } } }'
+
+
+@override_settings(READ_CACHE={'ENABLED': False})
+class OperationMetricsTests(TestCase):
+    """Test operations executed by the view are measured"""
+
+    def setUp(self):
+        REGISTRY.clear()
+        User.objects.create_user(email='mentor@example.com',
+                                 password='mentor', is_mentor=True)
+
+    def post(self, query):
+        return self.client.post('/graphql', json.dumps({'query': query}),
+                                content_type='application/json').json()
+
+    def test_operation_is_measured(self):
+        """Test resolver, operation and SQL metrics of one query"""
+        self.post(QUERY)
+
+        labels = {'type': 'query', 'operation': 'Mentors'}
+        self.assertEqual(resolver_duration.count(field='Query.mentors'), 1)
+        self.assertEqual(resolver_duration.count(field='UserType.email'), 1)
+        self.assertEqual(operations.value(status='ok', **labels), 1)
+        self.assertEqual(sql_queries.count(**labels), 1)
+
+    def test_metrics_endpoint(self):
+        """Test metrics are served in the Prometheus text format"""
+        self.post(QUERY)
+
+        response = self.client.get('/metrics')
+        body = response.content.decode()
+
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4')
+        self.assertIn('# TYPE graphql_resolver_duration_seconds histogram',
+                      body)
+        self.assertIn('graphql_resolver_duration_seconds_count'
+                      '{field="Query.mentors"} 1', body)
+        self.assertIn('graphql_operations_total'
+                      '{type="query",operation="Mentors",status="ok"} 1',
+                      body)
+
+    @override_settings(GRAPHQL_METRICS={'TRACING': True})
+    def test_tracing_extension(self):
+        """Test resolver timings are returned when tracing is enabled"""
+        result = self.post(QUERY)
+
+        tracing = result['extensions']['tracing']
+        self.assertEqual(tracing['version'], 1)
+        paths = [r['path'] for r in tracing['execution']['resolvers']]
+        self.assertIn(['mentors'], paths)
+        self.assertIn(['mentors', 'edges', 0, 'node', 'email'], paths)
+
+    def test_tracing_is_off_by_default(self):
+        """Test responses carry no tracing block unless enabled"""
+        self.assertNotIn('tracing', self.post(QUERY)['extensions'])
+
+    @override_settings(GRAPHQL_METRICS={'ENABLED': False})
+    def test_disabled(self):
+        """Test nothing is recorded when metrics are disabled"""
+        self.post(QUERY)
+
+        self.assertEqual(REGISTRY.render().count('_count{'), 0)
+
+
+class NPlusOneTests(TestCase):
+    """Test repeated statements within one operation are reported"""
+
+    def setUp(self):
+        REGISTRY.clear()
+
+    def run_statements(self, count):
+        trace = OperationTrace(parse('query Rows { me { id } }')
+                               .definitions[0])
+        with trace.activate(), connection.cursor() as cursor:
+            for i in range(count):
+                cursor.execute('SELECT %s', [i])
+        return trace
+
+    @override_settings(GRAPHQL_METRICS={'N_PLUS_ONE_THRESHOLD': 3})
+    def test_repeated_statement_is_reported(self):
+        """Test one template run over the threshold counts as N+1"""
+        with self.assertLogs('events.graphql', 'WARNING') as logs:
+            self.run_statements(4).finish(
+                type('Result', (), {'errors': None})())
+
+        self.assertEqual(n_plus_one.value(type='query', operation='Rows'), 1)
+        self.assertEqual(logs.records[0].fields['count'], 4)
+        self.assertEqual(logs.records[0].fields['sql'], 'SELECT %s')
+
+    @override_settings(GRAPHQL_METRICS={'N_PLUS_ONE_THRESHOLD': 3})
+    def test_statements_under_threshold(self):
+        """Test statements within the threshold are not reported"""
+        trace = self.run_statements(3)
+        trace.finish(type('Result', (), {'errors': None})())
+
+        self.assertEqual(trace.statements, {'SELECT %s': 3})
+        self.assertEqual(n_plus_one.value(type='query', operation='Rows'), 0)
+
+
+class MetricFormatTests(SimpleTestCase):
+    """Test the Prometheus exposition of metrics"""
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket counts include every smaller bucket"""
+        histogram = Histogram('latency', 'Latency.', ['field'],
+                              buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, field='Query.a')
+
+        self.assertEqual(histogram.render()[2:], [
+            'latency_bucket{field="Query.a",le="0.1"} 1',
+            'latency_bucket{field="Query.a",le="1"} 2',
+            'latency_bucket{field="Query.a",le="+Inf"} 3',
+            'latency_sum{field="Query.a"} 5.55',
+            'latency_count{field="Query.a"} 3',
+        ])
+
+    def test_labels_are_escaped(self):
+        """Test quotes, backslashes and newlines in label values"""
+        counter = Counter('ops', 'Operations.', ['operation'])
+        counter.inc(operation='a"b\\c\nd')
+
+        self.assertEqual(counter.render()[2],
+                         'ops{operation="a\\"b\\\\c\\nd"} 1')
+
+    @override_settings(GRAPHQL_METRICS={'MAX_SERIES': 2})
+    def test_series_are_capped(self):
+        """Test label sets beyond MAX_SERIES are folded into other"""
+        counter = Counter('ops', 'Operations.', ['operation'])
+        for name in ('a', 'b', 'c', 'd'):
+            counter.inc(operation=name)
+
+        self.assertEqual(counter.render()[2:], [
+            'ops{operation="a"} 1',
+            'ops{operation="b"} 1',
+            'ops{operation="other"} 2',
+        ])
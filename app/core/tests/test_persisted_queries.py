@@ -0,0 +1,101 @@
+"""
+Tests for persisted queries on the GraphQL endpoint
+"""
+
+import json
+import tempfile
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from core import persisted_queries
+from core.persisted_queries import load_allow_list, query_hash
+
+QUERY = '{ mentors { edges { node { email } } } }'
+
+
+class PersistedQueryTests(TestCase):
+    """Test automatic persisted queries and the allow-list"""
+
+    def setUp(self):
+        persisted_queries.documents.clear()
+        load_allow_list.cache_clear()
+
+    def post(self, body):
+        response = self.client.post('/graphql', json.dumps(body),
+                                    content_type='application/json')
+        return response.json()
+
+    def persisted(self, sha):
+        return {'persistedQuery': {'version': 1, 'sha256Hash': sha}}
+
+    def test_unknown_hash_asks_for_query(self):
+        """Test a hash the server has not seen returns the APQ error"""
+        result = self.post({'extensions': self.persisted(query_hash(QUERY))})
+
+        self.assertEqual(result['errors'][0]['message'],
+                         'PersistedQueryNotFound')
+
+    def test_registered_hash_runs_without_query(self):
+        """Test a hash registered with its query is served from cache"""
+        extensions = self.persisted(query_hash(QUERY))
+        first = self.post({'query': QUERY, 'extensions': extensions})
+
+        with mock.patch('core.views.parse') as parse:
+            second = self.post({'extensions': extensions})
+
+        parse.assert_not_called()
+        self.assertEqual(first, second)
+        self.assertEqual(second['data'], {'mentors': {'edges': []}})
+
+    def test_hash_mismatch_is_rejected(self):
+        """Test a query whose hash differs from the one sent is refused"""
+        result = self.post({'query': QUERY,
+                            'extensions': self.persisted('0' * 64)})
+
+        self.assertEqual(result['errors'][0]['extensions']['code'],
+                         'PERSISTED_QUERY_HASH_MISMATCH')
+
+    def test_plain_queries_are_cached(self):
+        """Test repeated query text is parsed once"""
+        self.post({'query': QUERY})
+
+        with mock.patch('core.views.parse') as parse:
+            result = self.post({'query': QUERY})
+
+        parse.assert_not_called()
+        self.assertNotIn('errors', result)
+
+    def test_invalid_documents_are_not_cached(self):
+        """Test validation errors are returned and not cached"""
+        result = self.post({'query': '{ nope }'})
+
+        self.assertIn('errors', result)
+        self.assertEqual(len(persisted_queries.documents), 0)
+
+    def test_cache_evicts_least_recently_used(self):
+        """Test the document cache is bounded"""
+        cache = persisted_queries.DocumentCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+
+    def test_allow_list_only(self):
+        """Test only allow-listed documents run in allow-list mode"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump({query_hash(QUERY): QUERY}, f)
+            f.flush()
+            config = {'ALLOW_LIST': f.name, 'ALLOW_LIST_ONLY': True}
+
+            with override_settings(GRAPHQL_PERSISTED_QUERIES=config):
+                allowed = self.post(
+                    {'extensions': self.persisted(query_hash(QUERY))})
+                rejected = self.post({'query': '{ users { totalCount } }'})
+
+        self.assertNotIn('errors', allowed)
+        self.assertEqual(rejected['errors'][0]['extensions']['code'],
+                         'PERSISTED_QUERY_NOT_ALLOWED')
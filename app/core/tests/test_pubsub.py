@@ -0,0 +1,132 @@
+"""
+Tests for the subscription channel layers
+"""
+
+import asyncio
+import threading
+
+from django.test import SimpleTestCase
+
+from core.pubsub import InMemoryChannelLayer, RedisChannelLayer
+from core.tests.fake_redis import FakeRedis
+
+
+async def listen(layer, group):
+    """Subscribe to group, returning the received list and its task"""
+    received = []
+
+    async def consume():
+        async for message in layer.subscribe(group):
+            received.append(message)
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0)
+    return received, task
+
+
+async def wait_until(condition, timeout=2.0):
+    """Yield to the event loop until condition() holds"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        if loop.time() > deadline:
+            raise AssertionError('Timed out waiting for messages.')
+        await asyncio.sleep(0.01)
+
+
+async def stop(*tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class InMemoryChannelLayerTests(SimpleTestCase):
+    """Test fan-out within one process"""
+
+    async def test_fan_out_is_per_group(self):
+        """Test a message only reaches the subscribers of its group"""
+        layer = InMemoryChannelLayer()
+        first, first_task = await listen(layer, 'mentor.1')
+        second, second_task = await listen(layer, 'mentor.1')
+        other, other_task = await listen(layer, 'mentor.2')
+
+        layer.publish('mentor.1', {'id': 7})
+        await wait_until(lambda: first and second)
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(first, [{'id': 7}])
+        self.assertEqual(second, [{'id': 7}])
+        self.assertEqual(other, [])
+        self.assertEqual(layer.group_sizes(), {'mentor.1': 2, 'mentor.2': 1})
+        await stop(first_task, second_task, other_task)
+        self.assertEqual(layer.group_sizes(), {})
+
+    async def test_publish_from_thread(self):
+        """Test mutations on worker threads reach the event loop"""
+        layer = InMemoryChannelLayer()
+        received, task = await listen(layer, 'mentee.1')
+
+        thread = threading.Thread(
+            target=layer.publish, args=('mentee.1', {'id': 1}))
+        thread.start()
+        thread.join()
+        await wait_until(lambda: received)
+
+        self.assertEqual(received, [{'id': 1}])
+        await stop(task)
+
+    async def test_slow_subscriber_drops_oldest(self):
+        """Test unread messages beyond capacity are dropped"""
+        layer = InMemoryChannelLayer(capacity=2)
+        messages = layer.subscribe('mentor.1')
+        first = asyncio.ensure_future(messages.__anext__())
+        await asyncio.sleep(0)
+
+        layer.publish('mentor.1', {'id': 1})
+        self.assertEqual(await first, {'id': 1})
+        for i in range(2, 6):
+            layer.publish('mentor.1', {'id': i})
+        await asyncio.sleep(0)
+
+        self.assertEqual(await messages.__anext__(), {'id': 4})
+        self.assertEqual(await messages.__anext__(), {'id': 5})
+        await messages.aclose()
+
+
+class RedisChannelLayerTests(SimpleTestCase):
+    """Test fan-out between processes sharing a Redis server"""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.nodes = [RedisChannelLayer(client=self.redis, poll_interval=0.01)
+                      for _ in range(2)]
+
+    def tearDown(self):
+        for node in self.nodes:
+            node.close()
+
+    async def test_messages_cross_nodes(self):
+        """Test a message published on one node reaches another's users"""
+        publisher, subscriber = self.nodes
+        received, task = await listen(subscriber, 'mentor.1')
+        other, other_task = await listen(subscriber, 'mentor.2')
+
+        publisher.publish('mentor.1', {'id': 3})
+        await wait_until(lambda: received)
+        await asyncio.sleep(0.05)
+
+        self.assertEqual(received, [{'id': 3}])
+        self.assertEqual(other, [])
+        await stop(task, other_task)
+
+    async def test_only_groups_with_subscribers_are_subscribed(self):
+        """Test a node holds Redis subscriptions for its own users only"""
+        publisher, subscriber = self.nodes
+        received, task = await listen(subscriber, 'mentee.1')
+
+        self.assertEqual(subscriber.pubsub.channels, {'graphql:mentee.1'})
+        self.assertEqual(publisher.pubsub.channels, set())
+        self.assertEqual(self.redis.publish('graphql:mentee.2', '{}'), 0)
+
+        await stop(task)
+        self.assertEqual(subscriber.pubsub.channels, set())
@@ -0,0 +1,226 @@
+"""
+Tests that no operation's SQL query count grows with the data
+"""
+
+import re
+from collections import Counter
+from types import SimpleNamespace
+from typing import Callable, NamedTuple, Optional
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.test import RequestFactory, TestCase, override_settings
+from graphene.test import Client
+from graphql_relay import to_global_id
+
+from core.metrics import OperationTrace
+from core.models import Request, User
+from core.recommend import build_index
+from core.schema import schema
+
+# Data set sizes every operation runs against
+SIZES = (3, 9, 27)
+PASSWORD = 'budget-pass-123'
+DOMAIN = 'budget.example.com'
+
+REQUEST_FIELDS = '''
+    totalCount
+    edges { node {
+        id question status mentorId menteeId
+        mentor { email } mentee { email }
+    } }
+'''
+USER_FIELDS = 'totalCount edges { node { id email expertise } }'
+RESULT_FIELDS = 'results { requestId error request { id status } }'
+
+# Parts of SQL that vary with the input rather than the statement run
+TEMPLATES = [
+    (re.compile(r'\(%s(?:, %s)*\)(?:, \(%s(?:, %s)*\))*'), '(%s, ...)'),
+    (re.compile(r'SELECT %s(?:, %s)*(?: UNION ALL SELECT %s(?:, %s)*)+'),
+     'SELECT %s, ...'),
+    (re.compile(r'WHEN \([^()]*\) THEN %s(?: WHEN \([^()]*\) THEN %s)*'),
+     'WHEN (...) THEN %s'),
+    (re.compile(r'"s\d+_x\d+"'), '"savepoint"'),
+    (re.compile(r'LIMIT \d+'), 'LIMIT %s'),
+]
+
+
+def template(sql):
+    """Return sql with placeholder lists, limits and savepoints collapsed"""
+    for pattern, replacement in TEMPLATES:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class Operation(NamedTuple):
+    """A root field's operation, its variables and who sends it"""
+    document: str
+    variables: Callable = lambda data: {}
+    # Attribute of the data set holding the user, or None for anonymous
+    actor: Optional[str] = 'mentee'
+
+
+OPERATIONS = {
+    'allRequests': Operation(
+        '{ allRequests { %s } }' % REQUEST_FIELDS),
+    # The second alias needs mentor columns the first did not load
+    'allRequests (two projections)': Operation(
+        '{ a: allRequests { edges { node { mentor { email } } } } '
+        'b: allRequests { edges { node { mentor { email expertise '
+        'occupation } } } } }'),
+    'userRequests': Operation(
+        'query ($menteeId: Int!) { userRequests(menteeId: $menteeId) '
+        '{ %s } }' % REQUEST_FIELDS,
+        lambda data: {'menteeId': data.mentee.id}),
+    'mentorRequests': Operation(
+        '{ mentorRequests { %s } }' % REQUEST_FIELDS, actor='mentor'),
+    'mentorStats': Operation(
+        '{ mentorStats { pending accepted rejected total } }',
+        actor='mentor'),
+    'me': Operation('{ me { id email } }'),
+    'user': Operation(
+        'query ($id: ID!) { user(id: $id) { id email } }',
+        lambda data: {'id': to_global_id('UserNode', data.mentor.id)}),
+    'users': Operation('{ users { %s } }' % USER_FIELDS),
+    'mentors': Operation('{ mentors { %s } }' % USER_FIELDS),
+    'mentor': Operation(
+        'query ($mentorId: Int!) { mentor(mentorId: $mentorId) { email } }',
+        lambda data: {'mentorId': data.mentor.id}),
+    'searchMentors': Operation(
+        '{ searchMentors(query: "Python") { %s '
+        'expertiseFacets { value count } '
+        'occupationFacets { value count } } }' % USER_FIELDS),
+    'recommendMentors': Operation(
+        '{ recommendMentors(question: "Python engineer", first: 50) '
+        '{ score mentor { id email } } }'),
+    'cacheStats': Operation('{ cacheStats { hits } }', actor='staff'),
+    'createRequest': Operation(
+        'mutation ($mentorId: Int!) { createRequest(mentorId: $mentorId, '
+        'question: "Budget?") { request { id mentor { email } } } }',
+        lambda data: {'mentorId': data.mentor.id}),
+    'acceptRequest': Operation(
+        'mutation ($id: Int!) { acceptRequest(requestId: $id) '
+        '{ request { id status mentee { email } } } }',
+        lambda data: {'id': data.pending_ids[0]}, actor='mentor'),
+    'rejectRequest': Operation(
+        'mutation ($id: Int!) { rejectRequest(requestId: $id) '
+        '{ request { id status mentee { email } } } }',
+        lambda data: {'id': data.pending_ids[0]}, actor='mentor'),
+    'createRequests': Operation(
+        'mutation ($requests: [CreateRequestInput!]!) '
+        '{ createRequests(requests: $requests) { %s } }' % RESULT_FIELDS,
+        lambda data: {'requests': [
+            {'mentorId': mentor_id, 'question': 'Budget?'}
+            for mentor_id in data.mentor_ids]}),
+    'acceptRequests': Operation(
+        'mutation ($ids: [Int!]!) { acceptRequests(requestIds: $ids) '
+        '{ %s } }' % RESULT_FIELDS,
+        lambda data: {'ids': data.pending_ids}, actor='mentor'),
+    'rejectRequests': Operation(
+        'mutation ($ids: [Int!]!) { rejectRequests(requestIds: $ids) '
+        '{ %s } }' % RESULT_FIELDS,
+        lambda data: {'ids': data.pending_ids}, actor='mentor'),
+    'registerUser': Operation(
+        'mutation { registerUser(email: "new@%s", password: "%s", '
+        'firstName: "New", lastName: "User") { user { id } } }'
+        % (DOMAIN, PASSWORD), actor=None),
+    'tokenAuth': Operation(
+        'mutation ($email: String!) { tokenAuth(email: $email, '
+        'password: "%s") { token } }' % PASSWORD,
+        lambda data: {'email': data.mentee.email}, actor=None),
+    'changeUserToMentor': Operation(
+        'mutation { changeUserToMentor { success } }'),
+    'revokeAllTokens': Operation(
+        'mutation ($id: Int!) { revokeAllTokens(userId: $id) { revoked } }',
+        lambda data: {'id': data.mentee.id}),
+}
+
+
+@override_settings(READ_CACHE={'ENABLED': False})
+class QueryBudgetTests(TestCase):
+    """Test operations run as many SQL queries for any amount of data.
+
+    Each operation runs against data sets of growing size, where every
+    list it reads and every batch it writes has one item per row. A
+    resolver querying per row shows up as SQL run more often on the
+    larger data sets, and the test fails naming those statements.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.password = make_password(PASSWORD)
+
+    def build(self, size):
+        """Create a mentor, a mentee and staff with size rows each"""
+        def user(name, **fields):
+            return User(email=f'{name}@{DOMAIN}', password=self.password,
+                        first_name=name, last_name='Budget',
+                        occupation='Engineer', expertise='Python', **fields)
+
+        User.objects.bulk_create(
+            [user('mentor', is_mentor=True), user('mentee'),
+             user('staff', is_staff=True)]
+            + [user(f'mentor{i}', is_mentor=True) for i in range(size)]
+            + [user(f'mentee{i}') for i in range(size)])
+        users = User.objects.filter(email__endswith=DOMAIN).in_bulk(
+            field_name='email')
+
+        def get(name):
+            return users[f'{name}@{DOMAIN}']
+
+        data = SimpleNamespace(
+            mentor=get('mentor'), mentee=get('mentee'), staff=get('staff'),
+            mentor_ids=[get(f'mentor{i}').id for i in range(size)])
+        Request.objects.bulk_create(
+            [Request(mentor=data.mentor, mentee=get(f'mentee{i}'),
+                     question=f'Question {i}') for i in range(size)]
+            + [Request(mentor_id=mentor_id, mentee=data.mentee,
+                       question=f'Question {i}')
+               for i, mentor_id in enumerate(data.mentor_ids)])
+        data.pending_ids = list(Request.objects.filter(
+            mentor=data.mentor).values_list('id', flat=True))
+        return data
+
+    def measure(self, operation, size):
+        """Run operation on a fresh data set, tallying its statements"""
+        with transaction.atomic():
+            data = self.build(size)
+            # recommendMentors scores against the index of these rows
+            build_index()
+            request = RequestFactory().post('/graphql')
+            request.user = (getattr(data, operation.actor)
+                            if operation.actor else AnonymousUser())
+            trace = OperationTrace(None)
+            with trace.activate():
+                result = Client(schema).execute(
+                    operation.document, context_value=request,
+                    variables=operation.variables(data))
+            transaction.set_rollback(True)
+        self.assertNotIn('errors', result)
+        statements = Counter()
+        for sql, count in trace.statements.items():
+            statements[template(sql)] += count
+        return statements
+
+    def test_every_operation_has_a_budget(self):
+        """Test each root query and mutation field is measured below"""
+        graphql_schema = schema.graphql_schema
+        fields = {*graphql_schema.query_type.fields,
+                  *graphql_schema.mutation_type.fields}
+        self.assertEqual(sorted(fields - OPERATIONS.keys()), [])
+
+    def test_query_count_is_constant(self):
+        """Test no operation runs more queries on more data"""
+        for name, operation in OPERATIONS.items():
+            with self.subTest(operation=name):
+                smallest, *larger = [self.measure(operation, size)
+                                     for size in SIZES]
+                grown = [f'{smallest[sql]} -> {counts[sql]} at {size} rows: '
+                         f'{sql}'
+                         for size, counts in zip(SIZES[1:], larger)
+                         for sql in counts if counts[sql] > smallest[sql]]
+                if grown:
+                    self.fail('\n'.join(
+                        [f'{name} runs more SQL than at {SIZES[0]} rows:',
+                         *grown]))
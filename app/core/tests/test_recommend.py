@@ -0,0 +1,179 @@
+"""
+Tests for mentor recommendations
+"""
+
+import time
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase, TransactionTestCase, override_settings
+from graphene.test import Client
+
+from core import recommend
+from core.models import User
+from core.recommend import MentorIndex, get_index, listed_mentors
+from core.schema import schema
+
+RECOMMEND = '''
+    query ($question: String!, $first: Int) {
+        recommendMentors(question: $question, first: $first) {
+            score
+            mentor { email }
+        }
+    }
+'''
+
+
+def create_mentor(name, expertise, occupation='', bio='', **fields):
+    return User.objects.create_user(
+        email=f'{name}@example.com', password=name, is_mentor=True,
+        expertise=expertise, occupation=occupation, bio=bio, **fields)
+
+
+class RecommendTests(TestCase):
+    """Test mentors are ranked by similarity to a question"""
+
+    def setUp(self):
+        recommend.reset_index()
+        self.django = create_mentor(
+            'django', 'Django ORM', 'Backend engineer',
+            'I tune slow Django queries')
+        self.react = create_mentor(
+            'react', 'React', 'Frontend engineer', 'Hooks and state')
+        self.career = create_mentor(
+            'career', 'Career', 'Engineering manager',
+            'Interviews and promotions')
+        create_mentor('inactive', 'Django ORM', is_active=False)
+        User.objects.create_user(email='mentee@example.com',
+                                 password='mentee', expertise='Django ORM')
+        recommend.build_index()
+
+    def tearDown(self):
+        recommend.reset_index()
+
+    def emails(self, question, first=5):
+        return [User.objects.get(id=id).email.split('@')[0]
+                for id, _ in recommend.recommend(question, first)]
+
+    def test_ranking(self):
+        """Test the closest profiles come first and others not at all"""
+        self.assertEqual(self.emails('How do I speed up Django ORM '
+                                     'queries?'), ['django'])
+        self.assertEqual(self.emails('frontend engineer'),
+                         ['react', 'django'])
+        self.assertEqual(self.emails('frontend engineer', first=1),
+                         ['react'])
+        self.assertEqual(self.emails('Gardening tips'), [])
+        self.assertEqual(self.emails('   '), [])
+
+    def test_scores(self):
+        """Test scores are positive and in descending order"""
+        ranked = recommend.recommend('Django engineer interviews', 5)
+        scores = [score for _, score in ranked]
+
+        self.assertEqual(len(ranked), 3)
+        self.assertTrue(all(score > 0 for score in scores))
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_profile_saves_update_the_index(self):
+        """Test saved, demoted and deleted mentors are picked up"""
+        get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.react.expertise = 'Kubernetes'
+            self.react.save()
+            create_mentor('ops', 'Kubernetes clusters')
+        self.assertEqual(self.emails('Kubernetes clusters'),
+                         ['ops', 'react'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.react.is_mentor = False
+            self.react.save(update_fields=['is_mentor'])
+            User.objects.get(email='ops@example.com').delete()
+        self.assertEqual(self.emails('Kubernetes'), [])
+
+    @override_settings(MENTOR_RECOMMENDATIONS={'MERGE_EVERY': 2})
+    def test_merge(self):
+        """Test merged updates match an index built from scratch"""
+        index = get_index()
+        for name in ('react', 'career', 'django'):
+            user = getattr(self, name)
+            user.bio = f'Mentoring on {name} for years'
+            user.save(update_fields=['bio'])
+            index.update(user)
+        index.remove(self.career.id)
+
+        fresh = MentorIndex.build(listed_mentors())
+        self.assertEqual(len(index.side), 1)
+        self.assertEqual(len(index), len(fresh) - 1)
+        expected = fresh.df.copy()
+        start, end = fresh.rows_matrix.indptr[
+            fresh.rows[self.career.id]:fresh.rows[self.career.id] + 2]
+        expected[fresh.rows_matrix.indices[start:end]] -= 1
+        np.testing.assert_array_equal(index.df, expected)
+        self.assertEqual(self.emails('mentoring on django'),
+                         ['django', 'react'])
+
+    def test_query(self):
+        """Test recommendMentors returns mentors with their scores"""
+        result = Client(schema).execute(RECOMMEND, variables={
+            'question': 'Django ORM', 'first': 2})
+
+        [recommendation] = result['data']['recommendMentors']
+        self.assertEqual(recommendation['mentor'],
+                         {'email': 'django@example.com'})
+        self.assertGreater(recommendation['score'], 0)
+
+    def test_query_skips_demoted_mentors(self):
+        """Test mentors demoted without a signal are not returned"""
+        get_index()
+        User.objects.filter(id=self.django.id).update(is_mentor=False)
+
+        result = Client(schema).execute(RECOMMEND, variables={
+            'question': 'Django ORM', 'first': 2})
+
+        self.assertEqual(recommend.recommend('Django ORM', 2)[0][0],
+                         self.django.id)
+        self.assertEqual(result['data']['recommendMentors'], [])
+
+    def test_first_build_runs_in_the_background(self):
+        """Test nothing is recommended until the first index is built"""
+        recommend.reset_index()
+
+        with mock.patch.object(recommend, 'start_rebuild') as start:
+            result = Client(schema).execute(RECOMMEND, variables={
+                'question': 'Django ORM', 'first': 2})
+
+        start.assert_called_once_with()
+        self.assertEqual(result['data']['recommendMentors'], [])
+
+    def test_first_is_limited(self):
+        """Test first must be between 1 and MAX_FIRST"""
+        for first in (0, 51):
+            with self.subTest(first=first):
+                result = Client(schema).execute(RECOMMEND, variables={
+                    'question': 'Django', 'first': first})
+                self.assertEqual(
+                    result['errors'][0]['message'],
+                    'Argument `first` must be between 1 and 50.')
+
+
+class RebuildTests(TransactionTestCase):
+    """Test stale indexes are rebuilt in the background"""
+
+    def tearDown(self):
+        recommend.reset_index()
+
+    @override_settings(MENTOR_RECOMMENDATIONS={'MAX_AGE': 0})
+    def test_rebuild(self):
+        """Test writes that send no signal show up after a rebuild"""
+        recommend.reset_index()
+        mentor = create_mentor('mentor', 'Python')
+        get_index()
+        User.objects.filter(id=mentor.id).update(expertise='Rust')
+
+        for _ in range(500):
+            if recommend.recommend('Rust', 5):
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(recommend.recommend('Rust', 5)[0][0], mentor.id)
@@ -0,0 +1,160 @@
+"""
+Tests for read-replica routing with two SQLite databases
+"""
+
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test import override_settings
+from graphql_jwt.shortcuts import get_token
+
+from core.models import Request, User
+from core.routing import ReplicaRoutingMiddleware, replica
+
+REPLICATION = {'REPLICAS': ['replica'], 'STICKY_SECONDS': 5}
+MENTOR_REQUESTS = '{ mentorRequests { edges { node { status } } } }'
+
+
+@override_settings(DATABASE_REPLICATION=REPLICATION,
+                   READ_CACHE={'ENABLED': False})
+class ReplicaRoutingTests(TransactionTestCase):
+    """Test queries read the replica file and mutations the primary"""
+
+    # The replica alias only exists once setUpClass has added it.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        connections.databases['replica'] = {
+            **connections['default'].settings_dict,
+            'NAME': str(Path(cls.tmp.name) / 'replica.sqlite3'),
+        }
+        super().setUpClass()
+        call_command('migrate', database='replica', verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        cache.clear()
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+        self.request = Request.objects.create(
+            mentor=self.mentor, mentee=self.mentee, question='Lag?')
+        self.replicate()
+
+    def replicate(self):
+        """Copy the primary's rows to the replica, as replication would"""
+        for model in (User, Request):
+            model.objects.using('replica').all().delete()
+            model.objects.using('replica').bulk_create(
+                model.objects.using('default').all())
+
+    def post(self, query, user=None):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'BEARER {get_token(user)}'
+        response = self.client.post(
+            '/graphql', json.dumps({'query': query}),
+            content_type='application/json', **headers)
+        return response.json()
+
+    def mentor_request_statuses(self):
+        result = self.post(MENTOR_REQUESTS, self.mentor)
+        return [edge['node']['status']
+                for edge in result['data']['mentorRequests']['edges']]
+
+    def test_queries_read_the_replica(self):
+        """Test a query sees the replica's rows, not the primary's"""
+        User.objects.using('replica').filter(pk=self.mentor.pk).update(
+            email='replica@example.com')
+
+        result = self.post('{ mentors { edges { node { email } } } }')
+
+        self.assertEqual(result['data']['mentors']['edges'],
+                         [{'node': {'email': 'replica@example.com'}}])
+
+    def test_reads_stick_to_primary_after_mutation(self):
+        """Test a mentor sees their own accept before replication"""
+        result = self.post('mutation { acceptRequest(requestId: %d) '
+                           '{ request { status } } }' % self.request.pk,
+                           self.mentor)
+        self.assertEqual(
+            result['data']['acceptRequest']['request']['status'],
+            'Accepted')
+
+        self.assertEqual(self.mentor_request_statuses(), ['Accepted'])
+
+        # Without the pin the lagging replica is read.
+        cache.clear()
+        self.assertEqual(self.mentor_request_statuses(), ['Pending'])
+
+    @override_settings(DATABASE_REPLICATION={**REPLICATION,
+                                             'STICKY_SECONDS': 0})
+    def test_stickiness_can_be_disabled(self):
+        """Test a zero window sends reads straight back to the replica"""
+        self.post('mutation { acceptRequest(requestId: %d) '
+                  '{ request { status } } }' % self.request.pk, self.mentor)
+
+        self.assertEqual(self.mentor_request_statuses(), ['Pending'])
+
+    def test_pin_is_per_user(self):
+        """Test another user's mutation does not pin this user"""
+        self.post('mutation { changeUserToMentor { success } }', self.mentee)
+        Request.objects.filter(pk=self.request.pk).update(
+            status=Request.Status.ACCEPTED)
+
+        self.assertEqual(self.mentor_request_statuses(), ['Pending'])
+
+
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Test routing is reset per request on either handler"""
+
+    def view(self, request):
+        self.seen = (threading.get_ident(), replica.get())
+        replica.set('replica')
+        return 'response'
+
+    def test_sync(self):
+        """Test a sync handler is called with the primary selected"""
+        middleware = ReplicaRoutingMiddleware(self.view)
+
+        self.assertFalse(iscoroutinefunction(middleware))
+        self.assertEqual(middleware(None), 'response')
+        self.assertEqual(self.seen, (threading.get_ident(), None))
+        self.assertIsNone(replica.get())
+
+    def test_async(self):
+        """Test an async handler is awaited on the event loop"""
+        async def view(request):
+            return self.view(request)
+
+        middleware = ReplicaRoutingMiddleware(view)
+
+        async def call():
+            token = replica.set('stale')
+            response = await middleware(None)
+            after = replica.get()
+            replica.reset(token)
+            return threading.get_ident(), response, after
+
+        self.assertTrue(iscoroutinefunction(middleware))
+        thread, response, after = async_to_sync(call)()
+        self.assertEqual(response, 'response')
+        self.assertEqual(self.seen, (thread, None))
+        self.assertEqual(after, 'stale')
@@ -1,11 +1,19 @@
 """
  Set currently logged in user context
 """
+import logging
+
 from graphql_jwt.utils import jwt_payload
 
+from core.log import get_event_logger, log_event
+
+logger = get_event_logger('auth')
+
 
 def custom_jwt_payload_handler(user, context=None):
     payload = jwt_payload(user, context)
+    payload['userId'] = user.pk
     payload['isMentor'] = user.is_mentor
-    print("logged In User", user)
+    payload['isStaff'] = user.is_staff
+    log_event(logger, 'auth.token_issued', logging.DEBUG, user_id=user.pk)
     return payload
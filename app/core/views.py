@@ -0,0 +1,539 @@
+"""
+GraphQL endpoint
+"""
+
+import asyncio
+import copy
+import json
+import time
+from typing import NamedTuple, Optional
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, connection, connections, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.http.response import HttpResponseBadRequest
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.utils.http import parse_etags
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import (
+    GraphQLView as BaseGraphQLView,
+    HttpError,
+    set_rollback,
+)
+from graphql import (
+    DocumentNode,
+    ExecutionResult,
+    GraphQLError,
+    OperationDefinitionNode,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+    validate_schema,
+)
+
+from core import persisted_queries
+from core.auth import authenticate_request
+from core.batching import check_batch
+from core.conditional import (
+    cache_policy,
+    get_setting as get_conditional,
+    make_etag,
+)
+from core.cost import get_setting as get_limit, limit_rules
+from core.db.pool import pool_stats
+from core.executor import merge_results, run_in_pool, split_root_fields
+from core.metrics import REGISTRY, OperationTrace, activate, start_trace
+from core.persisted_queries import get_setting, load_allow_list, query_hash
+
+
+class PreparedOperation(NamedTuple):
+    """A parsed and validated operation ready to execute"""
+    document: DocumentNode
+    operation_ast: Optional[OperationDefinitionNode]
+    execute_options: dict
+    extensions: Optional[dict] = None
+    trace: Optional[OperationTrace] = None
+
+
+class GraphQLView(BaseGraphQLView):
+    """GraphQL view with automatic persisted queries.
+
+    Clients may send ``extensions.persistedQuery.sha256Hash`` instead of
+    (or together with) the query text. Parsed and validated documents
+    are kept in an LRU cache keyed by that hash, so repeated documents
+    skip parsing and validation. With ``ALLOW_LIST_ONLY`` enabled only
+    documents from the configured allow-list are executed.
+
+    Every request is checked against the depth, alias and cost limits
+    of ``GRAPHQL_QUERY_LIMITS`` with its own variables, and responses
+    report the operation's cost in ``extensions.cost``. Executions are
+    traced for the metrics endpoint, with the trace added as
+    ``extensions.tracing`` when ``GRAPHQL_METRICS['TRACING']`` is on.
+
+    A JSON array of operations is executed as a batch, in order and
+    with one context, so the user is resolved once and DataLoaders are
+    shared. The response is an array of results, each with its ``id``
+    and ``status``; one operation failing does not fail the others.
+
+    Query operations sent with GET get a strong ETag, made from the
+    operation, its variables, the viewer and the version stamps of the
+    tables it reads, and a Cache-Control header from the hints in
+    ``GRAPHQL_CONDITIONAL_GET``. A matching ``If-None-Match`` is
+    answered with 304 Not Modified without executing anything.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        self.response_headers = {}
+        return self.add_response_headers(
+            super().dispatch(request, *args, **kwargs))
+
+    def add_response_headers(self, response):
+        for name, value in self.response_headers.items():
+            response[name] = value
+        if 'ETag' in self.response_headers:
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def parse_body(self, request):
+        if (self.get_content_type(request) == 'application/json'
+                and request.body.lstrip()[:1] == b'['):
+            return self.parse_batch(request)
+        return super().parse_body(request)
+
+    def parse_batch(self, request):
+        try:
+            entries = json.loads(request.body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            raise HttpError(
+                HttpResponseBadRequest('POST body sent invalid JSON.'))
+        error = check_batch(entries)
+        if error:
+            raise HttpError(HttpResponseBadRequest(error))
+        return entries
+
+    def get_response(self, request, data, show_graphiql=False):
+        if isinstance(data, list):
+            return self.get_batch_response(request, data)
+        query, variables, operation_name, id = self.get_graphql_params(
+            request, data)
+        operation = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql)
+        if isinstance(operation, PreparedOperation):
+            if self.is_not_modified(request, data, query, operation):
+                return '', 304
+            result = self.execute_operation(request, operation)
+        else:
+            result = operation
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+        return self.format_response(request, result, id, show_graphiql)
+
+    def get_batch_response(self, request, entries):
+        """Execute each operation of a batch, isolating their failures"""
+        self.batch = True
+        authenticate_request(request)
+        responses = []
+        for entry in entries:
+            try:
+                result, _ = self.get_response(request, entry)
+            except HttpError as e:
+                result = self.format_entry_error(request, entry, e)
+            responses.append(result)
+        return self.join_batch(responses)
+
+    def format_entry_error(self, request, entry, error):
+        """Return the result of a batched operation the view refused"""
+        return self.json_encode(request, {
+            'errors': [self.format_error(error)],
+            'id': entry.get('id'),
+            'status': error.response.status_code,
+        })
+
+    def join_batch(self, responses):
+        # Each result carries its own status; the batch itself succeeded
+        return '[{}]'.format(','.join(responses)), 200
+
+    def is_not_modified(self, request, data, query, operation):
+        """Set the caching headers of a GET query operation.
+
+        Returns whether the client's copy, named by If-None-Match, is
+        still current.
+        """
+        operation_ast = operation.operation_ast
+        if (request.method.lower() != 'get'
+                or not get_conditional('ENABLED')
+                or operation_ast is None
+                or operation_ast.operation != OperationType.QUERY):
+            return False
+        policy = cache_policy(self.schema.graphql_schema, operation.document)
+        self.response_headers['Cache-Control'] = policy.header
+        if policy.scope == 'no-store' or (
+                operation.trace is not None and operation.trace.tracing):
+            return False
+
+        authenticate_request(request)
+        user = getattr(request, 'user', None)
+        viewer = user.pk if user and user.is_authenticated else None
+        persisted = self.get_extensions(request, data).get('persistedQuery')
+        etag = make_etag(
+            (persisted or {}).get('sha256Hash') or query_hash(query),
+            operation.execute_options['variable_values'],
+            operation.execute_options['operation_name'], viewer, policy)
+        self.response_headers['ETag'] = etag
+
+        if_none_match = request.headers.get('If-None-Match')
+        if not if_none_match:
+            return False
+        etags = parse_etags(if_none_match)
+        return etag in etags or '*' in etags
+
+    def format_response(self, request, result, id=None, pretty=False):
+        """Return the JSON body and status code for an ExecutionResult"""
+        if not result:
+            return None, 200
+
+        response = {}
+        status_code = 200
+        if result.errors:
+            set_rollback()
+            if getattr(self, 'response_headers', None):
+                # Errors may be transient; never let them be cached
+                self.response_headers = {'Cache-Control': 'no-store'}
+            response['errors'] = [self.format_error(e) for e in result.errors]
+        if result.errors and any(
+                not getattr(e, 'path', None) for e in result.errors):
+            status_code = 400
+        else:
+            response['data'] = result.data
+        if result.extensions:
+            response['extensions'] = result.extensions
+
+        if self.batch:
+            response['id'] = id
+            response['status'] = status_code
+        return self.json_encode(request, response, pretty=pretty), status_code
+
+    def get_extensions(self, request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(
+                    HttpResponseBadRequest('Extensions are invalid JSON.'))
+        return extensions if isinstance(extensions, dict) else {}
+
+    def get_document(self, request, data, query):
+        """Return (document, errors) for the query or persisted hash"""
+        persisted = self.get_extensions(request, data).get('persistedQuery')
+        allow_list = load_allow_list(get_setting('ALLOW_LIST'))
+
+        if persisted:
+            if persisted.get('version') != 1:
+                raise GraphQLError(
+                    'Unsupported persisted query version.',
+                    extensions={'code': 'PERSISTED_QUERY_NOT_SUPPORTED'})
+            sha = persisted.get('sha256Hash')
+            if query and query_hash(query) != sha:
+                raise GraphQLError(
+                    'Provided sha256Hash does not match query.',
+                    extensions={'code': 'PERSISTED_QUERY_HASH_MISMATCH'})
+        elif query:
+            sha = query_hash(query)
+        else:
+            return None, None
+
+        if get_setting('ALLOW_LIST_ONLY') and sha not in allow_list:
+            raise GraphQLError(
+                'Query is not in the persisted query allow-list.',
+                extensions={'code': 'PERSISTED_QUERY_NOT_ALLOWED'})
+
+        document = persisted_queries.documents.get(sha)
+        if document is not None:
+            return document, None
+
+        query = query or allow_list.get(sha)
+        if not query:
+            raise GraphQLError(
+                'PersistedQueryNotFound',
+                extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'})
+
+        document = parse(query)
+        errors = validate(
+            self.schema.graphql_schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        if errors:
+            return None, errors
+
+        persisted_queries.documents.set(sha, document)
+        return document, None
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name,
+        show_graphiql=False
+    ):
+        operation = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql)
+        if not isinstance(operation, PreparedOperation):
+            return operation
+        return self.execute_operation(request, operation)
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name,
+        show_graphiql=False
+    ):
+        """Parse and validate a request into a PreparedOperation.
+
+        Returns an ExecutionResult, or None for GraphiQL, when there is
+        nothing to execute.
+        """
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        try:
+            document, errors = self.get_document(request, data, query)
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+        if document is None:
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseBadRequest('Must provide query string.'))
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        costs = {}
+        errors = validate(schema, document, limit_rules(variables, costs))
+        extensions = None
+        if operation_ast is not None:
+            name = operation_ast.name and operation_ast.name.value
+            extensions = {'cost': {'requested': costs.get(name),
+                                   'maximum': get_limit('MAX_COST')}}
+        if errors:
+            return ExecutionResult(errors=errors, extensions=extensions)
+
+        if (
+            request.method.lower() == 'get'
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ['POST'],
+                    'Can only perform a {} operation from a POST request.'
+                    .format(operation_ast.operation.value),
+                )
+            )
+
+        execute_options = {
+            'root_value': self.get_root_value(request),
+            'context_value': self.get_context(request),
+            'variable_values': variables,
+            'operation_name': operation_name,
+            'middleware': self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options[
+                'execution_context_class'
+            ] = self.execution_context_class
+        return PreparedOperation(document, operation_ast, execute_options,
+                                 extensions, start_trace(operation_ast))
+
+    def execute_operation(self, request, operation):
+        """Execute a prepared operation, mutations atomically"""
+        result = self.execute_document(request, operation)
+        if (operation.operation_ast is not None
+                and operation.operation_ast.operation
+                == OperationType.MUTATION):
+            # Later operations of a batch must not read users the
+            # mutation may have changed from the loader cache
+            operation.execute_options['context_value'].loaders = None
+        return self.finish_operation(operation, result)
+
+    def finish_operation(self, operation, result):
+        """Add the operation's extensions to its result and record it"""
+        result.extensions = operation.extensions
+        if operation.trace is not None:
+            tracing = operation.trace.finish(result)
+            if tracing is not None:
+                result.extensions = {**(result.extensions or {}),
+                                     'tracing': tracing}
+        return result
+
+    def execute_document(self, request, operation):
+        with activate(operation.trace):
+            return self.execute_prepared(request, operation)
+
+    def execute_prepared(self, request, operation):
+        schema = self.schema.graphql_schema
+        document, operation_ast, execute_options, _, _ = operation
+        try:
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get(
+                        'ATOMIC_MUTATIONS', False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+class AsyncGraphQLView(GraphQLView):
+    """GraphQL view for ASGI servers.
+
+    Requests are parsed and validated on the event loop; execution runs
+    on the bounded resolver pool, with each root field of a query
+    executed as its own operation so independent fields such as
+    ``mentors`` and ``mentorRequests`` resolve concurrently. Each root
+    field gets a shallow copy of the request as its context, so
+    per-request state like DataLoaders is not shared between threads.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        async def view(request, *args, **kwargs):
+            self = cls(**initkwargs)
+            self.setup(request, *args, **kwargs)
+            return await self.dispatch(request, *args, **kwargs)
+        view.view_class = cls
+        view.view_initkwargs = initkwargs
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.response_headers = {}
+        try:
+            if request.method.lower() not in ('get', 'post'):
+                raise HttpError(HttpResponseNotAllowed(
+                    ['GET', 'POST'],
+                    'GraphQL only supports GET and POST requests.'))
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                return await sync_to_async(super().dispatch)(
+                    request, *args, **kwargs)
+
+            result, status_code = await self.get_async_response(
+                request, data)
+            return self.add_response_headers(HttpResponse(
+                status=status_code, content=result,
+                content_type='application/json'))
+        except HttpError as e:
+            response = e.response
+            response['Content-Type'] = 'application/json'
+            response.content = self.json_encode(
+                request, {'errors': [self.format_error(e)]})
+            return response
+
+    async def get_async_response(self, request, data):
+        if isinstance(data, list):
+            return await self.get_async_batch_response(request, data)
+        query, variables, operation_name, id = self.get_graphql_params(
+            request, data)
+        operation = self.prepare_operation(
+            request, data, query, variables, operation_name)
+        if isinstance(operation, PreparedOperation):
+            if await run_in_pool(self.is_not_modified, request, data, query,
+                                 operation):
+                return '', 304
+            result = await self.execute_async(request, operation, variables)
+        else:
+            result = operation
+        return self.format_response(request, result, id)
+
+    async def get_async_batch_response(self, request, entries):
+        self.batch = True
+        await run_in_pool(authenticate_request, request)
+        responses = []
+        for entry in entries:
+            try:
+                result, _ = await self.get_async_response(request, entry)
+            except HttpError as e:
+                result = self.format_entry_error(request, entry, e)
+            responses.append(result)
+        return self.join_batch(responses)
+
+    async def execute_async(self, request, operation, variables):
+        documents = split_root_fields(
+            self.schema.graphql_schema, operation.document,
+            operation.operation_ast, variables)
+        if documents is None:
+            return await run_in_pool(
+                self.execute_operation, request, operation)
+
+        parts = []
+        for document in documents:
+            context = copy.copy(request)
+            # Loaders an earlier operation of a batch left on the request
+            # must not be shared between threads
+            context.loaders = None
+            options = {**operation.execute_options,
+                       'context_value': context}
+            parts.append(PreparedOperation(
+                document, document.definitions[0], options,
+                trace=operation.trace))
+        result = merge_results(await asyncio.gather(*(
+            run_in_pool(self.execute_document, request, part)
+            for part in parts)))
+        return self.finish_operation(operation, result)
+
+
+def health(request):
+    """Report whether each database answers and how busy its pool is.
+
+    Responds 503 when a database fails. A pool is reported saturated
+    while every connection is in use and requests wait for one.
+    """
+    databases = {}
+    for alias in connections:
+        start = time.perf_counter()
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute('SELECT 1')
+            status = 'ok'
+        except DatabaseError:
+            status = 'error'
+        pool = pool_stats(alias)
+        if status == 'ok' and pool and pool['waiting']:
+            status = 'saturated'
+        databases[alias] = {
+            'status': status,
+            'vendor': connections[alias].vendor,
+            'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+            'pool': pool,
+        }
+    healthy = all(db['status'] != 'error' for db in databases.values())
+    return JsonResponse(
+        {'status': 'ok' if healthy else 'error', 'databases': databases},
+        status=200 if healthy else 503)
+
+
+def metrics(request):
+    """Expose GraphQL metrics in the Prometheus text format"""
+    return HttpResponse(REGISTRY.render(),
+                        content_type='text/plain; version=0.0.4')
@@ -1,9 +1,83 @@
 """Mentorship Request Schema"""
 
+import logging
+from collections import Counter
+
 import graphene
-from core.models import Request, User
+from core.conditional import bump_version
+from core.loaders import get_loaders
+from core.log import get_event_logger, log_event
+from core.models import MentorStats, Request, User
+from core.pagination import CountableConnection, KeysetConnectionField
+from core.projection import collect_fields, descend, get_projection
+from core.pubsub import get_channel_layer
 from graphene_django.types import DjangoObjectType
+from graphql import GraphQLError
+from graphql_jwt.decorators import login_required
+from graphql_jwt.exceptions import PermissionDenied
 from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from user.schema import UserType
+
+logger = get_event_logger('request')
+
+
+RequestStatus = graphene.Enum.from_enum(Request.Status, name='RequestStatus')
+
+
+def prime_participants(info, requests):
+    """Queue the mentor and mentee of each request for one batched load"""
+    loader = get_loaders(info).user
+    selected = collect_fields(info, descend(info, info.field_nodes,
+                                            'edges', 'node'))
+    for name in ('mentor', 'mentee'):
+        if name not in selected:
+            continue
+        projection = get_projection(info, UserType, selected[name])
+        loader.select(projection and projection[0])
+        loader.prime(getattr(request, f'{name}_id') for request in requests)
+
+
+def filter_status(requests, status):
+    """Narrow requests to one status when a status filter is given"""
+    if status is None:
+        return requests
+    return requests.filter(status=status)
+
+
+def request_group(recipient, user_id):
+    """Name the group of request events for one mentor or mentee"""
+    return f'requests.{recipient}.{user_id}'
+
+
+def publish_requests(requests, recipient):
+    """Publish requests to the group of their 'mentor' or 'mentee'.
+
+    Events are published once the transaction commits and carry the
+    row, so subscribers are sent the request without reading it back.
+    """
+    messages = [(
+        request_group(recipient, getattr(request, f'{recipient}_id')),
+        {'id': request.id,
+         'mentor_id': request.mentor_id,
+         'mentee_id': request.mentee_id,
+         'question': request.question,
+         'status': request.status},
+    ) for request in requests]
+    if not messages:
+        return
+
+    def publish():
+        layer = get_channel_layer()
+        for group, message in messages:
+            try:
+                layer.publish(group, message)
+            except Exception:
+                # The write is committed; a lost event must not fail it.
+                log_event(logger, 'request.publish_failed',
+                          level=logging.ERROR, request_id=message['id'])
+
+    transaction.on_commit(publish)
 
 
 class RequestType(DjangoObjectType):
@@ -11,16 +85,51 @@ class RequestType(DjangoObjectType):
 
     mentor_id = graphene.Int()
     mentee_id = graphene.Int()
+    mentor = graphene.Field(UserType)
+    mentee = graphene.Field(UserType)
+    status = graphene.String()
 
     class Meta:
         model = Request
-        fields = ('id', 'mentor_id', 'mentee_id', 'question', 'status')
+        fields = ('id', 'mentor_id', 'mentee_id', 'mentor', 'mentee',
+                  'question', 'status')
+
+    field_projections = {
+        'mentor': ('mentor',),
+        'mentee': ('mentee',),
+    }
 
     def resolve_mentor_id(self, info):
-        return self.mentor.id
+        return self.mentor_id
 
     def resolve_mentee_id(self, info):
-        return self.mentee.id
+        return self.mentee_id
+
+    def resolve_mentor(self, info):
+        return get_loaders(info).user.load(self.mentor_id)
+
+    def resolve_mentee(self, info):
+        return get_loaders(info).user.load(self.mentee_id)
+
+    def resolve_status(self, info):
+        return self.get_status_display()
+
+
+class MentorStatsType(DjangoObjectType):
+    """A mentor's request totals by status"""
+    total = graphene.Int()
+
+    class Meta:
+        model = MentorStats
+        fields = ('pending', 'accepted', 'rejected')
+
+    def resolve_total(self, info):
+        return self.pending + self.accepted + self.rejected
+
+
+class RequestConnection(CountableConnection):
+    class Meta:
+        node = RequestType
 
 
 class CreateRequest(graphene.Mutation):
@@ -34,15 +143,42 @@ class CreateRequest(graphene.Mutation):
     def mutate(self, info, mentorId, question):
         User = get_user_model()
         mentor = User.objects.get(id=mentorId)
-        mentee = info.context.user
-        request = Request.objects.create(
-            mentor=mentor,
-            mentee=mentee,
-            question=question
-        )
+        with transaction.atomic():
+            request = Request.objects.create(
+                mentor=mentor,
+                mentee_id=info.context.user.id,
+                question=question
+            )
+        log_event(logger, 'request.created', request_id=request.id,
+                  mentor_id=request.mentor_id, mentee_id=request.mentee_id)
+        publish_requests([request], 'mentor')
         return CreateRequest(request=request)
 
 
+def transition_error(current, status):
+    return f'Cannot move a request from {current.label} to {status.label}.'
+
+
+def transition_request(info, request_id, status):
+    """Move one of the caller's requests to status.
+
+    The request is locked before it is read and moved, so of two
+    concurrent transitions on the same request only one applies.
+    """
+    requests = Request.objects.filter(
+        id=request_id, mentor_id=info.context.user.id)
+    if not requests.transition(status):
+        current = requests.values_list('status', flat=True).first()
+        if current is None:
+            raise GraphQLError('Request not found.')
+        raise GraphQLError(transition_error(Request.Status(current), status))
+    log_event(logger, 'request.status_changed', request_id=request_id,
+              status=status.label)
+    request = requests.get()
+    publish_requests([request], 'mentee')
+    return request
+
+
 class AcceptRequest(graphene.Mutation):
     """Accept mentee request"""
     request = graphene.Field(RequestType)
@@ -50,12 +186,10 @@ class AcceptRequest(graphene.Mutation):
     class Arguments:
         requestId = graphene.Int(required=True)
 
+    @login_required
     def mutate(self, info, requestId):
-        existing_request = Request.objects.get(id=requestId)
-        existing_request.status = 'Accepted'
-        existing_request.save()
-
-        return AcceptRequest(request=existing_request)
+        return AcceptRequest(request=transition_request(
+            info, requestId, Request.Status.ACCEPTED))
 
 
 class RejectRequest(graphene.Mutation):
@@ -65,32 +199,193 @@ class RejectRequest(graphene.Mutation):
     class Arguments:
         requestId = graphene.Int(required=True)
 
+    @login_required
     def mutate(self, info, requestId):
-        existing_request = Request.objects.get(id=requestId)
-        existing_request.status = 'Rejected'
-        existing_request.save()
+        return RejectRequest(request=transition_request(
+            info, requestId, Request.Status.REJECTED))
+
+
+class RequestResult(graphene.ObjectType):
+    """Outcome of one item of a bulk request mutation"""
+    request_id = graphene.Int()
+    request = graphene.Field(RequestType)
+    error = graphene.String()
+
 
-        return RejectRequest(request=existing_request)
+class CreateRequestInput(graphene.InputObjectType):
+    mentorId = graphene.Int(required=True)
+    question = graphene.String(required=True)
+
+
+def insert_requests(requests, mentee_id):
+    """Insert requests with bulk INSERTs and fill in their ids.
+
+    Backends without RETURNING (SQLite here) leave the ids unset. The
+    INSERT takes the write lock before anything is read, so no other
+    connection inserts rows until the transaction ends, and the mentee's
+    newest rows, read back with one SELECT, are the requests in insert
+    order. Call inside a transaction.
+    """
+    Request.objects.bulk_create(requests)
+    if not requests or connection.features.can_return_rows_from_bulk_insert:
+        return
+    ids = Request.objects.filter(mentee_id=mentee_id).order_by(
+        '-id').values_list('id', flat=True)[:len(requests)]
+    for request, id in zip(requests, reversed(ids)):
+        request.id = id
+
+
+class CreateRequests(graphene.Mutation):
+    """Create several requests at once"""
+    results = graphene.List(RequestResult)
+
+    class Arguments:
+        requests = graphene.List(graphene.NonNull(CreateRequestInput),
+                                 required=True)
+
+    @login_required
+    def mutate(self, info, requests):
+        mentor_ids = {item.mentorId for item in requests}
+        existing = set(User.objects.filter(id__in=mentor_ids)
+                       .values_list('id', flat=True))
+
+        results = []
+        created = []
+        for item in requests:
+            if item.mentorId not in existing:
+                results.append(RequestResult(error='Mentor not found.'))
+                continue
+            request = Request(mentor_id=item.mentorId,
+                              mentee_id=info.context.user.id,
+                              question=item.question)
+            created.append(request)
+            results.append(RequestResult(request=request))
+
+        with transaction.atomic():
+            insert_requests(created, info.context.user.id)
+            bump_version(Request)
+            MentorStats.objects.record(Counter(
+                (request.mentor_id, request.status) for request in created))
+
+        for result in results:
+            if result.request is not None:
+                result.request_id = result.request.id
+        log_event(logger, 'request.bulk_created',
+                  request_ids=[request.id for request in created])
+        publish_requests(created, 'mentor')
+        return CreateRequests(results=results)
+
+
+def change_statuses(info, request_ids, status):
+    """Move the caller's requests among request_ids to status.
+
+    The caller's requests are locked with one UPDATE, read with one
+    SELECT and those the state machine allows moved with one conditional
+    UPDATE, along with the mentor's counters; ids that do not exist,
+    belong to another mentor or cannot move to status get an error
+    result.
+    """
+    request_ids = list(dict.fromkeys(request_ids))
+    with transaction.atomic():
+        requests = Request.objects.filter(
+            id__in=request_ids, mentor_id=info.context.user.id)
+        requests.lock()
+        requests = requests.in_bulk()
+        allowed = [request.id for request in requests.values()
+                   if request.can_transition(status)]
+        Request.objects.move([requests[id] for id in allowed], status)
+
+    results = []
+    changed = []
+    for request_id in request_ids:
+        request = requests.get(request_id)
+        if request is None:
+            results.append(RequestResult(request_id=request_id,
+                                         error='Request not found.'))
+        elif request.id not in allowed:
+            results.append(RequestResult(
+                request_id=request_id,
+                error=transition_error(Request.Status(request.status),
+                                       status)))
+        else:
+            request.status = status
+            changed.append(request)
+            results.append(RequestResult(request_id=request_id,
+                                         request=request))
+
+    log_event(logger, 'request.bulk_status_changed', request_ids=allowed,
+              status=status.label)
+    publish_requests(changed, 'mentee')
+    return results
+
+
+class AcceptRequests(graphene.Mutation):
+    """Accept several of the mentor's requests at once"""
+    results = graphene.List(RequestResult)
+
+    class Arguments:
+        requestIds = graphene.List(graphene.NonNull(graphene.Int),
+                                   required=True)
+
+    @login_required
+    def mutate(self, info, requestIds):
+        return AcceptRequests(results=change_statuses(
+            info, requestIds, Request.Status.ACCEPTED))
+
+
+class RejectRequests(graphene.Mutation):
+    """Reject several of the mentor's requests at once"""
+    results = graphene.List(RequestResult)
+
+    class Arguments:
+        requestIds = graphene.List(graphene.NonNull(graphene.Int),
+                                   required=True)
+
+    @login_required
+    def mutate(self, info, requestIds):
+        return RejectRequests(results=change_statuses(
+            info, requestIds, Request.Status.REJECTED))
 
 
 class RequestQueries(graphene.ObjectType):
     """Request Queries"""
-    all_requests = graphene.List(RequestType)
-    user_requests = graphene.List(RequestType,
-                                  menteeId=graphene.Int(required=True))
-    mentor_requests = graphene.List(RequestType)
+    all_requests = KeysetConnectionField(RequestConnection,
+                                         on_page=prime_participants,
+                                         status=RequestStatus())
+    user_requests = KeysetConnectionField(RequestConnection,
+                                          on_page=prime_participants,
+                                          menteeId=graphene.Int(required=True),
+                                          status=RequestStatus())
+    mentor_requests = KeysetConnectionField(RequestConnection,
+                                            on_page=prime_participants,
+                                            status=RequestStatus())
+
+    mentor_stats = graphene.Field(MentorStatsType,
+                                  mentorId=graphene.Int())
 
-    def resolve_all_requests(self, info):
-        return Request.objects.all()
+    def resolve_all_requests(self, info, status=None, **kwargs):
+        return filter_status(Request.objects.all(), status)
 
-    def resolve_user_requests(self, info, menteeId):
+    def resolve_user_requests(self, info, menteeId, status=None, **kwargs):
         """Users can view all their mentorship sessions"""
         mentee = User.objects.get(id=menteeId)
-        return Request.objects.filter(mentee=mentee)
+        return filter_status(Request.objects.filter(mentee=mentee), status)
 
-    def resolve_mentor_requests(self, info):
+    def resolve_mentor_requests(self, info, status=None, **kwargs):
         """Mentor can view mentorship requests"""
-        return Request.objects.filter(mentor=info.context.user)
+        return filter_status(
+            Request.objects.filter(mentor_id=info.context.user.id), status)
+
+    @login_required
+    def resolve_mentor_stats(self, info, mentorId=None):
+        """Mentors read their own totals, staff those of any mentor"""
+        user = info.context.user
+        if mentorId is None:
+            mentorId = user.id
+        elif mentorId != user.id and not user.is_staff:
+            raise PermissionDenied
+        return (MentorStats.objects.filter(mentor_id=mentorId).first()
+                or MentorStats(mentor_id=mentorId))
 
 
 class RequestMutations(graphene.ObjectType):
@@ -98,6 +393,44 @@ class RequestMutations(graphene.ObjectType):
     create_request = CreateRequest.Field()
     accept_request = AcceptRequest.Field()
     reject_request = RejectRequest.Field()
+    create_requests = CreateRequests.Field()
+    accept_requests = AcceptRequests.Field()
+    reject_requests = RejectRequests.Field()
+
+
+def check_recipient(info, user_id):
+    """Only let users subscribe to their own events"""
+    user = info.context.user
+    if not user.is_authenticated or user.id != user_id:
+        raise PermissionDenied
+
+
+async def subscribe_requests(group):
+    messages = get_channel_layer().subscribe(group)
+    try:
+        async for message in messages:
+            yield Request(**message)
+    finally:
+        await messages.aclose()
+
+
+class RequestSubscriptions(graphene.ObjectType):
+    """Request Subscriptions"""
+    request_created = graphene.Field(RequestType,
+                                     mentorId=graphene.Int(required=True))
+    request_status_changed = graphene.Field(
+        RequestType, menteeId=graphene.Int(required=True))
+
+    def subscribe_request_created(root, info, mentorId):
+        """Mentors receive the requests sent to them"""
+        check_recipient(info, mentorId)
+        return subscribe_requests(request_group('mentor', mentorId))
+
+    def subscribe_request_status_changed(root, info, menteeId):
+        """Mentees receive their requests as mentors answer them"""
+        check_recipient(info, menteeId)
+        return subscribe_requests(request_group('mentee', menteeId))
 
 
-schema = graphene.Schema(query=RequestQueries, mutation=RequestMutations)
+schema = graphene.Schema(query=RequestQueries, mutation=RequestMutations,
+                         subscription=RequestSubscriptions)
@@ -2,11 +2,14 @@
 Tests for Request API
 """
 
-from django.test import TestCase
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
 from graphene.test import Client
 from request.schema import schema
 from core.models import Request
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 
 
 class RequestTestCase(TestCase):
@@ -29,12 +32,12 @@ class RequestTestCase(TestCase):
             mentor=self.mentor,
             mentee=self.mentee,
             question='Test question 1',
-            status='Pending')
+            status=Request.Status.PENDING)
         self.request2 = Request.objects.create(
             mentor=self.mentor,
             mentee=self.mentee2,
             question='Test question 2',
-            status='Accepted')
+            status=Request.Status.ACCEPTED)
 
     # def test_create_request_mutation(self):
     #     """Test create a mentorship request"""
@@ -91,7 +94,8 @@ class RequestTestCase(TestCase):
            }
         """
 
-        executed = self.client.execute(acceptMutation)
+        executed = self.client.execute(
+            acceptMutation, context_value=self.context_for(self.mentor))
 
         expected_data = {
             'acceptRequest': {
@@ -116,7 +120,7 @@ class RequestTestCase(TestCase):
 
         acceptMutation = """
            mutation {
-               rejectRequest(requestId: 2) {
+               rejectRequest(requestId: 1) {
                    request {
                     id
                     mentorId
@@ -128,15 +132,16 @@ class RequestTestCase(TestCase):
            }
         """
 
-        executed = self.client.execute(acceptMutation)
+        executed = self.client.execute(
+            acceptMutation, context_value=self.context_for(self.mentor))
 
         expected_data = {
             'rejectRequest': {
                 'request': {
-                    'id': '2',
+                    'id': '1',
                     'mentorId': 1,
-                    'menteeId': 3,
-                    'question': 'Test question 2',
+                    'menteeId': 2,
+                    'question': 'Test question 1',
                     'status': 'Rejected'
                 }
             }
@@ -148,6 +153,55 @@ class RequestTestCase(TestCase):
         # Check the response
         self.assertDictEqual(executed['data'], expected_data)
 
+    def test_transition_locks_before_reading(self):
+        """Test a status change writes first, guarded by status and owner"""
+        mutation = '''
+            mutation { acceptRequest(requestId: %d) { request { status } } }
+        ''' % self.request1.id
+
+        with CaptureQueriesContext(connection) as queries:
+            executed = self.client.execute(
+                mutation, context_value=self.context_for(self.mentor))
+
+        assert 'errors' not in executed
+        statements = [query['sql'] for query in queries.captured_queries
+                      if query['sql'].startswith(('SELECT', 'UPDATE'))
+                      and '"core_request"' in query['sql']]
+        self.assertEqual([sql.split()[0] for sql in statements[:3]],
+                         ['UPDATE', 'SELECT', 'UPDATE'])
+        lock, _, move = statements[:3]
+        self.assertIn('"mentor_id" = %d' % self.mentor.id, lock)
+        self.assertIn('"status" IN (%d)' % Request.Status.PENDING, lock)
+        self.assertIn('"status" = %d' % Request.Status.PENDING, move)
+
+    def test_finished_requests_cannot_change(self):
+        """Test an accepted request cannot be rejected"""
+        mutation = '''
+            mutation { rejectRequest(requestId: %d) { request { status } } }
+        ''' % self.request2.id
+
+        executed = self.client.execute(
+            mutation, context_value=self.context_for(self.mentor))
+
+        self.assertEqual(executed['errors'][0]['message'],
+                         'Cannot move a request from Accepted to Rejected.')
+        self.request2.refresh_from_db()
+        self.assertEqual(self.request2.status, Request.Status.ACCEPTED)
+
+    def test_only_the_mentor_can_change_a_request(self):
+        """Test a mentee cannot accept their own request"""
+        mutation = '''
+            mutation { acceptRequest(requestId: %d) { request { status } } }
+        ''' % self.request1.id
+
+        executed = self.client.execute(
+            mutation, context_value=self.context_for(self.mentee))
+
+        self.assertEqual(executed['errors'][0]['message'],
+                         'Request not found.')
+        self.request1.refresh_from_db()
+        self.assertEqual(self.request1.status, Request.Status.PENDING)
+
     def test_resolve_user_requests(self):
         """Test resolving user requests"""
         mentee_id = self.mentee.id
@@ -155,11 +209,15 @@ class RequestTestCase(TestCase):
         query = '''
             query UserRequests($menteeId: Int!) {
                 userRequests(menteeId: $menteeId) {
-                    id
-                    mentorId
-                    menteeId
-                    question
-                    status
+                    edges {
+                        node {
+                            id
+                            mentorId
+                            menteeId
+                            question
+                            status
+                        }
+                    }
                 }
             }
          '''
@@ -169,13 +227,17 @@ class RequestTestCase(TestCase):
         }
 
         expected_data = {
-            'userRequests': [{
-                'id': str(self.request1.id),
-                'mentorId': self.mentor.id,
-                'menteeId': self.mentee.id,
-                'question': 'Test question 1',
-                'status': 'Pending'
-            }]
+            'userRequests': {
+                'edges': [{
+                    'node': {
+                        'id': str(self.request1.id),
+                        'mentorId': self.mentor.id,
+                        'menteeId': self.mentee.id,
+                        'question': 'Test question 1',
+                        'status': 'Pending'
+                    }
+                }]
+            }
         }
 
         # Execute the query
@@ -186,3 +248,293 @@ class RequestTestCase(TestCase):
 
         # Check the response
         self.assertDictEqual(executed['data'], expected_data)
+
+    def test_nested_participants_are_batched(self):
+        """Test mentors and mentees of a request list load in one query"""
+        query = '''
+            query {
+                allRequests {
+                    edges {
+                        node {
+                            mentor { email }
+                            mentee { email }
+                        }
+                    }
+                }
+            }
+        '''
+        context = RequestFactory().post('/graphql')
+
+        with self.assertNumQueries(2):
+            executed = self.client.execute(query, context_value=context)
+
+        assert 'errors' not in executed
+        self.assertEqual(
+            [(e['node']['mentor']['email'], e['node']['mentee']['email'])
+             for e in executed['data']['allRequests']['edges']],
+            [('mentor@example.com', 'mentee@example.com'),
+             ('mentor@example.com', 'mentee2@example.com')])
+
+    def test_participant_ids_do_not_query_users(self):
+        """Test mentorId and menteeId are read from the request row"""
+        query = '''
+            query {
+                allRequests { edges { node { mentorId menteeId } } }
+            }
+        '''
+
+        with self.assertNumQueries(1):
+            executed = self.client.execute(query)
+
+        assert 'errors' not in executed
+
+    def test_all_requests_keyset_pagination(self):
+        """Test paging forwards and backwards through requests by cursor"""
+        query = '''
+            query Page($first: Int, $after: String,
+                       $last: Int, $before: String) {
+                allRequests(first: $first, after: $after,
+                            last: $last, before: $before) {
+                    edges { node { id } }
+                    pageInfo {
+                        hasNextPage
+                        hasPreviousPage
+                        startCursor
+                        endCursor
+                    }
+                }
+            }
+        '''
+
+        first_page = self.client.execute(
+            query, variables={'first': 1})['data']['allRequests']
+        self.assertEqual(first_page['edges'],
+                         [{'node': {'id': str(self.request1.id)}}])
+        self.assertTrue(first_page['pageInfo']['hasNextPage'])
+
+        after = first_page['pageInfo']['endCursor']
+        second_page = self.client.execute(
+            query, variables={'first': 1, 'after': after}
+        )['data']['allRequests']
+        self.assertEqual(second_page['edges'],
+                         [{'node': {'id': str(self.request2.id)}}])
+        self.assertFalse(second_page['pageInfo']['hasNextPage'])
+
+        before = second_page['pageInfo']['startCursor']
+        previous_page = self.client.execute(
+            query, variables={'last': 5, 'before': before}
+        )['data']['allRequests']
+        self.assertEqual(previous_page['edges'],
+                         [{'node': {'id': str(self.request1.id)}}])
+        self.assertFalse(previous_page['pageInfo']['hasPreviousPage'])
+
+    def test_total_count_only_queried_when_selected(self):
+        """Test totalCount adds a COUNT query only when requested"""
+        with self.assertNumQueries(1):
+            self.client.execute('{ allRequests { edges { node { id } } } }')
+
+        with self.assertNumQueries(2):
+            executed = self.client.execute('{ allRequests { totalCount } }')
+
+        self.assertEqual(executed['data']['allRequests']['totalCount'], 2)
+
+    def test_page_size_is_capped(self):
+        """Test requesting more than the max page size is rejected"""
+        executed = self.client.execute(
+            '{ allRequests(first: 1000) { edges { node { id } } } }')
+
+        self.assertIn('exceeds the `first` limit',
+                      executed['errors'][0]['message'])
+
+    def test_invalid_cursor_is_rejected(self):
+        """Test a malformed cursor returns an error"""
+        executed = self.client.execute(
+            '{ allRequests(after: "bogus") { edges { node { id } } } }')
+
+        self.assertIn('Invalid cursor', executed['errors'][0]['message'])
+
+    def test_selection_is_projected_to_columns(self):
+        """Test only the selected columns are fetched, across fragments"""
+        query = '''
+            fragment Who on UserType { contact: email }
+            query {
+                allRequests {
+                    edges {
+                        node {
+                            ask: question
+                            mentor { ...Who }
+                            mentee { firstName }
+                        }
+                    }
+                }
+            }
+        '''
+        context = RequestFactory().post('/graphql')
+
+        with CaptureQueriesContext(connection) as queries:
+            executed = self.client.execute(query, context_value=context)
+
+        assert 'errors' not in executed
+        request_sql, user_sql = [q['sql'] for q in queries.captured_queries]
+        self.assertIn('SELECT "core_request"."id", '
+                      '"core_request"."mentor_id", '
+                      '"core_request"."mentee_id", '
+                      '"core_request"."question" FROM', request_sql)
+        self.assertIn('SELECT "core_user"."id", "core_user"."email", '
+                      '"core_user"."first_name" FROM', user_sql)
+
+    def test_filter_requests_by_status(self):
+        """Test request lists can be narrowed to one status"""
+        query = '''
+            query Pending($menteeId: Int!) {
+                allRequests(status: ACCEPTED) {
+                    edges { node { id status } }
+                }
+                userRequests(menteeId: $menteeId, status: ACCEPTED) {
+                    edges { node { id } }
+                }
+            }
+        '''
+
+        executed = self.client.execute(
+            query, variables={'menteeId': self.mentee.id})
+
+        assert 'errors' not in executed
+        self.assertEqual(executed['data']['allRequests']['edges'], [
+            {'node': {'id': str(self.request2.id), 'status': 'Accepted'}}])
+        self.assertEqual(executed['data']['userRequests']['edges'], [])
+
+    def context_for(self, user):
+        context = RequestFactory().post('/graphql')
+        context.user = user
+        return context
+
+    def test_accept_requests_in_bulk(self):
+        """Test accepting many requests locks, reads and moves them once"""
+        mutation = '''
+            mutation Accept($ids: [Int!]!) {
+                acceptRequests(requestIds: $ids) {
+                    results { requestId error request { status } }
+                }
+            }
+        '''
+        ids = [self.request1.id, self.request2.id, 999]
+
+        with CaptureQueriesContext(connection) as queries:
+            executed = self.client.execute(
+                mutation, variables={'ids': ids},
+                context_value=self.context_for(self.mentor))
+
+        assert 'errors' not in executed
+        statements = [query['sql'].split()[0]
+                      for query in queries.captured_queries
+                      if '"core_request"' in query['sql']]
+        self.assertEqual(
+            [sql for sql in statements if sql in ('SELECT', 'UPDATE')],
+            ['UPDATE', 'SELECT', 'UPDATE'])
+        self.assertEqual(executed['data']['acceptRequests']['results'], [
+            {'requestId': self.request1.id, 'error': None,
+             'request': {'status': 'Accepted'}},
+            {'requestId': self.request2.id,
+             'error': 'Cannot move a request from Accepted to Accepted.',
+             'request': None},
+            {'requestId': 999, 'error': 'Request not found.',
+             'request': None},
+        ])
+        self.assertEqual(
+            set(Request.objects.values_list('status', flat=True)),
+            {Request.Status.ACCEPTED})
+
+    def test_bulk_status_change_checks_ownership(self):
+        """Test a mentor cannot reject another mentor's requests"""
+        mutation = '''
+            mutation Reject($ids: [Int!]!) {
+                rejectRequests(requestIds: $ids) {
+                    results { requestId error }
+                }
+            }
+        '''
+
+        executed = self.client.execute(
+            mutation, variables={'ids': [self.request1.id]},
+            context_value=self.context_for(self.mentee))
+
+        self.assertEqual(executed['data']['rejectRequests']['results'], [
+            {'requestId': self.request1.id, 'error': 'Request not found.'}])
+        self.request1.refresh_from_db()
+        self.assertEqual(self.request1.status, Request.Status.PENDING)
+
+    def test_create_requests_in_bulk(self):
+        """Test creating many requests reports unknown mentors per item"""
+        mutation = '''
+            mutation Create($requests: [CreateRequestInput!]!) {
+                createRequests(requests: $requests) {
+                    results {
+                        error
+                        request { mentorId menteeId question status }
+                    }
+                }
+            }
+        '''
+        requests = [
+            {'mentorId': self.mentor.id, 'question': 'First'},
+            {'mentorId': 999, 'question': 'Lost'},
+            {'mentorId': self.mentor.id, 'question': 'Second'},
+        ]
+
+        executed = self.client.execute(
+            mutation, variables={'requests': requests},
+            context_value=self.context_for(self.mentee2))
+
+        assert 'errors' not in executed
+        results = executed['data']['createRequests']['results']
+        self.assertEqual([r['error'] for r in results],
+                         [None, 'Mentor not found.', None])
+        self.assertEqual(results[2]['request'], {
+            'mentorId': self.mentor.id,
+            'menteeId': self.mentee2.id,
+            'question': 'Second',
+            'status': 'Pending',
+        })
+        self.assertEqual(
+            Request.objects.filter(mentee=self.mentee2).count(), 3)
+
+    def test_create_requests_returns_ids(self):
+        """Test each result carries the id of the row inserted for it"""
+        mutation = '''
+            mutation Create($requests: [CreateRequestInput!]!) {
+                createRequests(requests: $requests) {
+                    results { requestId request { question } }
+                }
+            }
+        '''
+        requests = [{'mentorId': self.mentor.id, 'question': question}
+                    for question in ('Same', 'Other', 'Same')]
+
+        executed = self.client.execute(
+            mutation, variables={'requests': requests},
+            context_value=self.context_for(self.mentee2))
+
+        results = executed['data']['createRequests']['results']
+        for result in results:
+            self.assertEqual(
+                Request.objects.get(id=result['requestId']).question,
+                result['request']['question'])
+        ids = [result['requestId'] for result in results]
+        self.assertEqual(len(set(ids)), 3)
+        self.assertEqual(ids, sorted(ids))
+
+    def test_bulk_mutations_require_login(self):
+        """Test anonymous callers cannot use bulk mutations"""
+        context = RequestFactory().post('/graphql')
+        context.user = AnonymousUser()
+
+        mutation = '''
+            mutation {
+                acceptRequests(requestIds: [1]) { results { error } }
+            }
+        '''
+
+        executed = self.client.execute(mutation, context_value=context)
+
+        self.assertIn('permission', executed['errors'][0]['message'])
@@ -0,0 +1,192 @@
+"""
+Tests for request subscriptions over WebSockets
+"""
+
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TransactionTestCase
+from django.test import override_settings
+from graphene.test import Client
+from graphql_jwt.shortcuts import get_token
+
+from core.models import Request
+from core.pubsub import get_channel_layer
+from core.schema import schema
+from core.subscriptions import GraphQLWebSocket
+
+REQUEST_CREATED = '''
+    subscription ($mentorId: Int!) {
+        requestCreated(mentorId: $mentorId) {
+            question menteeId mentee { email }
+        }
+    }
+'''
+REQUEST_STATUS_CHANGED = '''
+    subscription ($menteeId: Int!) {
+        requestStatusChanged(menteeId: $menteeId) { id status }
+    }
+'''
+
+
+class WebSocketClient:
+    """Drive the WebSocket ASGI application in-process"""
+
+    def __init__(self, subprotocols=('graphql-transport-ws',)):
+        self.incoming = asyncio.Queue()
+        self.outgoing = asyncio.Queue()
+        scope = {'type': 'websocket', 'path': '/graphql', 'headers': [],
+                 'subprotocols': list(subprotocols)}
+        self.task = asyncio.ensure_future(GraphQLWebSocket.as_asgi(schema)(
+            scope, self.incoming.get, self.outgoing.put))
+
+    async def connect(self, token=None):
+        await self.incoming.put({'type': 'websocket.connect'})
+        accepted = await self.receive()
+        if token is not None:
+            await self.send_json({
+                'type': 'connection_init',
+                'payload': {'Authorization': f'BEARER {token}'}})
+        return accepted
+
+    async def send_json(self, message):
+        await self.incoming.put({'type': 'websocket.receive',
+                                 'text': json.dumps(message)})
+
+    async def receive(self):
+        return await asyncio.wait_for(self.outgoing.get(), 5)
+
+    async def receive_json(self):
+        return json.loads((await self.receive())['text'])
+
+    async def subscribe(self, operation_id, query, variables):
+        await self.send_json({
+            'id': operation_id, 'type': 'subscribe',
+            'payload': {'query': query, 'variables': variables}})
+
+    async def disconnect(self):
+        await self.incoming.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(self.task, 5)
+
+
+@override_settings(GRAPHQL_SUBSCRIPTIONS={
+    'BACKEND': 'core.pubsub.InMemoryChannelLayer'})
+class RequestSubscriptionTests(TransactionTestCase):
+    """Test request events reach their mentor or mentee only"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.other_mentor = User.objects.create_user(
+            email='other@example.com', password='other', is_mentor=True)
+        self.mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+
+    def execute(self, user, query):
+        request = RequestFactory().post('/graphql')
+        request.user = user
+        return Client(schema).execute(query, context_value=request)
+
+    async def connect(self, user):
+        client = WebSocketClient()
+        await client.connect(await sync_to_async(get_token)(user))
+        self.assertEqual(await client.receive_json(),
+                         {'type': 'connection_ack'})
+        return client
+
+    async def wait_for_subscribers(self, count):
+        layer = get_channel_layer()
+        for _ in range(500):
+            if sum(layer.group_sizes().values()) == count:
+                return
+            await asyncio.sleep(0.01)
+        self.fail('Subscriptions did not start.')
+
+    async def test_request_created(self):
+        """Test mentors are sent the requests mentees create for them"""
+        mentor = await self.connect(self.mentor)
+        other = await self.connect(self.other_mentor)
+        await mentor.subscribe('1', REQUEST_CREATED,
+                               {'mentorId': self.mentor.id})
+        await other.subscribe('1', REQUEST_CREATED,
+                              {'mentorId': self.other_mentor.id})
+        await self.wait_for_subscribers(2)
+
+        await sync_to_async(self.execute)(self.mentee, '''
+            mutation {
+                createRequest(mentorId: %d, question: "Live?") {
+                    request { id }
+                }
+            }
+        ''' % self.mentor.id)
+
+        self.assertEqual(await mentor.receive_json(), {
+            'id': '1', 'type': 'next', 'payload': {'data': {
+                'requestCreated': {
+                    'question': 'Live?',
+                    'menteeId': self.mentee.id,
+                    'mentee': {'email': 'mentee@example.com'},
+                }}}})
+        self.assertTrue(other.outgoing.empty())
+        await mentor.disconnect()
+        await other.disconnect()
+        self.assertEqual(get_channel_layer().group_sizes(), {})
+
+    async def test_request_status_changed(self):
+        """Test mentees are sent their requests as mentors answer them"""
+        request = await sync_to_async(Request.objects.create)(
+            mentor=self.mentor, mentee=self.mentee, question='Status?')
+        mentee = await self.connect(self.mentee)
+        await mentee.subscribe('s', REQUEST_STATUS_CHANGED,
+                               {'menteeId': self.mentee.id})
+        await self.wait_for_subscribers(1)
+
+        await sync_to_async(self.execute)(self.mentor, '''
+            mutation { acceptRequest(requestId: %d) { request { id } } }
+        ''' % request.id)
+
+        message = await mentee.receive_json()
+        self.assertEqual(message['payload']['data']['requestStatusChanged'],
+                         {'id': str(request.id), 'status': 'Accepted'})
+
+        await mentee.send_json({'id': 's', 'type': 'complete'})
+        await self.wait_for_subscribers(0)
+        await mentee.disconnect()
+
+    async def test_other_users_events_are_forbidden(self):
+        """Test users cannot subscribe to someone else's requests"""
+        mentee = await self.connect(self.mentee)
+        await mentee.subscribe('1', REQUEST_CREATED,
+                               {'mentorId': self.mentor.id})
+
+        message = await mentee.receive_json()
+        self.assertEqual(message['type'], 'next')
+        self.assertIsNone(message['payload']['data'])
+        self.assertEqual(message['payload']['errors'][0]['message'],
+                         'You do not have permission to perform this action')
+        self.assertEqual(await mentee.receive_json(),
+                         {'id': '1', 'type': 'complete'})
+        await mentee.disconnect()
+
+    async def test_protocol_errors(self):
+        """Test subscribing before connection_init closes the socket"""
+        client = WebSocketClient(subprotocols=())
+        self.assertEqual((await client.connect())['code'], 1002)
+
+        client = WebSocketClient()
+        await client.connect()
+        await client.subscribe('1', REQUEST_CREATED, {'mentorId': 1})
+        self.assertEqual(await client.receive(), {
+            'type': 'websocket.close', 'code': 4401,
+            'reason': 'Unauthorized'})
+        await asyncio.wait_for(client.task, 5)
+
+        client = WebSocketClient()
+        await client.connect()
+        await client.send_json({'type': 'connection_init',
+                                'payload': {'token': 'invalid'}})
+        self.assertEqual((await client.receive())['code'], 4403)
+        await asyncio.wait_for(client.task, 5)
@@ -0,0 +1,97 @@
+"""
+Tests for concurrent request status transitions
+"""
+
+import threading
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+from core.models import MentorStats, Request
+
+
+class ConcurrentTransitionTestCase(TransactionTestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.mentor = User.objects.create_user(
+            email='mentor@example.com', password='mentor')
+        self.mentee = User.objects.create_user(
+            email='mentee@example.com', password='mentee')
+
+    def race(self, request, statuses):
+        """Apply each status to request from its own thread at once"""
+        barrier = threading.Barrier(len(statuses))
+        applied = {}
+
+        def transition(status):
+            try:
+                barrier.wait()
+                applied[status] = Request.objects.filter(
+                    id=request.id, mentor_id=self.mentor.id).transition(status)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=transition, args=(status,))
+                   for status in statuses]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return applied
+
+    def test_concurrent_accept_and_reject(self):
+        """Test only one of a racing accept and reject takes effect"""
+        for _ in range(20):
+            request = Request.objects.create(
+                mentor=self.mentor, mentee=self.mentee, question='Race')
+
+            applied = self.race(request, [Request.Status.ACCEPTED,
+                                          Request.Status.REJECTED])
+
+            self.assertEqual(sorted(applied.values()), [0, 1])
+            [winner] = [status for status, rows in applied.items() if rows]
+            request.refresh_from_db()
+            self.assertEqual(request.status, winner)
+
+        # The losing transition must not have moved the counters
+        stats = MentorStats.objects.get(mentor=self.mentor)
+        self.assertEqual(stats.pending, 0)
+        self.assertEqual(stats.accepted + stats.rejected, 20)
+
+    def test_concurrent_transitions_wait_for_the_lock(self):
+        """Test transitions of different requests at once all apply"""
+        requests = [Request.objects.create(
+            mentor=self.mentor, mentee=self.mentee, question='Queue')
+            for _ in range(8)]
+        barrier = threading.Barrier(len(requests))
+        applied = []
+
+        def accept(request):
+            try:
+                barrier.wait()
+                applied.append(Request.objects.filter(
+                    id=request.id).transition(Request.Status.ACCEPTED))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=accept, args=(request,))
+                   for request in requests]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(applied, [1] * len(requests))
+        stats = MentorStats.objects.get(mentor=self.mentor)
+        self.assertEqual((stats.pending, stats.accepted), (0, 8))
+
+    def test_state_machine(self):
+        """Test only pending requests may be accepted or rejected"""
+        request = Request(status=Request.Status.PENDING)
+        self.assertTrue(request.can_transition(Request.Status.ACCEPTED))
+        self.assertTrue(request.can_transition(Request.Status.REJECTED))
+
+        for status in (Request.Status.ACCEPTED, Request.Status.REJECTED):
+            request.status = status
+            self.assertFalse(any(request.can_transition(target)
+                                 for target in Request.Status))
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        from user import signals  # noqa: F401
+        from user.tokens import start_pruner
+        start_pruner()
@@ -0,0 +1,22 @@
+"""
+Delete revoked and expired refresh tokens in bounded chunks
+"""
+
+from django.core.management.base import BaseCommand
+
+from user.tokens import get_setting, prune_tokens
+
+
+class Command(BaseCommand):
+    help = ('Delete revoked and expired refresh tokens, walking the table '
+            'by id range so no single DELETE grows with its size. Safe to '
+            'run from cron while the site is serving.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=get_setting('PRUNE_BATCH_SIZE'),
+                            help='Rows of the id range each DELETE covers.')
+
+    def handle(self, *args, **options):
+        deleted = prune_tokens(options['batch_size'])
+        self.stdout.write(f'Deleted {deleted} refresh tokens.')
@@ -2,15 +2,32 @@
 User Graphql schema
 """
 
+import logging
+
 import graphene
 from graphene_django.types import DjangoObjectType
+from graphql import GraphQLError
+from core.cache import get_cache, make_key
+from core.log import get_event_logger, log_event
 from core.models import User
+from core.pagination import CountableConnection, KeysetConnectionField
+from core.projection import project
+from core.recommend import get_setting as recommend_setting, recommend
+from core.search import FacetType, SearchConnectionField, search
+from graphql_jwt.decorators import login_required, staff_member_required
+from graphql_jwt.exceptions import PermissionDenied
 from graphql_jwt.shortcuts import get_token
 from graphql_jwt.refresh_token.shortcuts import create_refresh_token
 from graphql_auth.schema import UserQuery, MeQuery
 from graphql_jwt.exceptions import JSONWebTokenError
 from django.contrib.auth import authenticate
 from graphql_jwt import ObtainJSONWebToken
+from user.tokens import revoke_all
+
+logger = get_event_logger('auth')
+
+# Read cache namespace of the mentors listing and mentor lookups
+MENTORS_CACHE = 'mentors'
 
 
 class UserType(DjangoObjectType):
@@ -21,6 +38,44 @@ class UserType(DjangoObjectType):
                   'is_active', 'is_mentor', 'is_staff')
 
 
+class UserConnection(CountableConnection):
+    class Meta:
+        node = UserType
+
+
+class MentorSearchConnection(CountableConnection):
+    class Meta:
+        node = UserType
+
+    class Edge:
+        score = graphene.Float(description='Relevance, higher is better.')
+
+        def resolve_score(self, info):
+            return -self.node.search_rank
+
+    expertise_facets = graphene.List(FacetType)
+    occupation_facets = graphene.List(FacetType)
+
+    def resolve_expertise_facets(self, info):
+        return self.facet_counts['expertise']()
+
+    def resolve_occupation_facets(self, info):
+        return self.facet_counts['occupation']()
+
+
+class CacheStatsType(graphene.ObjectType):
+    """Read cache counters since the process started"""
+    hits = graphene.Int()
+    misses = graphene.Int()
+    evictions = graphene.Int()
+
+
+class MentorRecommendationType(graphene.ObjectType):
+    """A mentor suited to a question"""
+    mentor = graphene.Field(UserType)
+    score = graphene.Float(description='Similarity, higher is better.')
+
+
 class RegisterUser(graphene.Mutation):
     user = graphene.Field(UserType)
     token = graphene.String()
@@ -65,6 +120,7 @@ class LoginUser(graphene.Mutation):
         )
 
         if user is None:
+            log_event(logger, 'auth.login_failed', logging.WARNING)
             raise JSONWebTokenError("Invalid credentials")
 
         token = get_token(user)
@@ -84,10 +140,10 @@ class ChangeUserToMentor(graphene.Mutation):
 
     def mutate(root, info, **kwargs):
         try:
-            print("info", info.context.user)
             user = info.context.user
             user.is_mentor = True
-            user.save()
+            user.save(update_fields=['is_mentor'])
+            log_event(logger, 'user.promoted_to_mentor', user_id=user.pk)
             success = True
         except User.DoesNotExist:
             success = False
@@ -95,11 +151,37 @@ class ChangeUserToMentor(graphene.Mutation):
         return ChangeUserToMentor(success=success)
 
 
+class RevokeAllTokens(graphene.Mutation):
+    """Revoke every live refresh token of a user, e.g. on sign-out"""
+    revoked = graphene.Int(description='Number of tokens revoked.')
+
+    class Arguments:
+        userId = graphene.Int(required=True)
+
+    @login_required
+    def mutate(self, info, userId):
+        user = info.context.user
+        if user.id != userId and not user.is_staff:
+            raise PermissionDenied
+        revoked = revoke_all(userId)
+        log_event(logger, 'auth.tokens_revoked', user_id=userId,
+                  revoked=revoked)
+        return RevokeAllTokens(revoked=revoked)
+
+
 class Query(UserQuery, MeQuery, graphene.ObjectType):
     """User Query"""
-    users = graphene.List(UserType)
-    mentors = graphene.List(UserType)
+    users = KeysetConnectionField(UserConnection)
+    mentors = KeysetConnectionField(UserConnection,
+                                    cache_namespace=MENTORS_CACHE)
     mentor = graphene.Field(UserType, mentor_id=graphene.Int(required=True))
+    search_mentors = SearchConnectionField(
+        MentorSearchConnection, query=graphene.String(),
+        facets=('expertise', 'occupation'), cache_namespace=MENTORS_CACHE)
+    cache_stats = graphene.Field(CacheStatsType)
+    recommend_mentors = graphene.List(
+        MentorRecommendationType, question=graphene.String(required=True),
+        first=graphene.Int(default_value=5))
 
     def resolve_users(self, info, **kwargs):
         return User.objects.all()
@@ -108,12 +190,45 @@ class Query(UserQuery, MeQuery, graphene.ObjectType):
         return User.objects.filter(is_mentor=True)
 
     def resolve_mentor(self, info, mentor_id):
-        return User.objects.get(id=mentor_id, is_mentor=True)
+        mentors = project(User.objects, info, UserType).filter(
+            id=mentor_id, is_mentor=True)
+        cache = get_cache()
+        if cache:
+            mentor = cache.get_or_set(
+                MENTORS_CACHE, make_key(str(mentors.query)), mentors.first)
+        else:
+            mentor = mentors.first()
+        if mentor is None:
+            raise User.DoesNotExist('User matching query does not exist.')
+        return mentor
+
+    def resolve_search_mentors(self, info, query=None, **kwargs):
+        return search(User.objects.filter(is_mentor=True), query)
+
+    def resolve_recommend_mentors(self, info, question, first):
+        max_first = recommend_setting('MAX_FIRST')
+        if not 0 < first <= max_first:
+            raise GraphQLError(
+                f'Argument `first` must be between 1 and {max_first}.')
+        ranked = recommend(question, first)
+        # Mentors removed or demoted since the index last saw them are
+        # skipped, and only the columns the selection reads are loaded
+        mentors = project(
+            User.objects.filter(is_mentor=True, is_active=True), info,
+            UserType, 'mentor').in_bulk([id for id, _ in ranked])
+        return [MentorRecommendationType(mentor=mentors[id], score=score)
+                for id, score in ranked if id in mentors]
+
+    @staff_member_required
+    def resolve_cache_stats(self, info):
+        cache = get_cache()
+        return cache and CacheStatsType(**cache.stats())
 
 
 class Mutation(AuthMutation, graphene.ObjectType):
     """User Mutation"""
     change_user_to_mentor = ChangeUserToMentor.Field()
+    revoke_all_tokens = RevokeAllTokens.Field()
 
 
 schema = graphene.Schema(query=Query, mutation=Mutation)
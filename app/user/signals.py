@@ -0,0 +1,57 @@
+"""
+Read cache invalidation for user changes and refresh token caps
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+
+from core.cache import get_cache
+from core.models import User
+from user import tokens
+from user.schema import MENTORS_CACHE, UserType
+
+# Columns the mentors listing and mentor lookups can return
+MENTOR_FIELDS = frozenset(UserType._meta.fields)
+
+
+def invalidate_mentors():
+    cache = get_cache()
+    if cache:
+        cache.invalidate(MENTORS_CACHE)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    """Bump the mentors version when a save can change what it shows.
+
+    Saves limited to other columns (last_login, password) and new
+    non-mentors are ignored. A full save of a non-mentor still bumps, as
+    it may have been a mentor before. ``QuerySet.update()`` sends no
+    signal, so bulk updates must invalidate themselves.
+    """
+    if update_fields is not None and not MENTOR_FIELDS & update_fields:
+        return
+    if created and not instance.is_mentor:
+        return
+    invalidate_mentors()
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if instance.is_mentor:
+        invalidate_mentors()
+
+
+@receiver(post_save, sender=get_refresh_token_model())
+def refresh_token_saved(sender, instance, created, **kwargs):
+    """Cap the user's live tokens whenever a new one is issued.
+
+    Register, tokenAuth and refreshToken all insert through the model,
+    so the cap holds however the token was obtained.
+    """
+    if not created:
+        return
+    cap = tokens.get_setting('MAX_PER_USER')
+    if cap is not None:
+        tokens.revoke_surplus(instance.user_id, cap)
@@ -0,0 +1,152 @@
+"""
+Tests for refresh token caps, revocation and pruning
+"""
+
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.utils import timezone
+from graphene.test import Client
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+
+from user.schema import schema
+from user.tokens import Pruner, live_tokens, prune_tokens
+
+REVOKE = '''
+    mutation ($id: Int!) { revokeAllTokens(userId: $id) { revoked } }
+'''
+
+
+def make_stale(user):
+    """Create a revoked and an expired token for user"""
+    RefreshToken = get_refresh_token_model()
+    revoked = RefreshToken.objects.create(user=user)
+    revoked.revoke()
+    expired = RefreshToken.objects.create(user=user)
+    RefreshToken.objects.filter(id=expired.id).update(
+        created=timezone.now() - timedelta(days=30))
+
+
+class RefreshTokenTests(TestCase):
+    """Test per-user caps, revocation and pruning of refresh tokens"""
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            email='user@example.com', password='user')
+        self.other = User.objects.create_user(
+            email='other@example.com', password='other')
+        self.tokens = get_refresh_token_model().objects
+
+    def revoke(self, user, user_id):
+        request = RequestFactory().post('/graphql')
+        request.user = user
+        return Client(schema).execute(REVOKE, context_value=request,
+                                      variables={'id': user_id})
+
+    @override_settings(REFRESH_TOKENS={'MAX_PER_USER': 2})
+    def test_cap_revokes_oldest(self):
+        """Test issuing past the cap revokes the user's oldest tokens"""
+        issued = [self.tokens.create(user=self.user) for _ in range(3)]
+        self.tokens.create(user=self.other)
+
+        self.assertEqual(sorted(live_tokens(self.user.id).values_list(
+            'id', flat=True)), [issued[1].id, issued[2].id])
+        self.assertEqual(live_tokens(self.other.id).count(), 1)
+
+    def test_register_issues_a_capped_token(self):
+        """Test tokens issued by registerUser count towards the cap"""
+        with override_settings(REFRESH_TOKENS={'MAX_PER_USER': 1}):
+            result = Client(schema).execute('''
+                mutation {
+                    registerUser(email: "new@example.com", password: "new",
+                                 firstName: "New", lastName: "User") {
+                        refreshToken
+                    }
+                }
+            ''')
+            token = result['data']['registerUser']['refreshToken']
+            self.tokens.create(user=self.tokens.get(token=token).user)
+
+        self.assertIsNotNone(self.tokens.get(token=token).revoked)
+
+    def test_revoke_all_tokens(self):
+        """Test revokeAllTokens revokes live tokens in one UPDATE"""
+        for _ in range(3):
+            self.tokens.create(user=self.user)
+        make_stale(self.user)
+        self.tokens.create(user=self.other)
+
+        with self.assertNumQueries(1):
+            result = self.revoke(self.user, self.user.id)
+
+        self.assertEqual(result['data']['revokeAllTokens'], {'revoked': 3})
+        self.assertFalse(live_tokens(self.user.id).exists())
+        self.assertEqual(live_tokens(self.other.id).count(), 1)
+
+    def test_revoke_all_tokens_permissions(self):
+        """Test only the user themselves or staff can revoke tokens"""
+        self.tokens.create(user=self.user)
+
+        result = self.revoke(self.other, self.user.id)
+        self.assertEqual(result['errors'][0]['message'],
+                         'You do not have permission to perform this action')
+        self.assertEqual(live_tokens(self.user.id).count(), 1)
+
+        self.other.is_staff = True
+        result = self.revoke(self.other, self.user.id)
+        self.assertEqual(result['data']['revokeAllTokens'], {'revoked': 1})
+
+    def test_prune_tokens(self):
+        """Test revoked and expired tokens are deleted in id chunks"""
+        kept = [self.tokens.create(user=self.user) for _ in range(2)]
+        for user in (self.user, self.other):
+            make_stale(user)
+        ids = list(self.tokens.values_list('id', flat=True))
+        chunks = len(range(min(ids), max(ids) + 1, 2))
+
+        # One aggregate for the id range, then one DELETE per chunk
+        with self.assertNumQueries(1 + chunks):
+            deleted = prune_tokens(batch_size=2)
+
+        self.assertEqual(deleted, 4)
+        self.assertEqual(list(self.tokens.order_by('id')), kept)
+        self.assertEqual(prune_tokens(), 0)
+
+    def test_prune_command(self):
+        """Test the command reports how many tokens it deleted"""
+        make_stale(self.user)
+        out = StringIO()
+
+        call_command('prune_refresh_tokens', '--batch-size', '1', stdout=out)
+
+        self.assertEqual(out.getvalue(), 'Deleted 2 refresh tokens.\n')
+        self.assertFalse(self.tokens.exists())
+
+
+class PrunerTests(TransactionTestCase):
+    """Test the in-process pruner thread"""
+
+    def test_pruner(self):
+        """Test the thread prunes on its interval until stopped"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='user')
+        make_stale(user)
+        tokens = get_refresh_token_model().objects
+
+        pruner = Pruner(0.01)
+        pruner.start()
+        try:
+            for _ in range(500):
+                if not tokens.exists():
+                    break
+                pruner.stopped.wait(0.01)
+        finally:
+            pruner.stop()
+            pruner.join()
+
+        self.assertFalse(tokens.exists())
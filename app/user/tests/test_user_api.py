@@ -1 +1,235 @@
 """Tests for the user API"""
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from graphene.test import Client
+from user.schema import schema
+
+
+class UserQueryTestCase(TestCase):
+    def setUp(self):
+        self.client = Client(schema)
+        User = get_user_model()
+        self.mentors = [
+            User.objects.create_user(
+                email=f'mentor{i}@example.com',
+                password='mentor',
+                is_mentor=True)
+            for i in range(3)
+        ]
+        User.objects.create_user(email='mentee@example.com',
+                                 password='mentee')
+
+    def test_mentors_pagination(self):
+        """Test mentors are paged by id with an optional total count"""
+        query = '''
+            query Mentors($after: String) {
+                mentors(first: 2, after: $after) {
+                    totalCount
+                    edges { node { email } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        '''
+
+        first_page = self.client.execute(query)['data']['mentors']
+        self.assertEqual(first_page['totalCount'], 3)
+        self.assertEqual(
+            [e['node']['email'] for e in first_page['edges']],
+            ['mentor0@example.com', 'mentor1@example.com'])
+        self.assertTrue(first_page['pageInfo']['hasNextPage'])
+
+        second_page = self.client.execute(query, variables={
+            'after': first_page['pageInfo']['endCursor']})['data']['mentors']
+        self.assertEqual(
+            [e['node']['email'] for e in second_page['edges']],
+            ['mentor2@example.com'])
+        self.assertFalse(second_page['pageInfo']['hasNextPage'])
+
+    def test_mentor_query_only_selects_requested_columns(self):
+        """Test aliased and inline-fragment fields drive the column list"""
+        query = '''
+            query Mentor($mentorId: Int!) {
+                mentor(mentorId: $mentorId) {
+                    mail: email
+                    ... on UserType { expertise }
+                }
+            }
+        '''
+
+        with CaptureQueriesContext(connection) as queries:
+            executed = self.client.execute(
+                query, variables={'mentorId': self.mentors[0].id})
+
+        self.assertEqual(executed['data']['mentor'],
+                         {'mail': 'mentor0@example.com', 'expertise': ''})
+        sql = queries.captured_queries[0]['sql']
+        self.assertTrue(sql.startswith(
+            'SELECT "core_user"."id", "core_user"."email", '
+            '"core_user"."expertise" FROM'))
+        self.assertNotIn('password', sql)
+
+
+class MentorCacheTestCase(TestCase):
+    def setUp(self):
+        self.client = Client(schema)
+        self.mentor = get_user_model().objects.create_user(
+            email='mentor@example.com', password='mentor', is_mentor=True)
+        self.mentee = get_user_model().objects.create_user(
+            email='mentee@example.com', password='mentee')
+
+    def mentor_emails(self):
+        executed = self.client.execute(
+            '{ mentors { totalCount edges { node { email } } } }')
+        mentors = executed['data']['mentors']
+        return mentors['totalCount'], [
+            edge['node']['email'] for edge in mentors['edges']]
+
+    def test_mentors_are_served_from_cache(self):
+        """Test a repeated mentors page and mentor lookup run no SQL"""
+        query = '{ mentor(mentorId: %d) { email } }' % self.mentor.id
+        self.mentor_emails()
+        self.client.execute(query)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.mentor_emails(),
+                             (1, ['mentor@example.com']))
+            executed = self.client.execute(query)
+        self.assertEqual(executed['data']['mentor'],
+                         {'email': 'mentor@example.com'})
+
+    def test_new_mentor_invalidates(self):
+        """Test promoting a user to mentor is visible on the next read"""
+        self.mentor_emails()
+
+        self.mentee.is_mentor = True
+        self.mentee.save(update_fields=['is_mentor'])
+
+        self.assertEqual(self.mentor_emails(), (2, [
+            'mentor@example.com', 'mentee@example.com']))
+
+    def test_profile_edit_invalidates(self):
+        """Test a mentor's profile change is visible on the next read"""
+        self.mentor_emails()
+
+        self.mentor.email = 'renamed@example.com'
+        self.mentor.save()
+
+        self.assertEqual(self.mentor_emails(),
+                         (1, ['renamed@example.com']))
+
+    def test_unrelated_saves_keep_cache(self):
+        """Test password and last_login saves do not bump the version"""
+        self.mentor_emails()
+
+        self.mentor.set_password('changed')
+        self.mentor.save(update_fields=['password'])
+        get_user_model().objects.create_user(
+            email='mentee2@example.com', password='mentee')
+
+        with self.assertNumQueries(0):
+            self.mentor_emails()
+
+
+class MentorSearchTestCase(TestCase):
+    def setUp(self):
+        self.client = Client(schema)
+        User = get_user_model()
+        profiles = [
+            ('Python', 'Engineer', 'Python and Django, mostly Python'),
+            ('Python', 'Teacher', 'Teaches Python to beginners'),
+            ('Go', 'Engineer', 'Distributed systems in Go, some Python'),
+            ('Design', 'Designer', 'Product design'),
+        ]
+        self.mentors = [
+            User.objects.create_user(
+                email=f'mentor{i}@example.com', password='mentor',
+                is_mentor=True, expertise=expertise, occupation=occupation,
+                bio=bio)
+            for i, (expertise, occupation, bio) in enumerate(profiles)
+        ]
+        User.objects.create_user(email='mentee@example.com',
+                                 password='mentee', expertise='Python')
+
+    def search(self, **variables):
+        query = '''
+            query Search($query: String, $expertise: String,
+                         $occupation: String, $first: Int,
+                         $after: String) {
+                searchMentors(query: $query, expertise: $expertise,
+                              occupation: $occupation, first: $first,
+                              after: $after) {
+                    totalCount
+                    expertiseFacets { value count }
+                    edges { score node { email } }
+                    pageInfo { hasNextPage endCursor }
+                }
+            }
+        '''
+        executed = self.client.execute(query, variables=variables)
+        assert 'errors' not in executed, executed['errors']
+        return executed['data']['searchMentors']
+
+    def emails(self, result):
+        return [edge['node']['email'] for edge in result['edges']]
+
+    def test_results_are_ranked(self):
+        """Test mentors matching more strongly come first"""
+        result = self.search(query='python')
+
+        self.assertEqual(self.emails(result), [
+            'mentor0@example.com', 'mentor1@example.com',
+            'mentor2@example.com'])
+        scores = [edge['score'] for edge in result['edges']]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(result['totalCount'], 3)
+
+    def test_prefix_and_all_words_match(self):
+        """Test every word must match, as a prefix, across fields"""
+        self.assertEqual(self.emails(self.search(query='distrib pyth')),
+                         ['mentor2@example.com'])
+        self.assertEqual(self.emails(self.search(query='"python')),
+                         self.emails(self.search(query='python')))
+
+    def test_facets_ignore_their_own_filter(self):
+        """Test facets count every expertise the other filters allow"""
+        result = self.search(query='python', expertise='Python',
+                             occupation='Engineer')
+
+        self.assertEqual(self.emails(result), ['mentor0@example.com'])
+        self.assertEqual(result['expertiseFacets'], [
+            {'value': 'Go', 'count': 1}, {'value': 'Python', 'count': 1}])
+
+    def test_ranked_pagination(self):
+        """Test pages follow the ranking without repeats"""
+        first = self.search(query='python', first=2)
+        second = self.search(query='python', first=2,
+                             after=first['pageInfo']['endCursor'])
+
+        self.assertTrue(first['pageInfo']['hasNextPage'])
+        self.assertFalse(second['pageInfo']['hasNextPage'])
+        self.assertEqual(self.emails(first) + self.emails(second),
+                         self.emails(self.search(query='python')))
+
+    def test_index_follows_saves(self):
+        """Test profile edits and demotions update the index"""
+        designer = self.mentors[3]
+        designer.bio = 'Now writes Python'
+        designer.save()
+        self.mentors[0].is_mentor = False
+        self.mentors[0].save(update_fields=['is_mentor'])
+
+        emails = self.emails(self.search(query='python'))
+
+        self.assertIn('mentor3@example.com', emails)
+        self.assertNotIn('mentor0@example.com', emails)
+
+    def test_empty_query_lists_every_mentor(self):
+        """Test no query returns mentors by id with all facets"""
+        result = self.search()
+
+        self.assertEqual(len(self.emails(result)), 4)
+        self.assertEqual(result['expertiseFacets'][0],
+                         {'value': 'Python', 'count': 2})
@@ -0,0 +1,129 @@
+"""
+Refresh token issuing, per-user caps, revocation and pruning
+"""
+
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+from graphql_jwt.refresh_token.utils import get_refresh_token_model
+from graphql_jwt.settings import jwt_settings
+
+from core.log import get_event_logger, log_event
+
+DEFAULTS = {
+    # Live refresh tokens a user may hold; issuing another revokes the
+    # oldest. None disables the cap.
+    'MAX_PER_USER': 10,
+    # Rows of the token table each pruning DELETE covers, by id range.
+    'PRUNE_BATCH_SIZE': 10000,
+    # Seconds between in-process prunes. Off by default, which leaves
+    # pruning to the prune_refresh_tokens command.
+    'PRUNE_INTERVAL': 0,
+}
+
+logger = get_event_logger('auth')
+
+
+def get_setting(name):
+    """Read a REFRESH_TOKENS setting, falling back to defaults"""
+    return getattr(settings, 'REFRESH_TOKENS', {}).get(name, DEFAULTS[name])
+
+
+def expiry():
+    """Return the creation time before which tokens have expired"""
+    return timezone.now() - jwt_settings.JWT_REFRESH_EXPIRATION_DELTA
+
+
+def prunable():
+    """Match tokens that are revoked or past the refresh expiration"""
+    return Q(revoked__isnull=False) | Q(created__lt=expiry())
+
+
+def live_tokens(user_id):
+    """Return the user's tokens that can still be refreshed with"""
+    return get_refresh_token_model().objects.filter(
+        user_id=user_id, revoked__isnull=True, created__gte=expiry())
+
+
+def revoke_surplus(user_id, cap):
+    """Revoke user's live tokens beyond the newest cap, in one UPDATE"""
+    live = live_tokens(user_id)
+    surplus = list(live.order_by('-created', '-id')
+                   .values_list('id', flat=True)[cap:])
+    if surplus:
+        live.filter(id__in=surplus).update(revoked=timezone.now())
+    return len(surplus)
+
+
+def revoke_all(user_id):
+    """Revoke every live token of a user with one UPDATE"""
+    return live_tokens(user_id).update(revoked=timezone.now())
+
+
+def prune_tokens(batch_size=None):
+    """Delete revoked and expired tokens in bounded chunks.
+
+    The table is walked by id range, so every DELETE reads through the
+    primary key index at most batch_size rows and holds its locks only
+    briefly, however large the table has grown. Nothing listens for
+    token deletes, so each chunk is one DELETE that loads no rows.
+    Returns the number of tokens deleted.
+    """
+    batch_size = batch_size or get_setting('PRUNE_BATCH_SIZE')
+    tokens = get_refresh_token_model().objects
+    bounds = tokens.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+    condition = prunable()
+    deleted = 0
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        deleted += tokens.filter(
+            condition, id__gte=start, id__lt=start + batch_size).delete()[0]
+    log_event(logger, 'refresh_tokens.pruned', deleted=deleted)
+    return deleted
+
+
+class Pruner(threading.Thread):
+    """Daemon thread pruning refresh tokens every PRUNE_INTERVAL"""
+
+    def __init__(self, interval):
+        super().__init__(name='refresh-token-pruner', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            close_old_connections()
+            try:
+                prune_tokens()
+            except Exception:
+                log_event(logger, 'refresh_tokens.prune_failed',
+                          logging.ERROR, exc_info=True)
+            finally:
+                connection.close()
+
+    def stop(self):
+        self.stopped.set()
+
+
+_pruner = None
+_pruner_lock = threading.Lock()
+
+
+def start_pruner():
+    """Start the pruner thread once per process, if it is enabled.
+
+    Called from UserConfig.ready.
+    """
+    global _pruner
+    interval = get_setting('PRUNE_INTERVAL')
+    if not interval or _pruner is not None:
+        return
+    with _pruner_lock:
+        if _pruner is None:
+            _pruner = Pruner(interval)
+            _pruner.start()